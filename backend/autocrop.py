@@ -0,0 +1,164 @@
+"""
+Content bounding boxes for automatic cropping
+- Vector pages are measured from content-stream geometry (text, painted
+  paths and image placements) in worker processes
+- Scans and pages whose content cannot be measured (form XObjects,
+  shadings, inline images) are rendered at low DPI and their margins
+  found with NumPy row/column reductions
+"""
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .inputs import open_reader
+from .parallel import map_pages
+from .rasterize import PageRasterizer
+from .stamp import display_matrix_for
+from .text_layout import extract_runs
+
+Box = Tuple[float, float, float, float]
+
+# An image covering more than this share of the page marks a scan
+SCAN_IMAGE_AREA = 0.5
+
+# Gray level below which a rendered pixel counts as ink
+INK_THRESHOLD = 200
+
+# Rows/columns with a smaller share of ink pixels are treated as noise
+MIN_INK_FRACTION = 0.002
+
+DEFAULT_AUTOCROP_DPI = 50
+
+
+def _union(boxes: List[Box]) -> Optional[Box]:
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def vector_bbox(page) -> dict:
+    """
+    Measure a page's content from its content stream
+
+    Runs in worker processes, so the result only holds plain data.
+
+    Returns:
+        Dictionary with bbox (x0, y0, x1, y1 in user space, None for an
+        empty page) and raster, True when the page must be rendered to be
+        measured instead.
+    """
+    xobjects = page.get('/Resources', {}).get('/XObject', {})
+    if any(xobject.get_object().get('/Subtype') == '/Form' for xobject in xobjects.values()):
+        return {'bbox': None, 'raster': True}
+
+    paths = []
+    text_boxes = []
+    _, images = extract_runs(page, paths=paths, text_boxes=text_boxes)
+    if any(box is None for box in paths + text_boxes):
+        return {'bbox': None, 'raster': True}
+
+    box = page.mediabox
+    page_area = float(box.width) * float(box.height)
+    for image in images:
+        x0, y0, x1, y1 = image['bbox']
+        if (x1 - x0) * (y1 - y0) > SCAN_IMAGE_AREA * page_area:
+            return {'bbox': None, 'raster': True}
+
+    # Text is measured glyph by glyph, so the crop never cuts into a line
+    boxes = text_boxes + [image['bbox'] for image in images] + paths
+    return {'bbox': _union(boxes), 'raster': False}
+
+
+def ink_bbox(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Pixel bbox (left, top, right, bottom) of the ink in a grayscale page
+
+    Right and bottom are exclusive. Returns None for a blank page.
+    """
+    ink = gray < INK_THRESHOLD
+    rows = np.flatnonzero(ink.mean(axis=1) > MIN_INK_FRACTION)
+    cols = np.flatnonzero(ink.mean(axis=0) > MIN_INK_FRACTION)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def pixel_box_to_user(pixel_box: Tuple[int, int, int, int], image_size: Tuple[int, int],
+                      mediabox: Box, rotation: int) -> Box:
+    """Map a pixel bbox on a rendered page (mediabox, /Rotate applied) to user space"""
+    matrix, width, height = display_matrix_for(mediabox, rotation)
+    a, b, c, d, e, f = matrix
+    scale_x, scale_y = width / image_size[0], height / image_size[1]
+    left, top, right, bottom = pixel_box
+
+    corners = []
+    for px, py in ((left, top), (right, bottom)):
+        u, v = px * scale_x, height - py * scale_y
+        corners.append((a * u + c * v + e, b * u + d * v + f))
+    (x0, y0), (x1, y1) = corners
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def content_boxes(pdf_path: Path, dpi: int = DEFAULT_AUTOCROP_DPI,
+                  processes: int = None, thread_count: int = None,
+                  password: str = None) -> List[Optional[Box]]:
+    """
+    Content bbox of every page, in user space
+
+    Vector measurement runs in a process pool; pages that need rendering
+    are then rendered together in concurrent batches.
+
+    Returns:
+        One bbox per page (None for blank pages)
+    """
+    with open_reader(pdf_path, password) as reader:
+        page_info = [([float(v) for v in page.mediabox], page.rotation) for page in reader.pages]
+
+    results = list(map_pages(pdf_path, vector_bbox, range(len(page_info)), processes, password))
+    boxes = [result['bbox'] for result in results]
+    raster_pages = [index + 1 for index, result in enumerate(results) if result['raster']]
+
+    if raster_pages:
+        for page_number, image in PageRasterizer.iter_pages(
+                pdf_path, dpi, thread_count=thread_count, grayscale=True,
+                password=password, pages=raster_pages):
+            gray = np.asarray(image.convert('L'))
+            pixel_box = ink_bbox(gray)
+            if pixel_box is not None:
+                mediabox, rotation = page_info[page_number - 1]
+                boxes[page_number - 1] = pixel_box_to_user(pixel_box, image.size, mediabox, rotation)
+            image.close()
+
+    return boxes
+
+
+def crop_boxes(boxes: List[Optional[Box]], page_boxes: List[Box], padding: float = 0,
+               uniform: bool = False) -> List[Optional[Box]]:
+    """
+    Padded crop boxes, kept inside each page's current box
+
+    Args:
+        boxes: Content bbox per page (None = leave the page as it is)
+        page_boxes: Current crop box per page
+        padding: Margin kept around the content, in points
+        uniform: Use the union of all content boxes on every page
+
+    Returns:
+        New crop box per page, or None where the page is unchanged
+    """
+    if uniform:
+        union = _union([box for box in boxes if box is not None])
+        boxes = [union if box is not None else None for box in boxes]
+
+    result = []
+    for box, page_box in zip(boxes, page_boxes):
+        if box is None:
+            result.append(None)
+            continue
+        px0, py0, px1, py1 = page_box
+        x0, y0 = max(px0, box[0] - padding), max(py0, box[1] - padding)
+        x1, y1 = min(px1, box[2] + padding), min(py1, box[3] + padding)
+        result.append((x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None)
+    return result
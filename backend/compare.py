@@ -0,0 +1,446 @@
+"""
+PDF comparison
+- Pages are fingerprinted from their decoded content streams, resources
+  and page boxes; the two fingerprint sequences are aligned so identical
+  pages (including moved ones after insertions or deletions) are skipped
+- Only changed pages have their text extracted, in worker processes
+- Changed pages are diffed line by line, and changed lines word by word,
+  giving hunks with page coordinates
+- Visual mode renders changed page pairs at low DPI (both documents
+  rendering ahead in concurrent poppler processes), diffs the pixels with
+  NumPy and writes a heatmap and changed-region bboxes per pair
+"""
+import hashlib
+from collections import deque
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pikepdf
+from PIL import Image, ImageDraw
+from pikepdf import Array, Dictionary, Stream
+
+from .inputs import open_reader
+from .parallel import map_pages
+from .text_layout import extract_runs, group_lines, split_words
+
+# Keys not followed when hashing resources (back-references up the tree)
+SKIPPED_KEYS = {'/Parent', '/P', '/Annots', '/B', '/StructParents'}
+
+# Page attributes included in a page's fingerprint
+PAGE_KEYS = ('/MediaBox', '/CropBox', '/Rotate', '/UserUnit')
+
+Word = Tuple[str, float, float, float, float]
+
+DEFAULT_VISUAL_DPI = 50
+
+# Channel difference (0-255) above which a pixel counts as changed
+PIXEL_THRESHOLD = 40
+
+# Changed pixels are grouped into regions on a grid of cells this many
+# pixels wide; cells closer than REGION_GAP cells join the same region
+REGION_CELL = 4
+REGION_GAP = 2
+
+
+class _Hasher:
+    """Fingerprints objects, hashing each shared indirect object once"""
+
+    def __init__(self):
+        self._memo: Dict[Tuple[int, int], bytes] = {}
+
+    def digest(self, obj, active: frozenset = frozenset()) -> bytes:
+        if isinstance(obj, (Dictionary, Array, Stream)) and obj.is_indirect:
+            key = obj.objgen
+            if key in self._memo:
+                return self._memo[key]
+            if key in active:
+                return b'cycle'
+            value = self._digest(obj, active | {key})
+            self._memo[key] = value
+            return value
+        return self._digest(obj, active)
+
+    def _digest(self, obj, active: frozenset) -> bytes:
+        h = hashlib.sha1()
+        if isinstance(obj, Stream):
+            h.update(b'S')
+            h.update(self._dictionary(obj.stream_dict, active, skip={'/Length', '/Filter', '/DecodeParms'}))
+            try:
+                h.update(obj.read_bytes())
+            except pikepdf.PdfError:
+                h.update(obj.read_raw_bytes())
+        elif isinstance(obj, Dictionary):
+            h.update(b'D')
+            h.update(self._dictionary(obj, active))
+        elif isinstance(obj, Array):
+            h.update(b'A')
+            for item in obj:
+                h.update(self.digest(item, active))
+        else:
+            h.update(b'O')
+            h.update(obj.unparse() if isinstance(obj, pikepdf.Object) else repr(obj).encode())
+        return h.digest()
+
+    def _dictionary(self, obj: Dictionary, active: frozenset, skip: set = frozenset()) -> bytes:
+        h = hashlib.sha1()
+        for key in sorted(obj.keys()):
+            if key in SKIPPED_KEYS or key in skip:
+                continue
+            h.update(key.encode())
+            h.update(self.digest(obj[key], active))
+        return h.digest()
+
+
+def _inherited(page: pikepdf.Page, key: str):
+    node = page.obj
+    while node is not None:
+        if key in node:
+            return node[key]
+        node = node.get('/Parent')
+    return None
+
+
+def page_fingerprints(pdf_path: Path, password: str = None) -> List[str]:
+    """
+    Fingerprint of every page
+
+    Two pages with the same fingerprint draw the same content with the
+    same resources on the same page box. Fonts and images shared between
+    pages are hashed once.
+    """
+    hasher = _Hasher()
+    fingerprints = []
+    with pikepdf.open(pdf_path, password=password or '') as pdf:
+        for page in pdf.pages:
+            h = hashlib.sha1()
+            contents = page.obj.get('/Contents')
+            streams = contents if isinstance(contents, Array) else [contents] if contents is not None else []
+            for stream in streams:
+                try:
+                    h.update(stream.read_bytes())
+                except pikepdf.PdfError:
+                    h.update(stream.read_raw_bytes())
+            for key in PAGE_KEYS + ('/Resources',):
+                value = _inherited(page, key)
+                if value is not None:
+                    h.update(key.encode())
+                    h.update(hasher.digest(value))
+            fingerprints.append(h.hexdigest())
+    return fingerprints
+
+
+def align_pages(fingerprints1: List[str], fingerprints2: List[str]) -> List[Tuple[str, List[int], List[int]]]:
+    """
+    Align two documents' pages by fingerprint
+
+    Returns:
+        (tag, pages in document 1, pages in document 2) blocks with
+        0-based page indexes; tag is 'equal', 'replace', 'delete' or
+        'insert' as in difflib
+    """
+    matcher = SequenceMatcher(None, fingerprints1, fingerprints2, autojunk=False)
+    return [(tag, list(range(i1, i2)), list(range(j1, j2)))
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()]
+
+
+def page_words(page) -> List[List[Word]]:
+    """
+    Words of a page grouped into lines, top to bottom
+
+    Runs in worker processes, so the result only holds plain data.
+    """
+    runs, _ = extract_runs(page)
+    return [[(w.text, w.x0, w.y0, w.x1, w.y1) for w in line if w.text]
+            for line in group_lines(split_words(runs))]
+
+
+def _bbox(words: List[Word]) -> Optional[Tuple[float, float, float, float]]:
+    if not words:
+        return None
+    return (round(min(w[1] for w in words), 2), round(min(w[2] for w in words), 2),
+            round(max(w[3] for w in words), 2), round(max(w[4] for w in words), 2))
+
+
+def _hunk(change: str, page1: Optional[int], page2: Optional[int],
+          words1: List[Word], words2: List[Word]) -> dict:
+    return {
+        'type': change,
+        'page_1': page1 + 1 if page1 is not None else None,
+        'page_2': page2 + 1 if page2 is not None else None,
+        'text_1': ' '.join(w[0] for w in words1),
+        'text_2': ' '.join(w[0] for w in words2),
+        'bbox_1': _bbox(words1),
+        'bbox_2': _bbox(words2),
+    }
+
+
+def diff_page_text(lines1: List[List[Word]], lines2: List[List[Word]],
+                   page1: int, page2: int) -> List[dict]:
+    """
+    Line-level diff of two pages, refined to words inside changed lines
+
+    Returns:
+        Hunks with type ('added', 'removed' or 'changed'), 1-based page
+        numbers, text and bbox (x0, y0, x1, y1 in PDF points from the
+        bottom-left) on each side
+    """
+    texts1 = [' '.join(w[0] for w in line) for line in lines1]
+    texts2 = [' '.join(w[0] for w in line) for line in lines2]
+    hunks = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, texts1, texts2, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        if tag == 'delete':
+            for line in lines1[i1:i2]:
+                hunks.append(_hunk('removed', page1, page2, line, []))
+            continue
+        if tag == 'insert':
+            for line in lines2[j1:j2]:
+                hunks.append(_hunk('added', page1, page2, [], line))
+            continue
+
+        words1 = [w for line in lines1[i1:i2] for w in line]
+        words2 = [w for line in lines2[j1:j2] for w in line]
+        word_matcher = SequenceMatcher(None, [w[0] for w in words1], [w[0] for w in words2], autojunk=False)
+        for word_tag, a1, a2, b1, b2 in word_matcher.get_opcodes():
+            if word_tag != 'equal':
+                change = {'delete': 'removed', 'insert': 'added'}.get(word_tag, 'changed')
+                hunks.append(_hunk(change, page1, page2, words1[a1:a2], words2[b1:b2]))
+    return hunks
+
+
+def _pad(pixels: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """Pad an RGB page on the right and bottom with white up to shape"""
+    height, width = pixels.shape[:2]
+    if (height, width) == shape:
+        return pixels
+    return np.pad(pixels, ((0, shape[0] - height), (0, shape[1] - width), (0, 0)), constant_values=255)
+
+
+def pixel_diff(image1: Image.Image, image2: Image.Image) -> np.ndarray:
+    """
+    Per-pixel difference of two renders
+
+    Returns:
+        uint8 array (height, width) holding the largest channel difference;
+        pages of different size are compared from the top-left corner
+    """
+    pixels1 = np.asarray(image1.convert('RGB'))
+    pixels2 = np.asarray(image2.convert('RGB'))
+    shape = (max(pixels1.shape[0], pixels2.shape[0]), max(pixels1.shape[1], pixels2.shape[1]))
+    diff = np.abs(_pad(pixels1, shape).astype(np.int16) - _pad(pixels2, shape).astype(np.int16))
+    return diff.max(axis=2).astype(np.uint8)
+
+
+def changed_regions(diff: np.ndarray, threshold: int = PIXEL_THRESHOLD) -> List[Tuple[int, int, int, int]]:
+    """
+    Pixel bboxes (left, top, right, bottom) of the changed areas
+
+    The change mask is reduced to a grid of REGION_CELL-pixel cells and
+    neighbouring changed cells (up to REGION_GAP apart) are grouped, so
+    a changed word or image gives one region rather than many. Right and
+    bottom are exclusive.
+    """
+    mask = diff > threshold
+    if not mask.any():
+        return []
+
+    height, width = mask.shape
+    rows, cols = -(-height // REGION_CELL), -(-width // REGION_CELL)
+    padded = np.zeros((rows * REGION_CELL, cols * REGION_CELL), dtype=bool)
+    padded[:height, :width] = mask
+    cells = padded.reshape(rows, REGION_CELL, cols, REGION_CELL).any(axis=(1, 3))
+
+    regions = []
+    unvisited = set(zip(*np.nonzero(cells)))
+    while unvisited:
+        start = unvisited.pop()
+        queue = deque([start])
+        top, left = bottom, right = start
+        while queue:
+            row, col = queue.popleft()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, col), max(right, col)
+            for r in range(row - REGION_GAP, row + REGION_GAP + 1):
+                for c in range(col - REGION_GAP, col + REGION_GAP + 1):
+                    if (r, c) in unvisited:
+                        unvisited.remove((r, c))
+                        queue.append((r, c))
+        regions.append((left * REGION_CELL, top * REGION_CELL,
+                        min(width, (right + 1) * REGION_CELL), min(height, (bottom + 1) * REGION_CELL)))
+
+    return sorted(regions, key=lambda box: (box[1], box[0]))
+
+
+def heatmap(image: Image.Image, diff: np.ndarray,
+            regions: List[Tuple[int, int, int, int]]) -> Image.Image:
+    """Faded grayscale page with changes in red and changed regions outlined"""
+    height, width = diff.shape
+    base = np.full((height, width), 255, dtype=np.uint8)
+    gray = np.asarray(image.convert('L'))
+    base[:gray.shape[0], :gray.shape[1]] = gray
+    base = 255 - (255 - base.astype(np.uint16)) * 2 // 5
+
+    strength = diff.astype(np.uint16)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = np.maximum(base, strength)
+    pixels[..., 1] = base * (255 - strength) // 255
+    pixels[..., 2] = base * (255 - strength) // 255
+
+    result = Image.fromarray(pixels, 'RGB')
+    draw = ImageDraw.Draw(result)
+    for left, top, right, bottom in regions:
+        draw.rectangle((left - 2, top - 2, right + 1, bottom + 1), outline=(220, 0, 0), width=2)
+    return result
+
+
+def _page_geometry(pdf_path: Path, password: str = None) -> List[Tuple[List[float], int]]:
+    with open_reader(pdf_path, password) as reader:
+        return [([float(v) for v in page.mediabox], page.rotation) for page in reader.pages]
+
+
+def visual_diff(pdf_path1: Path, pdf_path2: Path, pairs: List[Tuple[int, int]], output_dir: Path,
+                dpi: int = DEFAULT_VISUAL_DPI, thread_count: int = None,
+                password1: str = None, password2: str = None,
+                name_prefix: str = 'compare') -> List[dict]:
+    """
+    Render page pairs and diff their pixels
+
+    Both documents render ahead in concurrent poppler batches while the
+    previous pair is diffed, so rendering and NumPy work overlap.
+
+    Args:
+        pairs: (page in document 1, page in document 2), 0-based, in
+            increasing order on both sides (as produced by align_pages)
+        output_dir: Directory for the heatmap PNGs
+        dpi: Render resolution
+
+    Returns:
+        One dictionary per pair with page_1, page_2 (1-based),
+        changed_fraction, regions (bboxes in the second document's user
+        space) and heatmap (path, None when the renders are identical)
+    """
+    from .autocrop import pixel_box_to_user
+    from .rasterize import PageRasterizer
+
+    if not pairs:
+        return []
+    output_dir.mkdir(parents=True, exist_ok=True)
+    geometry = _page_geometry(pdf_path2, password2)
+
+    renders1 = PageRasterizer.iter_pages(pdf_path1, dpi, thread_count=thread_count, password=password1,
+                                         pages=[i + 1 for i, _ in pairs])
+    renders2 = PageRasterizer.iter_pages(pdf_path2, dpi, thread_count=thread_count, password=password2,
+                                         pages=[j + 1 for _, j in pairs])
+
+    results = []
+    for (page1, image1), (page2, image2) in zip(renders1, renders2):
+        diff = pixel_diff(image1, image2)
+        regions = changed_regions(diff)
+        result = {
+            'page_1': page1,
+            'page_2': page2,
+            'changed_fraction': round(float((diff > PIXEL_THRESHOLD).mean()), 5),
+            'regions': [],
+            'heatmap': None,
+        }
+        if regions:
+            mediabox, rotation = geometry[page2 - 1]
+            result['regions'] = [tuple(round(v, 2) for v in pixel_box_to_user(region, image2.size, mediabox, rotation))
+                                 for region in regions]
+            output_path = output_dir / f"{name_prefix}_diff_p{page1}-{page2}.png"
+            heatmap(image2, diff, regions).save(output_path)
+            result['heatmap'] = str(output_path)
+        image1.close()
+        image2.close()
+        results.append(result)
+    return results
+
+
+def compare_files(pdf_path1: Path, pdf_path2: Path, processes: int = None,
+                  password1: str = None, password2: str = None, visual: bool = False,
+                  output_dir: Path = None, dpi: int = DEFAULT_VISUAL_DPI,
+                  name_prefix: str = 'compare') -> dict:
+    """
+    Compare two PDFs page by page
+
+    Args:
+        visual: Also render changed page pairs and diff the pixels
+        output_dir: Directory for heatmaps (required with visual)
+        dpi: Render resolution for the visual diff
+
+    Returns:
+        Dictionary with page counts, identical_pages, page_changes (one
+        entry per page added, removed or modified), hunks (text changes
+        with coordinates) and differences (readable summary lines); with
+        visual, modified pages also get changed_fraction and regions, and
+        heatmaps lists the written images
+    """
+    fingerprints1 = page_fingerprints(pdf_path1, password1)
+    fingerprints2 = page_fingerprints(pdf_path2, password2)
+    blocks = align_pages(fingerprints1, fingerprints2)
+
+    page_changes = []
+    pairs = []
+    for tag, pages1, pages2 in blocks:
+        if tag == 'equal':
+            continue
+        paired = min(len(pages1), len(pages2)) if tag == 'replace' else 0
+        pairs.extend(zip(pages1[:paired], pages2[:paired]))
+        page_changes.extend({'type': 'modified', 'page_1': i + 1, 'page_2': j + 1}
+                            for i, j in zip(pages1[:paired], pages2[:paired]))
+        page_changes.extend({'type': 'removed', 'page_1': i + 1, 'page_2': None} for i in pages1[paired:])
+        page_changes.extend({'type': 'added', 'page_1': None, 'page_2': j + 1} for j in pages2[paired:])
+
+    words1 = dict(zip([i for i, _ in pairs],
+                      map_pages(pdf_path1, page_words, [i for i, _ in pairs], processes, password1)))
+    words2 = dict(zip([j for _, j in pairs],
+                      map_pages(pdf_path2, page_words, [j for _, j in pairs], processes, password2)))
+
+    visual_results = {}
+    if visual:
+        for result in visual_diff(pdf_path1, pdf_path2, pairs, output_dir, dpi,
+                                  processes, password1, password2, name_prefix):
+            visual_results[(result['page_1'], result['page_2'])] = result
+
+    hunks = []
+    differences = []
+    for change in page_changes:
+        if change['type'] == 'removed':
+            differences.append(f"Page {change['page_1']} of the first PDF was removed")
+        elif change['type'] == 'added':
+            differences.append(f"Page {change['page_2']} of the second PDF was added")
+        else:
+            i, j = change['page_1'] - 1, change['page_2'] - 1
+            page_hunks = diff_page_text(words1[i], words2[j], i, j)
+            change['text_changes'] = len(page_hunks)
+            hunks.extend(page_hunks)
+            label = f"Page {change['page_1']}" if i == j else f"Page {change['page_1']} → {change['page_2']}"
+            if visual:
+                result = visual_results[(change['page_1'], change['page_2'])]
+                change['changed_fraction'] = result['changed_fraction']
+                change['regions'] = result['regions']
+                label += f" ({len(result['regions'])} changed region(s))"
+            if page_hunks:
+                differences.append(f"{label}: {len(page_hunks)} text change(s)")
+            elif visual:
+                differences.append(f"{label}: visual changes only" if change['regions']
+                                   else f"{label}: content differs (renders identically)")
+            else:
+                differences.append(f"{label}: content differs (text identical)")
+
+    comparison = {
+        'identical': not page_changes,
+        'page_count_1': len(fingerprints1),
+        'page_count_2': len(fingerprints2),
+        'page_count_match': len(fingerprints1) == len(fingerprints2),
+        'identical_pages': sum(len(pages1) for tag, pages1, _ in blocks if tag == 'equal'),
+        'page_changes': page_changes,
+        'hunks': hunks,
+        'differences': differences,
+    }
+    if visual:
+        comparison['heatmaps'] = [result['heatmap'] for result in visual_results.values() if result['heatmap']]
+    return comparison
@@ -1,74 +1,186 @@
 """
 Convert FROM PDF Tools
-- PDF to JPG
+- PDF to JPG / PNG
+- PDF to multi-page TIFF
 - PDF to WORD
 - PDF to POWERPOINT
 - PDF to EXCEL
 - PDF to PDF/A
 """
 from pathlib import Path
-from typing import BinaryIO, List
+from typing import BinaryIO, List, Tuple
 from PyPDF2 import PdfReader
 import pikepdf
 from PIL import Image
 import io
 
+from .rasterize import DEFAULT_MAX_PAGE_PIXELS, DEFAULT_TILE_SIZE
+
+# Rows per worksheet allowed by the XLSX format
+EXCEL_MAX_ROWS = 1_048_576
+
 class ConvertFromPDF:
     
     @staticmethod
     def pdf_to_images(pdf_file: BinaryIO, output_dir: Path, 
-                      image_format: str = "jpg", dpi: int = 200) -> List[Path]:
+                      image_format: str = "jpg", dpi: int = 200,
+                      quality: int = 95, first_page: int = None,
+                      last_page: int = None, thread_count: int = None,
+                      passthrough_scans: bool = True,
+                      tile_size: int = DEFAULT_TILE_SIZE,
+                      max_page_pixels: int = DEFAULT_MAX_PAGE_PIXELS) -> List[Path]:
         """
         Convert PDF pages to images
         
+        Pages are rendered in batches of page ranges, several batches at a
+        time, and poppler writes each page straight to disk. Memory use does
+        not grow with the number of pages.
+        
+        For JPG output, pages that are a single full-page JPEG scan have
+        their original JPEG written out byte-for-byte (rotation is recorded
+        as EXIF orientation) instead of being rendered and re-encoded.
+        
+        Pages whose raster would exceed max_page_pixels (e.g. A0 drawings)
+        are rendered in tile_size tiles and streamed into a PNG, so peak
+        memory depends on the tile size rather than the page area.
+        
         Args:
             pdf_file: PDF file object
             output_dir: Directory to save images
             image_format: 'jpg' or 'png'
             dpi: Image resolution (default: 200)
+            quality: JPEG quality (default: 95)
+            first_page: First page to convert (default: 1)
+            last_page: Last page to convert (default: last page)
+            thread_count: Concurrent render batches (default: CPU count)
+            passthrough_scans: Copy embedded JPEGs of scanned pages (JPG only)
+            tile_size: Tile edge in pixels for oversized pages
+            max_page_pixels: Pixel count above which a page is tiled
             
         Returns:
             List of paths to created images
         """
         try:
-            # Try using pdf2image if available
             try:
-                from pdf2image import convert_from_bytes
-                
-                pdf_file.seek(0)
-                pdf_bytes = pdf_file.read()
+                import pdf2image  # noqa: F401
+            except ImportError:
+                raise Exception("pdf2image not available. Install with: pip install pdf2image")
+            
+            from .rasterize import PageRasterizer, ScanPageDetector, TiledRenderer
+            from .inputs import pdf_path_for
+            
+            with pdf_path_for(pdf_file) as pdf_path:
+                pages = PageRasterizer.resolve_pages(pdf_path, first_page, last_page, None)
+                output_dir.mkdir(parents=True, exist_ok=True)
                 
-                images = convert_from_bytes(pdf_bytes, dpi=dpi)
-                output_files = []
+                # Scanned pages: copy the embedded JPEG, skip the renderer
+                copied = {}
+                if passthrough_scans and image_format.lower() in ('jpg', 'jpeg'):
+                    copied = ScanPageDetector.export_jpegs(pdf_path, output_dir, pages)
                 
-                for i, image in enumerate(images, 1):
-                    output_path = output_dir / f"page_{i}.{image_format}"
-                    
-                    if image_format.lower() == 'jpg':
-                        # Convert to RGB for JPEG
-                        if image.mode != 'RGB':
-                            image = image.convert('RGB')
-                        image.save(output_path, 'JPEG', quality=95)
-                    else:
-                        image.save(output_path, 'PNG')
-                    
-                    output_files.append(output_path)
+                # Giant pages: tile-render to PNG one page at a time
+                tiled = {}
+                remaining = [n for n in pages if n not in copied]
+                for page_number in TiledRenderer.oversized_pages(pdf_path, remaining, dpi, max_page_pixels):
+                    tiled[page_number] = TiledRenderer.render_page_png(
+                        pdf_path, page_number, output_dir / f"page_{page_number}.png",
+                        dpi=dpi, tile_size=tile_size, thread_count=thread_count
+                    )
                 
-                return output_files
+                rendered_pages = [n for n in remaining if n not in tiled]
+                rendered = PageRasterizer.render_to_files(
+                    pdf_path, output_dir,
+                    image_format=image_format,
+                    dpi=dpi,
+                    quality=quality,
+                    thread_count=thread_count,
+                    pages=rendered_pages
+                )
                 
-            except ImportError:
-                # Fallback: This won't work well but provides a placeholder
-                raise Exception("pdf2image not available. Install with: pip install pdf2image")
+                # Merge both sets back into page order
+                by_page = dict(copied)
+                by_page.update(tiled)
+                by_page.update(zip(rendered_pages, rendered))
+                return [by_page[n] for n in pages if n in by_page]
                 
         except Exception as e:
             raise Exception(f"Error converting PDF to images: {str(e)}")
     
     @staticmethod
-    def pdf_to_word(pdf_file: BinaryIO, output_path: Path) -> Path:
+    def pdf_to_tiff(pdf_file: BinaryIO, output_path: Path, dpi: int = 200,
+                    compression: str = "lzw", bilevel: str = "auto",
+                    thread_count: int = None) -> Path:
+        """
+        Convert PDF to a single multi-page TIFF
+        
+        Pages are rendered ahead in concurrent batches and appended to the
+        TIFF one frame at a time, so memory stays flat however many pages
+        the document has.
+        
+        Args:
+            pdf_file: PDF file object
+            output_path: Path to save TIFF file
+            dpi: Image resolution (default: 200)
+            compression: 'lzw' or 'deflate' for gray/color pages
+            bilevel: 'auto' (black & white pages only), 'always' or 'never'
+                     use Group 4 for bilevel pages
+            thread_count: Concurrent render batches (default: CPU count)
+            
+        Returns:
+            Path to TIFF file
+        """
+        try:
+            from PIL import ImageChops, TiffImagePlugin
+            from .rasterize import PageRasterizer
+            from .inputs import pdf_path_for
+            
+            codecs = {'lzw': 'tiff_lzw', 'deflate': 'tiff_adobe_deflate'}
+            codec = codecs.get(compression, 'tiff_lzw')
+            
+            with pdf_path_for(pdf_file) as pdf_path, \
+                    open(output_path, 'w+b') as output_file, \
+                    TiffImagePlugin.AppendingTiffWriter(output_file, new=True) as tiff:
+                
+                for _, image in PageRasterizer.iter_pages(pdf_path, dpi=dpi,
+                                                          thread_count=thread_count):
+                    gray = image.convert('L')
+                    
+                    if bilevel == 'always':
+                        is_bilevel = True
+                    elif bilevel == 'never':
+                        is_bilevel = False
+                    else:
+                        # Neutral page with (almost) only black and white pixels
+                        r, g, b = image.convert('RGB').split()
+                        neutral = (ImageChops.difference(r, g).getbbox() is None and
+                                   ImageChops.difference(g, b).getbbox() is None)
+                        histogram = gray.histogram()
+                        extremes = sum(histogram[:32]) + sum(histogram[224:])
+                        is_bilevel = neutral and extremes >= 0.995 * gray.width * gray.height
+                    
+                    if is_bilevel:
+                        frame = gray.point(lambda v: 255 if v >= 128 else 0, mode='1')
+                        frame.save(tiff, format='TIFF', compression='group4', dpi=(dpi, dpi))
+                    else:
+                        frame = image if image.mode in ('RGB', 'L') else image.convert('RGB')
+                        frame.save(tiff, format='TIFF', compression=codec, dpi=(dpi, dpi))
+                    tiff.newFrame()
+            
+            return output_path
+            
+        except Exception as e:
+            raise Exception(f"Error converting PDF to TIFF: {str(e)}")
+    
+    @staticmethod
+    def pdf_to_word(pdf_file: BinaryIO, output_path: Path, processes: int = None) -> Path:
         """
         Convert PDF to Word document
         
-        Note: This is a basic implementation. For production quality:
+        Positioned text runs are extracted page by page in a process pool.
+        Each worker rebuilds headings, paragraphs, columns and image
+        placement from geometry; the DOCX is then assembled in page order.
+        
+        Note: Layout reconstruction is heuristic. For production quality:
         - Use Adobe PDF Services API
         - Use pdf2docx library
         - Use cloud conversion services
@@ -76,38 +188,48 @@ class ConvertFromPDF:
         Args:
             pdf_file: PDF file object
             output_path: Path to save DOCX file
+            processes: Worker processes (default: CPU count)
             
         Returns:
             Path to DOCX file
         """
         try:
             from docx import Document
-            from docx.shared import Pt
+            from docx.shared import Emu, Pt
+            from pypdf import PdfReader as LayoutReader
+            from .parallel import map_pages
+            from .inputs import pdf_path_for
+            from .text_layout import page_layout
             
-            # Read PDF
-            reader = PdfReader(pdf_file)
-            
-            # Create Word document
-            doc = Document()
-            
-            # Extract text from each page
-            for page_num, page in enumerate(reader.pages, 1):
-                text = page.extract_text()
+            with pdf_path_for(pdf_file) as pdf_path:
+                page_count = len(LayoutReader(pdf_path).pages)
                 
-                # Add page number
-                doc.add_heading(f'Page {page_num}', level=2)
+                # Create Word document
+                doc = Document()
+                doc.styles['Normal'].font.size = Pt(11)
                 
-                # Add text
-                if text.strip():
-                    paragraph = doc.add_paragraph(text)
-                    paragraph.style.font.size = Pt(11)
+                layouts = map_pages(pdf_path, page_layout, range(page_count), processes)
+                for page_num, layout in enumerate(layouts, 1):
+                    # Scale images from page points to the document's text width
+                    section = doc.sections[-1]
+                    text_width = Emu(section.page_width - section.left_margin - section.right_margin)
+                    scale = min(1.0, text_width.pt / layout['width']) if layout['width'] else 1.0
+                    
+                    for block in layout['blocks']:
+                        if block['type'] == 'heading':
+                            doc.add_heading(block['text'], level=block['level'])
+                        elif block['type'] == 'paragraph':
+                            doc.add_paragraph(block['text'])
+                        elif block['type'] == 'image' and block['width'] > 0:
+                            doc.add_picture(io.BytesIO(block['data']),
+                                            width=Pt(block['width'] * scale))
+                    
+                    # Page break (except last page)
+                    if page_num < page_count:
+                        doc.add_page_break()
                 
-                # Page break (except last page)
-                if page_num < len(reader.pages):
-                    doc.add_page_break()
-            
-            # Save document
-            doc.save(output_path)
+                # Save document
+                doc.save(output_path)
             
             return output_path
             
@@ -115,54 +237,67 @@ class ConvertFromPDF:
             raise Exception(f"Error converting PDF to Word: {str(e)}")
     
     @staticmethod
-    def pdf_to_excel(pdf_file: BinaryIO, output_path: Path) -> Path:
+    def pdf_to_excel(pdf_file: BinaryIO, output_path: Path, processes: int = None) -> Path:
         """
         Convert PDF to Excel
         
-        Note: This works best for PDFs with tabular data
+        Tables are rebuilt from word positions: words are clustered into
+        rows by baseline and into columns by x coverage (or by ruling lines
+        when the table has them). Pages are extracted in a process pool.
+        Numeric cells are stored as numbers.
+        
+        Rows are streamed into a write-only workbook as pages complete, and
+        a new sheet is started whenever one reaches Excel's row limit.
         
         Args:
             pdf_file: PDF file object
             output_path: Path to save XLSX file
+            processes: Worker processes (default: CPU count)
             
         Returns:
             Path to XLSX file
         """
         try:
             from openpyxl import Workbook
+            from pypdf import PdfReader as LayoutReader
+            from .parallel import map_pages
+            from .inputs import pdf_path_for
+            from .tables import page_tables
             
-            # Read PDF
-            reader = PdfReader(pdf_file)
-            
-            # Create workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "PDF Data"
-            
-            row_num = 1
-            
-            # Extract text from each page
-            for page_num, page in enumerate(reader.pages, 1):
-                text = page.extract_text()
+            with pdf_path_for(pdf_file) as pdf_path:
+                page_count = len(LayoutReader(pdf_path).pages)
                 
-                # Add page header
-                ws.cell(row=row_num, column=1, value=f"Page {page_num}")
-                row_num += 1
+                # Write-only workbook: rows are streamed to disk as they are
+                # appended, so memory is bounded by the page in flight
+                wb = Workbook(write_only=True)
+                sheets = []
+                rows_in_sheet = EXCEL_MAX_ROWS
                 
-                # Split text into lines and add to cells
-                lines = text.split('\n')
-                for line in lines:
-                    if line.strip():
-                        # Try to split by common delimiters
-                        cells = line.split('\t') if '\t' in line else [line]
-                        for col_num, cell_value in enumerate(cells, 1):
-                            ws.cell(row=row_num, column=col_num, value=cell_value.strip())
-                        row_num += 1
+                def append(values):
+                    nonlocal rows_in_sheet
+                    if rows_in_sheet >= EXCEL_MAX_ROWS:
+                        # Roll over to a new sheet at Excel's row limit
+                        title = "PDF Data" if not sheets else f"PDF Data {len(sheets) + 1}"
+                        sheets.append(wb.create_sheet(title))
+                        rows_in_sheet = 0
+                    sheets[-1].append(values)
+                    rows_in_sheet += 1
                 
-                row_num += 1  # Blank row between pages
-            
-            # Save workbook
-            wb.save(output_path)
+                pages = map_pages(pdf_path, page_tables, range(page_count), processes)
+                for page_num, rows in enumerate(pages, 1):
+                    # Add page header
+                    append([f"Page {page_num}"])
+                    
+                    for row in rows:
+                        append([value if value != '' else None for value in row])
+                    
+                    append([])  # Blank row between pages
+                
+                if not sheets:
+                    wb.create_sheet("PDF Data")
+                
+                # Save workbook
+                wb.save(output_path)
             
             return output_path
             
@@ -170,18 +305,40 @@ class ConvertFromPDF:
             raise Exception(f"Error converting PDF to Excel: {str(e)}")
     
     @staticmethod
-    def pdf_to_powerpoint(pdf_file: BinaryIO, output_path: Path) -> Path:
+    def pdf_to_powerpoint(pdf_file: BinaryIO, output_path: Path, mode: str = "image",
+                          dpi: int = 150, selectable_text: bool = False,
+                          thread_count: int = None, processes: int = None) -> Path:
         """
         Convert PDF to PowerPoint
         
+        In "image" mode every page becomes a full-slide picture. Pages are
+        rendered in concurrent batches straight to disk, and the images
+        are only read back while the PPTX is written, so memory does not
+        grow with the deck. Identical page images share one media file.
+        With selectable_text, each text line is added as an invisible
+        text box over the picture (not on rotated pages).
+        
+        "text" mode puts each page's extracted text on a Title and Content
+        slide.
+        
         Args:
             pdf_file: PDF file object
             output_path: Path to save PPTX file
+            mode: 'image' or 'text'
+            dpi: Slide image resolution (image mode)
+            selectable_text: Overlay invisible text boxes (image mode)
+            thread_count: Concurrent render batches (default: CPU count)
+            processes: Worker processes for text extraction (default: CPU count)
             
         Returns:
             Path to PPTX file
         """
         try:
+            if mode == "image":
+                return ConvertFromPDF._pdf_to_picture_slides(
+                    pdf_file, output_path, dpi, selectable_text, thread_count, processes
+                )
+            
             from pptx import Presentation
             from pptx.util import Inches, Pt
             
@@ -221,32 +378,99 @@ class ConvertFromPDF:
             raise Exception(f"Error converting PDF to PowerPoint: {str(e)}")
     
     @staticmethod
-    def pdf_to_pdfa(pdf_file: BinaryIO, output_path: Path) -> Path:
+    def _pdf_to_picture_slides(pdf_file: BinaryIO, output_path: Path, dpi: int,
+                               selectable_text: bool, thread_count: int,
+                               processes: int) -> Path:
+        """Build a deck of full-slide page pictures"""
+        import shutil
+        import tempfile
+        from pypdf import PdfReader as LayoutReader
+        from .parallel import map_pages
+        from .rasterize import PageRasterizer
+        from .inputs import pdf_path_for
+        from .slides import PictureDeck
+        from .text_layout import page_text_lines
+        
+        with pdf_path_for(pdf_file) as pdf_path:
+            reader = LayoutReader(pdf_path)
+            sizes = []
+            for page in reader.pages:
+                box = page.cropbox
+                width, height = float(box.width), float(box.height)
+                sizes.append((height, width) if page.rotation % 180 else (width, height))
+            del reader
+            
+            work_dir = Path(tempfile.mkdtemp(prefix='slides_', dir=output_path.parent))
+            try:
+                images = PageRasterizer.render_to_files(
+                    pdf_path, work_dir, 'jpg', dpi, quality=90, thread_count=thread_count,
+                    use_cropbox=True
+                )
+                
+                # Slide size follows the first page; other pages are fitted
+                deck = PictureDeck(*sizes[0])
+                if selectable_text:
+                    texts = map_pages(pdf_path, page_text_lines, range(len(images)), processes)
+                else:
+                    texts = ({'rotation': 0, 'lines': []} for _ in images)
+                
+                for image_path, (width, height), text in zip(images, sizes, texts):
+                    lines = text['lines'] if text['rotation'] == 0 else None
+                    deck.add_page(image_path, width, height, lines)
+                
+                deck.save(output_path)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        
+        return output_path
+    
+    @staticmethod
+    def pdf_to_pdfa(pdf_file: BinaryIO, output_path: Path, linearize: bool = False,
+                    password: str = None) -> Path:
         """
-        Convert PDF to PDF/A (archival format)
+        Convert PDF to PDF/A-2b (archival format)
         
         Args:
             pdf_file: PDF file object
             output_path: Path to save PDF/A file
+            linearize: Linearize the output (slower; off by default)
+            password: Password for encrypted PDFs
             
         Returns:
             Path to PDF/A file
         """
-        try:
-            # Use pikepdf to convert to PDF/A
-            pdf = pikepdf.open(pdf_file)
+        return ConvertFromPDF.pdf_to_pdfa_with_report(pdf_file, output_path, linearize, password)[0]
+    
+    @staticmethod
+    def pdf_to_pdfa_with_report(pdf_file: BinaryIO, output_path: Path,
+                                linearize: bool = False, password: str = None) -> Tuple[Path, dict]:
+        """
+        Convert PDF to PDF/A-2b and report conformance
+        
+        One sRGB OutputIntent and PDF/A metadata are added. A single pass
+        over the object graph finds fonts that are not embedded and
+        features PDF/A forbids; actions, annotation flags, LZW streams and
+        image alternates are fixed in place and encryption is dropped. The
+        file is saved without linearization or recompression unless
+        linearize is set.
+        
+        Args:
+            pdf_file: PDF file object
+            output_path: Path to save PDF/A file
+            linearize: Linearize the output (slower; off by default)
+            password: Password for encrypted PDFs
             
-            # Add PDF/A metadata
-            with pdf.open_metadata() as meta:
-                meta['pdf:PDFVersion'] = '1.4'
-                meta['pdfaid:part'] = '1'
-                meta['pdfaid:conformance'] = 'B'
+        Returns:
+            Tuple of (path to PDF/A file, report). The report has
+            conformant, issues (unfixable problems), fixed and notes.
+        """
+        try:
+            from .pdfa import convert_to_pdfa
             
-            # Save as PDF/A
-            pdf.save(output_path, linearize=True)
-            pdf.close()
+            with pikepdf.open(pdf_file, password=password or '') as pdf:
+                report = convert_to_pdfa(pdf, output_path, linearize)
             
-            return output_path
+            return output_path, report
             
         except Exception as e:
             raise Exception(f"Error converting to PDF/A: {str(e)}")
@@ -9,7 +9,6 @@ Convert TO PDF Tools
 from pathlib import Path
 from typing import BinaryIO, List
 from PIL import Image
-from docx import Document
 from openpyxl import load_workbook
 from pptx import Presentation
 import io
@@ -64,7 +63,12 @@ class ConvertToPDF:
         """
         Convert Word document to PDF
         
-        Note: This is a simplified version. For production, use:
+        The document body is streamed element by element (paragraphs,
+        headings, lists, tables and inline images) and laid out with a
+        bounded window of flowables, so memory stays per-page rather than
+        per-document even for very large files.
+        
+        Note: Layout is approximate. For pixel-exact output, use:
         - docx2pdf library (Windows only)
         - LibreOffice in headless mode (cross-platform)
         - Cloud conversion API
@@ -77,36 +81,11 @@ class ConvertToPDF:
             Path to PDF
         """
         try:
-            # This is a placeholder implementation
-            # Real implementation would require additional dependencies
-            
-            # Option 1: Use docx2pdf (Windows only)
-            # from docx2pdf import convert
-            # convert(docx_file, output_path)
-            
-            # Option 2: Use LibreOffice
-            # subprocess.run(['soffice', '--headless', '--convert-to', 'pdf', '--outdir', output_dir, docx_path])
-            
-            # For now, we'll create a basic PDF from Word content
-            from reportlab.lib.pagesizes import letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-            
-            doc = Document(docx_file)
-            
-            # Create PDF
-            pdf_doc = SimpleDocTemplate(str(output_path), pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    p = Paragraph(para.text, styles['Normal'])
-                    story.append(p)
-                    story.append(Spacer(1, 12))
+            from .docx_render import DocxStreamRenderer
             
-            pdf_doc.build(story)
+            docx_file.seek(0)
+            renderer = DocxStreamRenderer(docx_file)
+            renderer.render(output_path)
             
             return output_path
             
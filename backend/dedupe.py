@@ -0,0 +1,531 @@
+"""
+Near-duplicate detection across a corpus of PDFs
+- Each document gets a MinHash signature over word shingles of its text;
+  pages without text get a perceptual hash (dHash) of their largest
+  image, so scans of the same document match too
+- Signatures are computed in worker processes with a bounded number of
+  documents in flight
+- Signatures, page hashes and their LSH band buckets live in a SQLite
+  file, so an archive is indexed incrementally and candidate pairs come
+  from bucket collisions instead of comparing every pair of documents
+"""
+import hashlib
+import re
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .inputs import open_reader
+from .parallel import TASKS_PER_WORKER, default_process_count
+
+# Words per text shingle
+SHINGLE_WORDS = 5
+
+# MinHash size and its split into LSH bands; a pair becomes a candidate
+# with probability 1 - (1 - s^ROWS)^BANDS, about 50% at s = 0.71
+BANDS = 16
+ROWS = 8
+NUM_PERM = BANDS * ROWS
+
+# Page hashes are split into IMAGE_BANDS buckets, so pages within
+# IMAGE_BANDS - 1 differing bits always share a bucket; pages within
+# IMAGE_DISTANCE bits count as the same image
+IMAGE_BANDS = 4
+IMAGE_DISTANCE = 10
+
+DEFAULT_THRESHOLD = 0.8
+
+# Shingle hashes processed per NumPy block (bounds memory per document)
+HASH_BLOCK = 4096
+
+_rng = np.random.default_rng(0x5eed)
+# Multiply-shift hash family: (a * x + b) >> 32 over 64-bit words, a odd
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r'\w+')
+
+
+def file_digest(pdf_path: Path) -> str:
+    """SHA-256 of a file, read in chunks"""
+    h = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def minhash(tokens: Iterable[str]) -> np.ndarray:
+    """
+    MinHash signature (NUM_PERM uint32 values) of a set of tokens
+
+    An empty set gives the all-ones signature, which only matches other
+    empty documents.
+    """
+    hashes = np.fromiter({zlib.crc32(token.encode()) for token in tokens}, dtype=np.uint64)
+    signature = np.full(NUM_PERM, 0xffffffff, dtype=np.uint64)
+    for start in range(0, hashes.size, HASH_BLOCK):
+        block = hashes[start:start + HASH_BLOCK]
+        values = (_A[:, None] * block[None, :] + _B[:, None]) >> np.uint64(32)
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def similarity(signature1: np.ndarray, signature2: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return float(np.mean(signature1 == signature2))
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """One 64-bit bucket key per LSH band"""
+    return [int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'big', signed=True)
+            for band in signature.reshape(BANDS, ROWS)]
+
+
+def text_shingles(words: List[str]) -> List[str]:
+    if len(words) < SHINGLE_WORDS:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def dhash(image) -> int:
+    """64-bit difference hash of a PIL image"""
+    from PIL import Image
+
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def image_hash(page) -> Optional[int]:
+    """dHash of the largest image on a page, None without a usable image"""
+    xobjects = page.get('/Resources', {}).get('/XObject', {})
+    images = [xobject.get_object() for xobject in xobjects.values()]
+    images = [image for image in images if image.get('/Subtype') == '/Image']
+    if not images:
+        return None
+    largest = max(images, key=lambda image: int(image.get('/Width', 0)) * int(image.get('/Height', 0)))
+    try:
+        value = dhash(largest.decode_as_image())
+    except Exception:
+        return None
+    # A flat image has no gradient to hash and would match every other
+    return value or None
+
+
+def image_band_keys(value: int) -> List[Tuple[int, int]]:
+    """(band, key) buckets of a page hash, numbered after the MinHash bands"""
+    bits = 64 // IMAGE_BANDS
+    return [(BANDS + band, (value >> (bits * band)) & ((1 << bits) - 1)) for band in range(IMAGE_BANDS)]
+
+
+def _signed(value: int) -> int:
+    """Store an unsigned 64-bit hash in an SQLite integer"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def image_similarity(hashes1: np.ndarray, hashes2: np.ndarray) -> float:
+    """Share of image pages with a counterpart within IMAGE_DISTANCE bits"""
+    if hashes1.size == 0 or hashes2.size == 0:
+        return 0.0
+    xor = (hashes1[:, None] ^ hashes2[None, :]).astype('>u8')
+    distance = np.unpackbits(xor.view(np.uint8).reshape(xor.shape + (8,)), axis=-1).sum(axis=-1)
+    matched = min(int((distance.min(axis=1) <= IMAGE_DISTANCE).sum()),
+                  int((distance.min(axis=0) <= IMAGE_DISTANCE).sum()))
+    return matched / max(hashes1.size, hashes2.size)
+
+
+def document_features(pdf_path: str, password: str = None) -> dict:
+    """
+    MinHash signature and page image hashes of one document
+
+    Runs in worker processes, so the result only holds plain data.
+
+    Returns:
+        Dictionary with pages, text_pages, kind ('text', 'image', 'mixed'
+        or 'empty'), signature (bytes, None without text) and
+        image_hashes (one per page without text but with an image), or
+        error when the file cannot be read
+    """
+    try:
+        with open_reader(pdf_path, password) as reader:
+            words = []
+            text_pages = 0
+            image_hashes = []
+            for page in reader.pages:
+                page_words = _WORD.findall((page.extract_text() or '').lower())
+                if page_words:
+                    words.extend(page_words)
+                    text_pages += 1
+                else:
+                    value = image_hash(page)
+                    if value is not None:
+                        image_hashes.append(value)
+
+            if words and image_hashes:
+                kind = 'mixed'
+            elif words:
+                kind = 'text'
+            else:
+                kind = 'image' if image_hashes else 'empty'
+            return {
+                'pages': len(reader.pages),
+                'text_pages': text_pages,
+                'kind': kind,
+                'signature': minhash(text_shingles(words)).tobytes() if words else None,
+                'image_hashes': image_hashes,
+            }
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def _iter_features(paths: List[str], processes: int, password: Optional[str]) -> Iterator[dict]:
+    """document_features for each path, in order, with a bounded window in flight"""
+    processes = min(processes or default_process_count(), len(paths))
+    if processes <= 1:
+        for path in paths:
+            yield document_features(path, password)
+        return
+
+    window = processes * TASKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = []
+        remaining = iter(paths)
+        for path in remaining:
+            pending.append(executor.submit(document_features, path, password))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.pop(0).result()
+            for path in remaining:
+                pending.append(executor.submit(document_features, path, password))
+                break
+            yield result
+
+
+def _chunks(items: Iterable[int], size: int = 500) -> Iterator[List[int]]:
+    """Lists of at most size items, for SQLite IN (...) parameters"""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _UnionFind:
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, a: int, b: int):
+        self.parent[self.find(a)] = self.find(b)
+
+
+class DuplicateIndex:
+    """
+    On-disk MinHash LSH index
+
+    Documents are keyed by the SHA-256 of their bytes, so files already
+    indexed are skipped and identical copies under other names are
+    recorded against the same document.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY, digest TEXT UNIQUE, pages INTEGER, text_pages INTEGER,
+            kind TEXT, signature BLOB);
+        CREATE TABLE IF NOT EXISTS names (document INTEGER, name TEXT, UNIQUE (document, name));
+        CREATE TABLE IF NOT EXISTS image_pages (document INTEGER, hash INTEGER);
+        CREATE INDEX IF NOT EXISTS image_pages_document ON image_pages (document);
+        CREATE TABLE IF NOT EXISTS buckets (band INTEGER, key INTEGER, document INTEGER);
+        CREATE INDEX IF NOT EXISTS buckets_key ON buckets (band, key);
+        CREATE INDEX IF NOT EXISTS buckets_document ON buckets (document);
+    """
+
+    def __init__(self, index_path: Path):
+        self.db = sqlite3.connect(str(index_path))
+        self.db.executescript(self.SCHEMA)
+        layout = f"{BANDS}x{ROWS}/{SHINGLE_WORDS}/{IMAGE_BANDS}"
+        stored = self.db.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if stored is None:
+            self.db.execute("INSERT INTO meta VALUES ('layout', ?)", (layout,))
+            self.db.commit()
+        elif stored[0] != layout:
+            raise ValueError(f"Index was built with layout {stored[0]}, expected {layout}")
+
+    def close(self):
+        self.db.close()
+
+    def _document_id(self, digest: str) -> Optional[int]:
+        row = self.db.execute("SELECT id FROM documents WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def add_documents(self, pdf_paths: List[Path], names: List[str] = None,
+                      processes: int = None, password: str = None) -> dict:
+        """
+        Index documents, skipping contents that are already indexed
+
+        Args:
+            pdf_paths: PDFs to index
+            names: Names recorded for the documents (default: the paths)
+            processes: Worker processes (default: CPU count)
+            password: User password for encrypted PDFs
+
+        Returns:
+            Dictionary with indexed, skipped, failed (name and error per
+            file) and documents (index id per input file, None on failure)
+        """
+        names = names or [str(path) for path in pdf_paths]
+        ids: List[Optional[int]] = [None] * len(pdf_paths)
+        jobs = []
+        skipped = 0
+        for position, (path, name) in enumerate(zip(pdf_paths, names)):
+            digest = file_digest(path)
+            document_id = self._document_id(digest)
+            if document_id is None:
+                jobs.append((position, digest))
+            else:
+                ids[position] = document_id
+                self.db.execute("INSERT OR IGNORE INTO names VALUES (?, ?)", (document_id, name))
+                skipped += 1
+
+        failed = []
+        indexed = 0
+        features = _iter_features([str(pdf_paths[position]) for position, _ in jobs], processes, password)
+        for count, ((position, digest), result) in enumerate(zip(jobs, features), 1):
+            if 'error' in result:
+                failed.append({'name': names[position], 'error': result['error']})
+                continue
+            document_id = self._document_id(digest)
+            if document_id is None:
+                document_id = self._insert(digest, result)
+                indexed += 1
+            else:
+                # Identical bytes earlier in the same batch
+                skipped += 1
+            ids[position] = document_id
+            self.db.execute("INSERT OR IGNORE INTO names VALUES (?, ?)", (document_id, names[position]))
+            if count % 500 == 0:
+                self.db.commit()
+        self.db.commit()
+
+        return {
+            'indexed': indexed,
+            'skipped': skipped,
+            'failed': failed,
+            'documents': ids,
+        }
+
+    def _insert(self, digest: str, result: dict) -> int:
+        document_id = self.db.execute(
+            "INSERT INTO documents (digest, pages, text_pages, kind, signature) VALUES (?, ?, ?, ?, ?)",
+            (digest, result['pages'], result['text_pages'], result['kind'], result['signature'])).lastrowid
+
+        buckets = set()
+        if result['signature'] is not None:
+            signature = np.frombuffer(result['signature'], dtype=np.uint32)
+            buckets.update(enumerate(band_keys(signature)))
+        for value in result['image_hashes']:
+            buckets.update(image_band_keys(value))
+        self.db.executemany("INSERT INTO buckets VALUES (?, ?, ?)",
+                            [(band, key, document_id) for band, key in buckets])
+        self.db.executemany("INSERT INTO image_pages VALUES (?, ?)",
+                            [(document_id, _signed(value)) for value in result['image_hashes']])
+        return document_id
+
+    def _features(self, document_ids: Iterable[int]) -> Dict[int, tuple]:
+        """(signature or None, text pages, image page hashes) per document"""
+        features = {}
+        for chunk in _chunks(document_ids):
+            marks = ','.join('?' * len(chunk))
+            hashes: Dict[int, List[int]] = {}
+            for document, value in self.db.execute(
+                    f"SELECT document, hash FROM image_pages WHERE document IN ({marks})", chunk):
+                hashes.setdefault(document, []).append(value)
+            for document, text_pages, signature in self.db.execute(
+                    f"SELECT id, text_pages, signature FROM documents WHERE id IN ({marks})", chunk):
+                features[document] = (
+                    np.frombuffer(signature, dtype=np.uint32) if signature is not None else None,
+                    text_pages,
+                    np.array(hashes.get(document, []), dtype=np.int64).view(np.uint64),
+                )
+        return features
+
+    @staticmethod
+    def score(features1: tuple, features2: tuple) -> float:
+        """
+        Similarity of two documents
+
+        Text and image pages are scored separately (MinHash estimate and
+        share of matching page images) and weighted by page count.
+        """
+        signature1, text_pages1, hashes1 = features1
+        signature2, text_pages2, hashes2 = features2
+        text_weight = max(text_pages1, text_pages2)
+        image_weight = max(hashes1.size, hashes2.size)
+        if text_weight + image_weight == 0:
+            return 0.0
+        text_score = similarity(signature1, signature2) if signature1 is not None and signature2 is not None else 0.0
+        return (text_weight * text_score + image_weight * image_similarity(hashes1, hashes2)) / (
+            text_weight + image_weight)
+
+    def _colliding(self, documents: Optional[Iterable[int]]) -> Iterator[Tuple[Tuple[int, int], List[int]]]:
+        """
+        ((band, key), document ids) for buckets holding more than one
+        document; with documents, only the buckets those documents are in
+        """
+        if documents is None:
+            queries = [("SELECT band, key, group_concat(document) FROM buckets "
+                        "GROUP BY band, key HAVING count(*) > 1", [])]
+        else:
+            queries = [(f"""
+                SELECT b.band, b.key, group_concat(b.document) FROM buckets b
+                JOIN (SELECT DISTINCT band, key FROM buckets
+                      WHERE document IN ({','.join('?' * len(chunk))})) q
+                  ON b.band = q.band AND b.key = q.key
+                GROUP BY b.band, b.key HAVING count(*) > 1""", chunk) for chunk in _chunks(documents)]
+        for query, args in queries:
+            for band, key, members in self.db.execute(query, args):
+                yield (band, key), [int(v) for v in members.split(',')]
+
+    def clusters(self, threshold: float = DEFAULT_THRESHOLD,
+                 documents: Iterable[int] = None) -> List[dict]:
+        """
+        Groups of near-duplicate documents
+
+        Documents sharing an LSH bucket (text band or page image band) are
+        candidates; a candidate joins the group of the bucket's first
+        document when their score reaches threshold. Only documents that
+        collide in some band are ever compared.
+
+        With documents, only the buckets of those documents are read, then
+        the buckets of each document they match, and so on, so the cost
+        follows the groups found rather than the size of the index.
+
+        Args:
+            threshold: Minimum score (0-1), see score
+            documents: Only report groups containing one of these ids
+
+        Returns:
+            Groups, largest first, with size, similarity (lowest match
+            within the group) and names (every file name recorded for the
+            group's documents)
+        """
+        wanted = set(documents) if documents is not None else None
+        groups = _UnionFind()
+        lowest: Dict[Tuple[int, int], float] = {}
+        features: Dict[int, tuple] = {}
+        seen_buckets = set()
+        explored = set(wanted) if wanted is not None else None
+        pending = explored
+        while True:
+            buckets = {bucket: members for bucket, members in self._colliding(pending)
+                       if bucket not in seen_buckets}
+            seen_buckets.update(buckets)
+            features.update(self._features(
+                {document for members in buckets.values() for document in members} - features.keys()))
+
+            joined = set()
+            for bucket in buckets.values():
+                first = bucket[0]
+                for other in bucket[1:]:
+                    if groups.find(first) == groups.find(other):
+                        continue
+                    score = self.score(features[first], features[other])
+                    if score >= threshold:
+                        groups.union(other, first)
+                        lowest[(other, first)] = score
+                        joined.update((first, other))
+
+            if wanted is None:
+                break
+            # Follow matches outward so groups also reach documents that only
+            # match other members
+            pending = joined - explored
+            if not pending:
+                break
+            explored |= pending
+
+        members: Dict[int, List[int]] = {}
+        for document in groups.parent:
+            members.setdefault(groups.find(document), []).append(document)
+
+        scores: Dict[int, float] = {}
+        for (document, _), score in lowest.items():
+            root = groups.find(document)
+            scores[root] = min(scores.get(root, 1.0), score)
+
+        names: Dict[int, List[str]] = {}
+        if wanted is None:
+            rows = self.db.execute("SELECT document, name FROM names ORDER BY name")
+        else:
+            rows = (row for chunk in _chunks(set(groups.parent) | wanted) for row in self.db.execute(
+                f"SELECT document, name FROM names WHERE document IN ({','.join('?' * len(chunk))}) "
+                "ORDER BY name", chunk))
+        for document, name in rows:
+            names.setdefault(document, []).append(name)
+
+        # Copies with identical bytes share one document but several names
+        for document, document_names in names.items():
+            if len(document_names) > 1 and document not in groups.parent:
+                members[document] = [document]
+                scores[document] = 1.0
+
+        result = []
+        for root, group in members.items():
+            if len(group) < 2 and len(names.get(group[0], [])) < 2:
+                continue
+            if wanted is not None and wanted.isdisjoint(group):
+                continue
+            group_names = sorted(name for document in group for name in names.get(document, []))
+            result.append({
+                'size': len(group_names),
+                'similarity': round(scores.get(root, 1.0), 3),
+                'names': group_names,
+            })
+        return sorted(result, key=lambda c: (-c['size'], c['names']))
+
+
+def write_report(clusters: List[dict], report_path: Path) -> Path:
+    """Write clusters as CSV rows of (cluster, similarity, name)"""
+    import csv
+
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['cluster', 'similarity', 'name'])
+        for number, cluster in enumerate(clusters, 1):
+            for name in cluster['names']:
+                writer.writerow([number, cluster['similarity'], name])
+    return report_path
+
+
+def find_duplicates(pdf_paths: List[Path], index_path: Path, threshold: float = DEFAULT_THRESHOLD,
+                    processes: int = None, names: List[str] = None, password: str = None,
+                    report_path: Path = None) -> dict:
+    """
+    Index PDFs and report the near-duplicate groups they belong to
+
+    Returns:
+        Dictionary with indexed, skipped, failed and clusters
+    """
+    index = DuplicateIndex(index_path)
+    try:
+        added = index.add_documents(pdf_paths, names, processes, password)
+        documents = [document for document in added.pop('documents') if document is not None]
+        clusters = index.clusters(threshold, documents)
+    finally:
+        index.close()
+
+    if report_path is not None:
+        write_report(clusters, report_path)
+    added['clusters'] = clusters
+    return added
@@ -0,0 +1,436 @@
+"""
+Streaming DOCX renderer
+- Walks word/document.xml incrementally instead of loading the whole document
+- Renders paragraphs, headings, lists, tables and inline images
+- Feeds reportlab a bounded window of flowables so memory stays per-page
+"""
+import io
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from lxml import etree
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import (
+    Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+)
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+WP_NS = 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+EMU_PER_POINT = 12700
+TWIPS_PER_POINT = 20
+
+# Large tables are emitted in row chunks so a single Table never spans
+# more than a few pages worth of cells
+TABLE_CHUNK_ROWS = 40
+
+ALIGNMENTS = {
+    'left': TA_LEFT,
+    'start': TA_LEFT,
+    'center': TA_CENTER,
+    'right': TA_RIGHT,
+    'end': TA_RIGHT,
+    'both': TA_JUSTIFY,
+    'distribute': TA_JUSTIFY,
+}
+
+
+def w(tag: str) -> str:
+    """Qualify a WordprocessingML tag name"""
+    return f'{{{W_NS}}}{tag}'
+
+
+class _FlowableFeed(list):
+    """
+    List of flowables that refills itself from a generator
+
+    reportlab's build loop checks ``len(flowables)`` before handling each
+    flowable, so topping the list up there keeps only ``window`` flowables
+    alive at a time while still letting keepWithNext look ahead.
+    """
+
+    def __init__(self, source: Iterator, window: int = 64):
+        super().__init__()
+        self._source = source
+        self._window = window
+
+    def __len__(self):
+        while self._source is not None and list.__len__(self) < self._window:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return list.__len__(self)
+
+
+class DocxStreamRenderer:
+    """Render a DOCX package to PDF one body element at a time"""
+
+    def __init__(self, docx_file: BinaryIO, pagesize=letter):
+        self.package = zipfile.ZipFile(docx_file)
+        self.pagesize = pagesize
+        self.styles = getSampleStyleSheet()
+        self.document_part = self._find_document_part()
+        self.relationships = self._read_relationships(self.document_part)
+        self.heading_levels = self._read_heading_levels()
+        self._style_cache: Dict[tuple, ParagraphStyle] = {}
+        self.frame_width = 0
+        self.frame_height = 0
+
+    def render(self, output_path: Path) -> Path:
+        """Render the document to output_path"""
+        pdf_doc = SimpleDocTemplate(str(output_path), pagesize=self.pagesize)
+        self.frame_width = pdf_doc.width
+        self.frame_height = pdf_doc.height
+
+        pdf_doc.build(_FlowableFeed(self.iter_flowables()))
+        self.package.close()
+
+        return output_path
+
+    def iter_flowables(self) -> Iterator:
+        """Yield flowables for each top-level body element in document order"""
+        produced = False
+
+        with self.package.open(self.document_part) as stream:
+            for _, elem in etree.iterparse(stream, events=('end',),
+                                           tag=(w('p'), w('tbl'))):
+                # Paragraphs inside tables and text boxes are rendered by
+                # their enclosing block
+                if any(a.tag in (w('tbl'), w('txbxContent')) for a in elem.iterancestors()):
+                    continue
+
+                if elem.tag == w('tbl'):
+                    flowables = self._table_flowables(elem)
+                else:
+                    flowables = self._paragraph_flowables(elem)
+
+                for flowable in flowables:
+                    produced = True
+                    yield flowable
+
+                # Drop the parsed subtree so the XML tree never grows
+                parent = elem.getparent()
+                elem.clear()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+
+        # reportlab refuses to build an empty story
+        if not produced:
+            yield Spacer(1, 1)
+
+    # Package parts
+
+    def _find_document_part(self) -> str:
+        try:
+            rels = etree.fromstring(self.package.read('_rels/.rels'))
+            for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+                if rel.get('Type') == OFFICE_DOCUMENT_REL:
+                    return rel.get('Target').lstrip('/')
+        except KeyError:
+            pass
+        return 'word/document.xml'
+
+    def _read_relationships(self, part: str) -> Dict[str, str]:
+        folder, name = posixpath.split(part)
+        rels_part = posixpath.join(folder, '_rels', f'{name}.rels')
+
+        try:
+            rels = etree.fromstring(self.package.read(rels_part))
+        except KeyError:
+            return {}
+
+        targets = {}
+        for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target')
+            if target.startswith('/'):
+                targets[rel.get('Id')] = target.lstrip('/')
+            else:
+                targets[rel.get('Id')] = posixpath.normpath(posixpath.join(folder, target))
+        return targets
+
+    def _read_heading_levels(self) -> Dict[str, int]:
+        """Map paragraph style ids to heading levels (0 = Title)"""
+        try:
+            styles = etree.fromstring(self.package.read('word/styles.xml'))
+        except KeyError:
+            return {}
+
+        levels = {}
+        for style in styles.iter(w('style')):
+            style_id = style.get(w('styleId'))
+            name_elem = style.find(w('name'))
+            name = (name_elem.get(w('val')) if name_elem is not None else '').lower()
+
+            if name == 'title':
+                levels[style_id] = 0
+            elif name.startswith('heading '):
+                try:
+                    levels[style_id] = min(int(name.split()[1]), 6)
+                except ValueError:
+                    pass
+            else:
+                outline = style.find(f"{w('pPr')}/{w('outlineLvl')}")
+                # Outline level 9 is body text
+                if outline is not None and int(outline.get(w('val'))) < 9:
+                    levels[style_id] = min(int(outline.get(w('val'))) + 1, 6)
+        return levels
+
+    # Paragraphs
+
+    def _paragraph_style(self, p_elem, in_table: bool = False) -> ParagraphStyle:
+        ppr = p_elem.find(w('pPr'))
+        style_id = None
+        alignment = None
+        is_list = False
+
+        if ppr is not None:
+            pstyle = ppr.find(w('pStyle'))
+            if pstyle is not None:
+                style_id = pstyle.get(w('val'))
+            jc = ppr.find(w('jc'))
+            if jc is not None:
+                alignment = ALIGNMENTS.get(jc.get(w('val')))
+            is_list = ppr.find(w('numPr')) is not None
+
+        level = self.heading_levels.get(style_id)
+        if level == 0:
+            base = 'Title'
+        elif level is not None:
+            base = f'Heading{level}'
+        elif in_table:
+            base = 'BodyText'
+        else:
+            base = 'Normal'
+
+        key = (base, alignment, is_list)
+        if key not in self._style_cache:
+            parent = self.styles[base]
+            overrides = {}
+            if alignment is not None:
+                overrides['alignment'] = alignment
+            if is_list:
+                overrides['leftIndent'] = parent.leftIndent + 18
+                overrides['bulletIndent'] = parent.leftIndent + 6
+            if in_table:
+                overrides['spaceBefore'] = 0
+                overrides['spaceAfter'] = 0
+            else:
+                overrides['spaceAfter'] = max(parent.spaceAfter, 6)
+            self._style_cache[key] = ParagraphStyle(
+                f'{base}-{len(self._style_cache)}', parent=parent, **overrides
+            )
+        return self._style_cache[key]
+
+    def _paragraph_flowables(self, p_elem, in_table: bool = False) -> List:
+        """Split a paragraph into text, image and page-break flowables"""
+        style = self._paragraph_style(p_elem, in_table)
+        is_list = p_elem.find(f"{w('pPr')}/{w('numPr')}") is not None
+        flowables = []
+        markup: List[str] = []
+
+        def flush_text():
+            text = ''.join(markup).strip()
+            markup.clear()
+            if text:
+                if is_list:
+                    flowables.append(Paragraph(text, style, bulletText='•'))
+                else:
+                    flowables.append(Paragraph(text, style))
+
+        for run in p_elem.iter(w('r')):
+            rpr = run.find(w('rPr'))
+            open_tags, close_tags = self._run_tags(rpr)
+
+            for child in run:
+                if child.tag == w('t'):
+                    markup.append(open_tags + escape(child.text or '') + close_tags)
+                elif child.tag == w('tab'):
+                    markup.append('&nbsp;' * 4)
+                elif child.tag in (w('br'), w('cr')):
+                    if child.get(w('type')) == 'page' and not in_table:
+                        flush_text()
+                        flowables.append(PageBreak())
+                    else:
+                        markup.append('<br/>')
+                elif child.tag == w('drawing'):
+                    image = self._image_flowable(child)
+                    if image is not None:
+                        flush_text()
+                        flowables.append(image)
+
+        flush_text()
+
+        # Keep blank paragraphs as vertical space, like Word does
+        if not flowables and not in_table:
+            flowables.append(Spacer(1, style.leading))
+
+        return flowables
+
+    @staticmethod
+    def _run_tags(rpr):
+        if rpr is None:
+            return '', ''
+
+        def enabled(tag):
+            elem = rpr.find(w(tag))
+            return elem is not None and elem.get(w('val'), 'true') not in ('0', 'false', 'none')
+
+        tags = []
+        if enabled('b'):
+            tags.append('b')
+        if enabled('i'):
+            tags.append('i')
+        if enabled('u'):
+            tags.append('u')
+        if enabled('strike'):
+            tags.append('strike')
+
+        vert = rpr.find(w('vertAlign'))
+        if vert is not None and vert.get(w('val')) in ('superscript', 'subscript'):
+            tags.append('super' if vert.get(w('val')) == 'superscript' else 'sub')
+
+        open_tags = ''.join(f'<{t}>' for t in tags)
+        close_tags = ''.join(f'</{t}>' for t in reversed(tags))
+        return open_tags, close_tags
+
+    # Images
+
+    def _image_flowable(self, drawing, max_width: float = None) -> Optional[Image]:
+        blip = drawing.find(f'.//{{{A_NS}}}blip')
+        if blip is None:
+            return None
+
+        target = self.relationships.get(blip.get(f'{{{R_NS}}}embed'))
+        if not target:
+            return None
+
+        extent = drawing.find(f'.//{{{WP_NS}}}extent')
+        try:
+            data = self.package.read(target)
+            image = Image(io.BytesIO(data))
+        except Exception:
+            # Formats reportlab cannot draw (EMF/WMF) are skipped
+            return None
+
+        if extent is not None:
+            width = int(extent.get('cx')) / EMU_PER_POINT
+            height = int(extent.get('cy')) / EMU_PER_POINT
+        else:
+            width, height = image.imageWidth, image.imageHeight
+
+        # Scale down to fit the frame, keeping aspect ratio
+        max_width = max_width or self.frame_width
+        scale = min(1.0, max_width / width if width else 1.0,
+                    self.frame_height / height if height else 1.0)
+        image.drawWidth = width * scale
+        image.drawHeight = height * scale
+
+        return image
+
+    # Tables
+
+    def _table_flowables(self, tbl_elem) -> List:
+        col_widths = [
+            int(col.get(w('w'), 0)) / TWIPS_PER_POINT
+            for col in tbl_elem.findall(f"{w('tblGrid')}/{w('gridCol')}")
+        ]
+
+        rows = []
+        spans = []
+        header_rows = 0
+
+        for row_idx, tr in enumerate(tbl_elem.findall(w('tr'))):
+            trpr = tr.find(w('trPr'))
+            if trpr is not None and trpr.find(w('tblHeader')) is not None and row_idx == header_rows:
+                header_rows += 1
+
+            row = []
+            for tc in tr.findall(w('tc')):
+                span_elem = tc.find(f"{w('tcPr')}/{w('gridSpan')}")
+                span = int(span_elem.get(w('val'))) if span_elem is not None else 1
+
+                if span > 1:
+                    spans.append((len(row), row_idx, len(row) + span - 1))
+                row.append(self._cell_flowables(tc))
+                row.extend([''] * (span - 1))
+            rows.append(row)
+
+        if not rows:
+            return []
+
+        num_cols = max(len(col_widths), max(len(r) for r in rows))
+        for row in rows:
+            row.extend([''] * (num_cols - len(row)))
+
+        # Fit the grid to the frame; fall back to equal columns
+        if len(col_widths) == num_cols and sum(col_widths) > 0:
+            scale = min(1.0, self.frame_width / sum(col_widths))
+            col_widths = [max(c * scale, 12) for c in col_widths]
+        else:
+            col_widths = [self.frame_width / num_cols] * num_cols
+
+        header = rows[:header_rows]
+        body = rows[header_rows:]
+        flowables = []
+
+        chunk_size = max(TABLE_CHUNK_ROWS - header_rows, 1)
+        for start in range(0, max(len(body), 1), chunk_size):
+            chunk = header + body[start:start + chunk_size]
+            style = [
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ]
+            if header_rows:
+                style.append(('BACKGROUND', (0, 0), (-1, header_rows - 1), colors.whitesmoke))
+
+            for col, row_idx, end_col in spans:
+                if row_idx < header_rows:
+                    chunk_row = row_idx
+                elif start <= row_idx - header_rows < start + chunk_size:
+                    chunk_row = row_idx - header_rows - start + header_rows
+                else:
+                    continue
+                style.append(('SPAN', (col, chunk_row), (end_col, chunk_row)))
+
+            table = Table(chunk, colWidths=col_widths, repeatRows=header_rows)
+            table.setStyle(TableStyle(style))
+            flowables.append(table)
+
+        flowables.append(Spacer(1, 12))
+        return flowables
+
+    def _cell_flowables(self, tc_elem) -> List:
+        cell = []
+        for child in tc_elem:
+            if child.tag == w('p'):
+                for flowable in self._paragraph_flowables(child, in_table=True):
+                    if isinstance(flowable, Image):
+                        flowable = self._fit_image(flowable)
+                    cell.append(flowable)
+            elif child.tag == w('tbl'):
+                cell.extend(self._table_flowables(child))
+        return cell
+
+    def _fit_image(self, image: Image) -> Image:
+        # Cells are narrower than the frame; keep images from forcing
+        # the table wider than the page
+        limit = self.frame_width / 2
+        if image.drawWidth > limit:
+            ratio = limit / image.drawWidth
+            image.drawWidth *= ratio
+            image.drawHeight *= ratio
+        return image
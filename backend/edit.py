@@ -2,24 +2,33 @@
 PDF Editing Tools
 - Rotate PDF
 - Add page numbers
+- Bates numbering across files
 - Add watermark
-- Crop PDF
+- Crop PDF (manual margins or auto-crop to content)
+- N-up / Booklet imposition
+- Mail merge from a template PDF and CSV
 - Edit PDF
 """
 from pathlib import Path
-from typing import BinaryIO
-from PyPDF2 import PdfReader, PdfWriter, Transformation
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import Color, black
-from reportlab.lib.units import inch
-import io
+from typing import BinaryIO, List
+from PyPDF2 import PdfReader, PdfWriter
+import pikepdf
+
+# N-up layouts: cells per sheet -> (columns, rows, landscape sheet)
+NUP_GRIDS = {
+    2: (2, 1, True),
+    4: (2, 2, False),
+    6: (3, 2, True),
+    9: (3, 3, False),
+    16: (4, 4, False),
+}
 
 class PDFEditor:
     
     @staticmethod
     def rotate_pdf(pdf_file: BinaryIO, output_path: Path, 
-                   rotation: int = 90, pages: str = "all") -> Path:
+                   rotation: int = 90, pages: str = "all",
+                   incremental: bool = True) -> Path:
         """
         Rotate PDF pages
         
@@ -28,17 +37,16 @@ class PDFEditor:
             output_path: Path to save rotated PDF
             rotation: Rotation angle (90, 180, 270)
             pages: "all" or specific pages like "1,3,5" or "1-5"
+            incremental: Append only the changed page objects to a copy of
+                the original instead of rewriting the file
             
         Returns:
             Path to rotated PDF
         """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
-            
-            # Parse pages to rotate
+            # Parse pages to rotate (None = all)
             if pages == "all":
-                pages_to_rotate = set(range(len(reader.pages)))
+                pages_to_rotate = None
             else:
                 pages_to_rotate = set()
                 for part in pages.split(','):
@@ -48,9 +56,22 @@ class PDFEditor:
                     else:
                         pages_to_rotate.add(int(part) - 1)
             
+            def rotate_pages(update):
+                for page_num, page in enumerate(update.pdf.pages):
+                    if pages_to_rotate is None or page_num in pages_to_rotate:
+                        page.rotate(rotation, relative=True)
+                        update.mark(page.obj)
+            
+            if incremental and PDFEditor._save_incremental(pdf_file, output_path, rotate_pages):
+                return output_path
+            
+            pdf_file.seek(0)
+            reader = PdfReader(pdf_file)
+            writer = PdfWriter()
+            
             # Rotate pages
             for page_num, page in enumerate(reader.pages):
-                if page_num in pages_to_rotate:
+                if pages_to_rotate is None or page_num in pages_to_rotate:
                     page.rotate(rotation)
                 writer.add_page(page)
             
@@ -63,81 +84,159 @@ class PDFEditor:
         except Exception as e:
             raise Exception(f"Error rotating PDF: {str(e)}")
     
+    @staticmethod
+    def _save_incremental(pdf_file: BinaryIO, output_path: Path, apply) -> bool:
+        """
+        Save changes as an incremental update of the original file
+        
+        apply(update) changes objects through update.pdf and marks them.
+        Returns False (writing nothing) when the file cannot be updated
+        incrementally, e.g. because it is encrypted.
+        """
+        from .incremental import IncrementalUpdate
+        from .inputs import pdf_path_for
+        
+        with pdf_path_for(pdf_file) as pdf_path:
+            try:
+                update = IncrementalUpdate(pdf_path)
+            except ValueError:
+                return False
+            with update:
+                apply(update)
+                update.write(output_path)
+        return True
+    
     @staticmethod
     def add_page_numbers(pdf_file: BinaryIO, output_path: Path,
                         position: str = "bottom-center",
                         start_number: int = 1,
-                        font_size: int = 10) -> Path:
+                        font_size: int = 10,
+                        template: str = "{n}") -> Path:
         """
         Add page numbers to PDF
         
+        Each page gets a few text operators appended to its content, all
+        pages sharing one font resource; no overlay pages are created or
+        parsed.
+        
         Args:
             pdf_file: PDF file object
             output_path: Path to save PDF with page numbers
-            position: Position of page numbers (bottom-center, bottom-right, etc.)
+            position: Position of page numbers (bottom-center, bottom-right,
+                bottom-left, top-center, top-right, top-left)
             start_number: Starting page number
             font_size: Font size for page numbers
+            template: Label text, where {n} is the page number and {N} the
+                last page number (e.g. "Page {n} of {N}")
             
         Returns:
             Path to modified PDF
         """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
+            import string
+            from .stamp import stamp_labels
             
-            for page_num, page in enumerate(reader.pages):
-                # Create overlay with page number
-                packet = io.BytesIO()
-                can = canvas.Canvas(packet, pagesize=letter)
-                
-                # Get page dimensions
-                page_width = float(page.mediabox.width)
-                page_height = float(page.mediabox.height)
-                
-                # Calculate position
-                if position == "bottom-center":
-                    x = page_width / 2
-                    y = 30
-                elif position == "bottom-right":
-                    x = page_width - 50
-                    y = 30
-                elif position == "bottom-left":
-                    x = 50
-                    y = 30
-                else:
-                    x = page_width / 2
-                    y = 30
-                
-                # Draw page number
-                can.setFont("Helvetica", font_size)
-                can.drawCentredString(x, y, str(page_num + start_number))
-                can.save()
-                
-                # Merge overlay with page
-                packet.seek(0)
-                overlay_reader = PdfReader(packet)
-                page.merge_page(overlay_reader.pages[0])
-                
-                writer.add_page(page)
+            try:
+                fields = {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+                if not fields <= {'n', 'N'}:
+                    raise ValueError
+                template.format(n=1, N=1)
+            except (ValueError, IndexError):
+                raise ValueError(f"Invalid template '{template}': only {{n}} (page number) and {{N}} "
+                                 f"(last page number) are allowed; write a literal brace as {{{{ or }}}}")
             
-            # Save
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
+            with pikepdf.open(pdf_file) as pdf:
+                last_number = len(pdf.pages) + start_number - 1
+                labels = (template.format(n=page_num + start_number, N=last_number)
+                          for page_num in range(len(pdf.pages)))
+                stamp_labels(pdf, labels, position, font_size)
+                pdf.save(output_path)
             
             return output_path
             
         except Exception as e:
             raise Exception(f"Error adding page numbers: {str(e)}")
     
+    @staticmethod
+    def bates_number_pdfs(pdf_paths: List[Path], output_dir: Path,
+                          prefix: str = "", start_number: int = 1,
+                          digits: int = 6, position: str = "bottom-right",
+                          font_size: int = 10, processes: int = None,
+                          names: List[str] = None) -> List[Path]:
+        """
+        Stamp Bates numbers continuously across a set of PDFs
+        
+        Page counts are read from each file's page tree root, a prefix sum
+        gives every file its first number, and the files are then stamped
+        in parallel worker processes. Numbering follows the order of
+        pdf_paths.
+        
+        Args:
+            pdf_paths: Paths of the PDFs, in numbering order
+            output_dir: Directory to save numbered PDFs
+            prefix: Text before the number (e.g. "ACME")
+            start_number: Number of the first page of the first file
+            digits: Zero-padded width of the number
+            position: Position of the label (see add_page_numbers)
+            font_size: Font size for the label
+            processes: Worker processes (default: CPU count)
+            names: Base names for the outputs (default: input file names)
+            
+        Returns:
+            Paths of the numbered PDFs, in input order
+        """
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            from itertools import accumulate
+            from .parallel import default_process_count
+            from .stamp import bates_label, bates_stamp_file, page_count
+            
+            counts = [page_count(path) for path in pdf_paths]
+            first_numbers = [start_number + offset
+                             for offset in accumulate([0] + counts[:-1])]
+            
+            output_dir.mkdir(parents=True, exist_ok=True)
+            names = names or [Path(path).name for path in pdf_paths]
+            output_paths = []
+            for index, (name, first) in enumerate(zip(names, first_numbers)):
+                last = first + counts[index] - 1
+                name = (f"{Path(name).stem}_{bates_label(first, prefix, digits)}"
+                        f"-{bates_label(last, prefix, digits)}.pdf")
+                output_paths.append(output_dir / name)
+            
+            jobs = [(path, output, first, prefix, digits, position, font_size)
+                    for path, output, first in zip(pdf_paths, output_paths, first_numbers)]
+            
+            processes = min(processes or default_process_count(), len(jobs))
+            if processes <= 1:
+                for job in jobs:
+                    bates_stamp_file(*job)
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    futures = [executor.submit(bates_stamp_file, *job) for job in jobs]
+                    for future in futures:
+                        future.result()
+            
+            return output_paths
+            
+        except Exception as e:
+            raise Exception(f"Error adding Bates numbers: {str(e)}")
+    
     @staticmethod
     def add_watermark(pdf_file: BinaryIO, output_path: Path,
                      watermark_text: str = "CONFIDENTIAL",
                      opacity: float = 0.3,
                      font_size: int = 60,
-                     angle: int = 45) -> Path:
+                     angle: int = 45,
+                     image_file: BinaryIO = None,
+                     image_scale: float = 0.5) -> Path:
         """
         Add watermark to PDF
         
+        The watermark is built once as a Form XObject (with an ExtGState
+        for opacity) and every page draws it with a short positioning
+        stream, so output size barely grows with page count.
+        
         Args:
             pdf_file: PDF file object
             output_path: Path to save watermarked PDF
@@ -145,43 +244,34 @@ class PDFEditor:
             opacity: Watermark opacity (0.0 to 1.0)
             font_size: Font size for watermark
             angle: Rotation angle for watermark
+            image_file: Image file object; when given, the image is used
+                instead of the text
+            image_scale: Image watermark width as a fraction of page width
             
         Returns:
             Path to watermarked PDF
         """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
+            from .stamp import PageStamper, display_matrix, place_form
             
-            for page in reader.pages:
-                # Create watermark overlay
-                packet = io.BytesIO()
-                can = canvas.Canvas(packet, pagesize=letter)
-                
-                # Get page dimensions
-                page_width = float(page.mediabox.width)
-                page_height = float(page.mediabox.height)
-                
-                # Set watermark properties
-                can.setFont("Helvetica-Bold", font_size)
-                can.setFillColor(Color(0.5, 0.5, 0.5, alpha=opacity))
-                
-                # Rotate and center watermark
-                can.translate(page_width / 2, page_height / 2)
-                can.rotate(angle)
-                can.drawCentredString(0, 0, watermark_text)
-                can.save()
+            with pikepdf.open(pdf_file) as pdf:
+                stamper = PageStamper(pdf)
+                if image_file is not None:
+                    form = stamper.image_form(image_file, opacity)
+                else:
+                    form = stamper.text_form(watermark_text, "Helvetica-Bold", font_size,
+                                             gray=0.5, opacity=opacity)
+                form_width = float(form.BBox[2]) - float(form.BBox[0])
                 
-                # Merge watermark with page
-                packet.seek(0)
-                watermark_reader = PdfReader(packet)
-                page.merge_page(watermark_reader.pages[0])
+                for page in pdf.pages:
+                    _, page_width, page_height = display_matrix(page)
+                    scale = image_scale * page_width / form_width if image_file is not None else 1.0
+                    
+                    names = stamper.add_resources(page, xobjects={'Wm': form})
+                    stamper.stamp(page, place_form(names['Wm'], form, page_width / 2,
+                                                   page_height / 2, angle, scale))
                 
-                writer.add_page(page)
-            
-            # Save
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
+                pdf.save(output_path)
             
             return output_path
             
@@ -191,7 +281,8 @@ class PDFEditor:
     @staticmethod
     def crop_pdf(pdf_file: BinaryIO, output_path: Path,
                 left: float = 0, bottom: float = 0,
-                right: float = 0, top: float = 0) -> Path:
+                right: float = 0, top: float = 0,
+                incremental: bool = True) -> Path:
         """
         Crop PDF pages
         
@@ -202,11 +293,24 @@ class PDFEditor:
             bottom: Bottom margin to crop (in points)
             right: Right margin to crop (in points)
             top: Top margin to crop (in points)
+            incremental: Append only the changed page objects to a copy of
+                the original instead of rewriting the file
             
         Returns:
             Path to cropped PDF
         """
         try:
+            def crop_pages(update):
+                for page in update.pdf.pages:
+                    x0, y0, x1, y1 = [float(v) for v in page.mediabox]
+                    page.cropbox = [min(x0, x1) + left, min(y0, y1) + bottom,
+                                    max(x0, x1) - right, max(y0, y1) - top]
+                    update.mark(page.obj)
+            
+            if incremental and PDFEditor._save_incremental(pdf_file, output_path, crop_pages):
+                return output_path
+            
+            pdf_file.seek(0)
             reader = PdfReader(pdf_file)
             writer = PdfWriter()
             
@@ -230,10 +334,206 @@ class PDFEditor:
         except Exception as e:
             raise Exception(f"Error cropping PDF: {str(e)}")
     
+    @staticmethod
+    def auto_crop_pdf(pdf_file: BinaryIO, output_path: Path,
+                      padding: float = 10, uniform: bool = False,
+                      dpi: int = 50, processes: int = None,
+                      incremental: bool = True) -> Path:
+        """
+        Crop pages to their content
+        
+        Vector pages are measured from their content streams in a process
+        pool; scans and pages that cannot be measured that way are
+        rendered at low DPI and trimmed to their ink. Blank pages are left
+        as they are.
+        
+        Args:
+            pdf_file: PDF file object
+            output_path: Path to save cropped PDF
+            padding: Margin kept around the content (in points)
+            uniform: Apply one crop box (the union of all pages' content)
+                to every page instead of cropping each page separately
+            dpi: Render resolution for pages measured from pixels
+            processes: Worker processes (default: CPU count)
+            incremental: Append only the changed page objects to a copy of
+                the original instead of rewriting the file
+            
+        Returns:
+            Path to cropped PDF
+        """
+        try:
+            from .autocrop import content_boxes, crop_boxes
+            from .inputs import pdf_path_for
+            
+            with pdf_path_for(pdf_file) as pdf_path:
+                boxes = content_boxes(pdf_path, dpi, processes)
+                
+                def crop_pages(pdf, mark=lambda obj: None):
+                    page_boxes = [[float(v) for v in page.cropbox] for page in pdf.pages]
+                    for page, box in zip(pdf.pages, crop_boxes(boxes, page_boxes, padding, uniform)):
+                        if box is not None:
+                            page.cropbox = list(box)
+                            mark(page.obj)
+                
+                with open(pdf_path, 'rb') as f:
+                    if incremental and PDFEditor._save_incremental(
+                            f, output_path, lambda update: crop_pages(update.pdf, update.mark)):
+                        return output_path
+                
+                with pikepdf.open(pdf_path) as pdf:
+                    crop_pages(pdf)
+                    pdf.save(output_path)
+            
+            return output_path
+            
+        except Exception as e:
+            raise Exception(f"Error cropping PDF: {str(e)}")
+    
+    @staticmethod
+    def impose_pdf(pdf_file: BinaryIO, output_path: Path,
+                   layout: str = "booklet", pages_per_sheet: int = 2,
+                   margin: float = 0) -> Path:
+        """
+        Place several pages on each sheet (N-up) or impose a booklet
+        
+        Every source page becomes a Form XObject that shares the page's
+        resources and is drawn on the new sheets with a placement matrix,
+        so nothing is rasterized or duplicated and the output stays about
+        the size of the input.
+        
+        Args:
+            pdf_file: PDF file object
+            output_path: Path to save imposed PDF
+            layout: "nup" (pages in reading order) or "booklet" (2-up in
+                saddle-stitch order, padded to a multiple of 4 pages)
+            pages_per_sheet: 2, 4, 6, 9 or 16 for "nup"
+            margin: Space around each cell (in points)
+            
+        Returns:
+            Path to imposed PDF
+        """
+        try:
+            if layout == "booklet":
+                pages_per_sheet = 2
+            if pages_per_sheet not in NUP_GRIDS:
+                raise ValueError(f"Unsupported pages per sheet: {pages_per_sheet}")
+            columns, rows, landscape = NUP_GRIDS[pages_per_sheet]
+            
+            with pikepdf.open(pdf_file) as pdf:
+                source_pages = list(pdf.pages)
+                forms = [pdf.make_indirect(page.as_form_xobject()) for page in source_pages]
+                
+                # Sheet size from the first page as displayed
+                box = source_pages[0].mediabox
+                width, height = abs(float(box[2]) - float(box[0])), abs(float(box[3]) - float(box[1]))
+                if int(source_pages[0].obj.get('/Rotate', 0)) % 180:
+                    width, height = height, width
+                short, long = sorted((width, height))
+                sheet_width, sheet_height = (long, short) if landscape else (short, long)
+                cell_width, cell_height = sheet_width / columns, sheet_height / rows
+                
+                # Page index (or None for a blank) for each cell, sheet by sheet
+                count = len(source_pages)
+                if layout == "booklet":
+                    padded = count + (-count) % 4
+                    order = []
+                    for side in range(padded // 2):
+                        pair = (padded - 1 - side, side) if side % 2 == 0 else (side, padded - 1 - side)
+                        order.extend(i if i < count else None for i in pair)
+                else:
+                    order = list(range(count))
+                
+                sheets = []
+                for start in range(0, len(order), pages_per_sheet):
+                    content = []
+                    xobjects = pikepdf.Dictionary()
+                    for cell, index in enumerate(order[start:start + pages_per_sheet]):
+                        if index is None:
+                            continue
+                        column, row = cell % columns, cell // columns
+                        x0 = column * cell_width + margin
+                        y1 = sheet_height - row * cell_height - margin
+                        rect = pikepdf.Rectangle(x0, y1 - cell_height + 2 * margin,
+                                                 x0 + cell_width - 2 * margin, y1)
+                        name = pikepdf.Name(f'/P{cell}')
+                        xobjects[name] = forms[index]
+                        content.append(source_pages[index].calc_form_xobject_placement(
+                            forms[index], name, rect, allow_expand=True))
+                    
+                    sheets.append(pikepdf.Dictionary(
+                        Type=pikepdf.Name.Page,
+                        MediaBox=[0, 0, sheet_width, sheet_height],
+                        Resources=pikepdf.Dictionary(XObject=xobjects),
+                        Contents=pdf.make_stream(b''.join(content)),
+                    ))
+                
+                # Replace the source pages with the sheets
+                del pdf.pages[:]
+                for sheet in sheets:
+                    pdf.pages.append(pikepdf.Page(sheet))
+                
+                pdf.save(output_path)
+            
+            return output_path
+            
+        except Exception as e:
+            raise Exception(f"Error imposing PDF: {str(e)}")
+    
+    @staticmethod
+    def mail_merge(template_file: BinaryIO, csv_file: BinaryIO, output_path: Path,
+                   combined: bool = False, placements: List[dict] = None,
+                   flatten: bool = True, name_column: str = None,
+                   processes: int = None):
+        """
+        Generate personalised copies of a template PDF from CSV records
+        
+        Columns named like a form field fill that field; placements write
+        text (with {column} placeholders) at fixed positions. The template
+        is parsed once and shared; each record only adds a small overlay
+        content stream per page.
+        
+        Args:
+            template_file: Template PDF file object
+            csv_file: CSV file object (header row, UTF-8)
+            output_path: Combined PDF path, or the name pattern for
+                per-record files (saved next to it, numbered)
+            combined: Write all records into one PDF
+            placements: Text placements (see mailmerge.parse_placements)
+            flatten: Draw field values into the pages and remove the form
+                (always done for combined output)
+            name_column: Column whose value is added to per-record file names
+            processes: Worker processes (default: CPU count)
+            
+        Returns:
+            Path to the combined PDF, or list of per-record PDF paths
+        """
+        try:
+            from .mailmerge import MergeTemplate, merge_to_files, read_records
+            from .inputs import pdf_path_for
+            
+            output_path = Path(output_path)
+            with pdf_path_for(template_file) as template_path:
+                records = read_records(csv_file)
+                if combined:
+                    template = MergeTemplate(template_path, placements, flatten=True)
+                    try:
+                        template.save_combined(records, output_path)
+                    finally:
+                        template.close()
+                    return output_path
+                
+                return merge_to_files(template_path, records, output_path.parent,
+                                      output_path.stem, placements, flatten,
+                                      name_column, processes)
+            
+        except Exception as e:
+            raise Exception(f"Error merging PDF: {str(e)}")
+    
     @staticmethod
     def edit_pdf_metadata(pdf_file: BinaryIO, output_path: Path,
                          title: str = None, author: str = None,
-                         subject: str = None, keywords: str = None) -> Path:
+                         subject: str = None, keywords: str = None,
+                         incremental: bool = True) -> Path:
         """
         Edit PDF metadata
         
@@ -244,18 +544,13 @@ class PDFEditor:
             author: Document author
             subject: Document subject
             keywords: Document keywords
+            incremental: Append only the new /Info dictionary to a copy of
+                the original instead of rewriting the file
             
         Returns:
             Path to modified PDF
         """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
-            
-            # Copy all pages
-            for page in reader.pages:
-                writer.add_page(page)
-            
             # Update metadata
             metadata = {}
             if title:
@@ -267,6 +562,18 @@ class PDFEditor:
             if keywords:
                 metadata['/Keywords'] = keywords
             
+            if incremental and PDFEditor._save_incremental(
+                    pdf_file, output_path, lambda update: update.set_info(metadata)):
+                return output_path
+            
+            pdf_file.seek(0)
+            reader = PdfReader(pdf_file)
+            writer = PdfWriter()
+            
+            # Copy all pages
+            for page in reader.pages:
+                writer.add_page(page)
+            
             if metadata:
                 writer.add_metadata(metadata)
             
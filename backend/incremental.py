@@ -0,0 +1,194 @@
+"""
+Incremental-update saving
+- Copies the original file unchanged and appends only the modified
+  objects, a new cross-reference section and trailer (like a PDF editor's
+  "save" rather than "save as")
+- Writes a cross-reference stream when the original uses one, otherwise
+  a classic xref table
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pikepdf
+from pikepdf import Dictionary
+
+# Bytes read from the end of the file to find startxref
+TAIL_SIZE = 2048
+
+STARTXREF_PATTERN = re.compile(rb'startxref\s+(\d+)\s+%%EOF', re.S)
+
+
+class IncrementalUpdate:
+    """
+    Collects object changes to a PDF and appends them as an update
+
+    Objects are changed through self.pdf (a pikepdf document) and
+    registered with mark(), or created with add(); write() serialises
+    only those and records where each one was written in self.offsets.
+    """
+
+    def __init__(self, pdf_path: Path):
+        self.pdf_path = Path(pdf_path)
+        self.pdf = pikepdf.open(self.pdf_path)
+        if self.pdf.is_encrypted:
+            self.pdf.close()
+            raise ValueError("Incremental updates of encrypted PDFs are not supported")
+
+        self._changed: Dict[Tuple[int, int], pikepdf.Object] = {}
+        self.offsets: Dict[Tuple[int, int], int] = {}
+        self._startxref, self._xref_is_stream = self._read_startxref()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.pdf.close()
+
+    def _read_startxref(self) -> Tuple[int, bool]:
+        """Offset of the last cross-reference section and whether it is a stream"""
+        size = self.pdf_path.stat().st_size
+        with open(self.pdf_path, 'rb') as f:
+            f.seek(max(0, size - TAIL_SIZE))
+            matches = STARTXREF_PATTERN.findall(f.read())
+            if not matches:
+                raise ValueError("startxref not found")
+            offset = int(matches[-1])
+            f.seek(offset)
+            is_stream = not f.read(4).startswith(b'xref')
+        return offset, is_stream
+
+    def mark(self, obj: pikepdf.Object) -> None:
+        """Record that an indirect object was modified"""
+        if not obj.is_indirect:
+            raise ValueError("Only indirect objects can be updated")
+        self._changed[obj.objgen] = obj
+
+    def add(self, obj: pikepdf.Object) -> pikepdf.Object:
+        """Make obj a new indirect object included in the update"""
+        obj = self.pdf.make_indirect(obj)
+        self.mark(obj)
+        return obj
+
+    def set_info(self, values: dict) -> None:
+        """Update document information entries, e.g. {'/Title': 'Report'}"""
+        info = self.pdf.trailer.get('/Info')
+        if info is not None and info.is_indirect:
+            for key, value in values.items():
+                info[key] = value
+            self.mark(info)
+        else:
+            # No indirect Info yet: write a new object holding old and new entries
+            info = Dictionary({key: value for key, value in (info or {}).items()})
+            for key, value in values.items():
+                info[key] = value
+            self.pdf.trailer.Info = self.add(info)
+
+    @staticmethod
+    def _serialize(obj: pikepdf.Object) -> bytes:
+        """Object body; streams keep their stored (still encoded) data"""
+        if isinstance(obj, pikepdf.Stream):
+            data = obj.read_raw_bytes()
+            stream_dict = Dictionary({key: value for key, value in obj.stream_dict.items()
+                                      if key != '/Length'})
+            stream_dict.Length = len(data)
+            return stream_dict.unparse(resolved=True) + b'\nstream\n' + data + b'\nendstream'
+        return obj.unparse(resolved=True)
+
+    @staticmethod
+    def _entry_table(entries: List[Tuple[int, int, int]]) -> bytes:
+        """Classic xref subsections for (number, generation, offset) entries"""
+        lines = [b'xref\n']
+        run: List[Tuple[int, int, int]] = []
+
+        def flush():
+            if run:
+                lines.append(f'{run[0][0]} {len(run)}\n'.encode())
+                lines.extend(f'{offset:010d} {gen:05d} n\r\n'.encode() for _, gen, offset in run)
+                run.clear()
+
+        for entry in entries:
+            if run and entry[0] != run[-1][0] + 1:
+                flush()
+            run.append(entry)
+        flush()
+        return b''.join(lines)
+
+    @staticmethod
+    def _xref_stream(number: int, entries: List[Tuple[int, int, int]], offset: int,
+                     trailer_entries: List[str]) -> bytes:
+        """Uncompressed cross-reference stream object holding entries (and itself)"""
+        entries = sorted(entries + [(number, 0, offset)])
+        index = []
+        for obj_number, _, _ in entries:
+            if index and obj_number == index[-2] + index[-1]:
+                index[-1] += 1
+            else:
+                index.extend([obj_number, 1])
+        rows = b''.join(b'\x01' + entry_offset.to_bytes(8, 'big') + gen.to_bytes(2, 'big')
+                        for _, gen, entry_offset in entries)
+
+        stream_dict = trailer_entries + [
+            '/Type /XRef', '/W [1 8 2]',
+            f"/Index [{' '.join(str(i) for i in index)}]",
+            f'/Length {len(rows)}',
+        ]
+        header = f"{number} 0 obj\n<< {' '.join(stream_dict)} >>\nstream\n".encode('latin-1')
+        return header + rows + b'\nendstream\nendobj\n'
+
+    def write(self, output_path: Path) -> Path:
+        """
+        Write the original bytes plus the update to output_path
+
+        Only the file copy touches the original bytes (done by the kernel
+        where supported); everything written here is proportional to the
+        number of changed objects.
+
+        Returns:
+            output_path
+        """
+        output_path = Path(output_path)
+        if output_path.resolve() != self.pdf_path.resolve():
+            shutil.copyfile(self.pdf_path, output_path)
+
+        trailer = self.pdf.trailer
+        objects = [(objgen, self._serialize(obj)) for objgen, obj in sorted(self._changed.items())]
+        if not objects:
+            return output_path
+        # Objects created by add() may be numbered past the original /Size
+        size = max(int(trailer.Size), objects[-1][0][0] + 1)
+        info = trailer.get('/Info')
+        info_ref = info.objgen if info is not None and info.is_indirect else None
+
+        with open(output_path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) not in (b'\n', b'\r'):
+                f.write(b'\n')
+
+            entries = []
+            for (number, gen), data in objects:
+                self.offsets[(number, gen)] = f.tell()
+                entries.append((number, gen, f.tell()))
+                f.write(f'{number} {gen} obj\n'.encode() + data + b'\nendobj\n')
+
+            root = trailer.Root.objgen
+            trailer_entries = [f'/Root {root[0]} {root[1]} R', f'/Prev {self._startxref}']
+            if info_ref is not None:
+                trailer_entries.append(f'/Info {info_ref[0]} {info_ref[1]} R')
+            if '/ID' in trailer:
+                trailer_entries.append('/ID ' + trailer.ID.unparse().decode('latin-1'))
+
+            xref_offset = f.tell()
+            if self._xref_is_stream:
+                # The stream is an object too and takes the next number
+                trailer_entries.insert(0, f'/Size {size + 1}')
+                f.write(self._xref_stream(size, entries, xref_offset, trailer_entries))
+            else:
+                trailer_entries.insert(0, f'/Size {size}')
+                f.write(self._entry_table(sorted(entries)))
+                f.write(f"trailer\n<< {' '.join(trailer_entries)} >>\n".encode('latin-1'))
+            f.write(f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+
+        return output_path
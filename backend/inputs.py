@@ -0,0 +1,134 @@
+"""
+Input file helpers
+- Uploads arrive as in-memory buffers; when a tool needs a real file the
+  buffer is written out in chunks straight from a memoryview, without an
+  intermediate bytes copy
+- Files already on disk are used in place
+- PDFs opened with pypdf are memory-mapped rather than read into memory,
+  so worker processes share the OS page cache instead of each holding a
+  full copy
+"""
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_chunks(source: BinaryIO, target: BinaryIO) -> int:
+    """
+    Copy a file object to another in chunks
+
+    In-memory buffers (BytesIO and Streamlit uploads) are sliced through
+    their memoryview, so no chunk is copied before it is written.
+
+    Returns:
+        Number of bytes written
+    """
+    getbuffer = getattr(source, 'getbuffer', None)
+    if getbuffer is not None:
+        with getbuffer() as view:
+            for start in range(0, len(view), CHUNK_SIZE):
+                target.write(view[start:start + CHUNK_SIZE])
+            return len(view)
+
+    source.seek(0)
+    start = target.tell()
+    shutil.copyfileobj(source, target, CHUNK_SIZE)
+    return target.tell() - start
+
+
+def file_path_of(pdf_file: BinaryIO) -> Optional[Path]:
+    """Path of the file backing a file object, or None for in-memory streams"""
+    try:
+        pdf_file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    name = getattr(pdf_file, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return Path(name)
+    return None
+
+
+@contextmanager
+def pdf_path_for(pdf_file: BinaryIO, suffix: str = '.pdf'):
+    """
+    Yield a filesystem path for a PDF file object
+
+    Tools such as poppler need a real file. If the object is already
+    backed by one it is used directly; otherwise the stream is written to
+    a temporary file in chunks and removed afterwards.
+    """
+    path = file_path_of(pdf_file)
+    if path is not None:
+        yield path
+        return
+
+    temp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        write_chunks(pdf_file, temp)
+        temp.close()
+        yield Path(temp.name)
+    finally:
+        temp.close()
+        try:
+            os.unlink(temp.name)
+        except OSError:
+            pass
+
+
+def map_file(path: Union[str, Path]) -> Union[mmap.mmap, io.BytesIO]:
+    """
+    Read-only memory map of a file
+
+    The map stays valid after the file is closed and is released when it
+    is garbage collected. Empty files cannot be mapped and give an empty
+    buffer instead.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return io.BytesIO()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def mapped_reader(path: Union[str, Path], password: Optional[str] = None):
+    """
+    pypdf reader over a memory-mapped file
+
+    pypdf reads a path fully into memory; a mapped file is paged in on
+    demand and shared between processes reading the same PDF. The map
+    stays open until reader.stream.close(); use open_reader where the
+    reader does not live for the whole process.
+    """
+    from pypdf import PdfReader
+
+    data = map_file(path)
+    try:
+        reader = PdfReader(data)
+        if reader.is_encrypted:
+            reader.decrypt(password or '')
+    except BaseException:
+        data.close()
+        raise
+    return reader
+
+
+@contextmanager
+def open_reader(path: Union[str, Path], password: Optional[str] = None):
+    """
+    Memory-mapped pypdf reader, unmapped on exit
+
+    pypdf readers hold reference cycles, so the map would otherwise stay
+    open until the cyclic garbage collector runs, and on Windows a mapped
+    file cannot be deleted.
+    """
+    reader = mapped_reader(path, password)
+    try:
+        yield reader
+    finally:
+        reader.stream.close()
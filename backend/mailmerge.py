@@ -0,0 +1,457 @@
+"""
+Template mail-merge
+- The template is parsed once (once per worker process) and its pages,
+  content streams and resources are shared by every generated document
+- Each record only adds one small overlay content stream per page with
+  its text placements and, when flattening, its form field values
+- Without flattening, form fields are filled in place (/V values) and
+  stay editable
+- Records are streamed from the CSV with a bounded number in flight
+"""
+import csv
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name, String
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from .parallel import TASKS_PER_WORKER, default_process_count
+from .stamp import DESCENT, PageStamper, display_matrix, fmt, pdf_string
+
+# Records sent to a worker per task
+RECORDS_PER_TASK = 16
+
+# Below this many tasks a pool costs more than it saves
+MIN_TASKS_FOR_POOL = 2
+
+# Field text inset from the widget border, in points
+FIELD_PADDING = 2
+
+DEFAULT_FIELD_FONT_SIZE = 10
+
+FONT_SIZE_PATTERN = re.compile(r'([\d.]+)\s+Tf')
+
+# CSV values that switch a check box on
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'on', 'checked'}
+
+Job = Tuple[dict, str]
+
+
+class _Record(dict):
+    """CSV row whose missing columns format as empty text"""
+
+    def __missing__(self, key):
+        return ''
+
+
+def parse_placements(spec: str) -> List[dict]:
+    """
+    Parse text placements, one per line: "page, x, y, size, text"
+
+    x and y are in points from the bottom-left of the page as displayed;
+    text may hold {column} placeholders and commas.
+    """
+    placements = []
+    for line_number, line in enumerate(spec.splitlines(), 1):
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split(',', 4)]
+        if len(parts) != 5:
+            raise ValueError(f"Placement line {line_number} needs page, x, y, size and text")
+        page, x, y, size, text = parts
+        placements.append({'page': int(page), 'x': float(x), 'y': float(y),
+                           'size': float(size), 'text': text})
+    return placements
+
+
+def read_records(csv_file: BinaryIO) -> Iterator[dict]:
+    """Yield CSV rows as {column: value} without reading the whole file"""
+    text = io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield {key: value or '' for key, value in row.items() if key is not None}
+    finally:
+        text.detach()
+
+
+def form_fields(pdf: pikepdf.Pdf) -> Dict[str, dict]:
+    """
+    Terminal form fields by full name
+
+    Returns:
+        {name: {'field': field dictionary, 'type': field type name,
+                'da': default appearance, 'widgets': [(page index, widget)]}}
+    """
+    acroform = pdf.Root.get('/AcroForm')
+    if acroform is None:
+        return {}
+
+    widget_pages = {}
+    for index, page in enumerate(pdf.pages):
+        for annot in page.obj.get('/Annots', []):
+            if annot.is_indirect:
+                widget_pages[annot.objgen] = index
+
+    fields = {}
+    stack = [(field, '', None, acroform.get('/DA')) for field in acroform.get('/Fields', [])]
+    while stack:
+        field, parent_name, parent_type, parent_da = stack.pop()
+        partial = str(field.get('/T', ''))
+        name = f'{parent_name}.{partial}' if parent_name and partial else parent_name or partial
+        field_type = field.get('/FT', parent_type)
+        da = field.get('/DA', parent_da)
+
+        kids = list(field.get('/Kids', []))
+        if any('/T' in kid for kid in kids):
+            stack.extend((kid, name, field_type, da) for kid in kids)
+            continue
+        fields[name] = {
+            'field': field,
+            'type': str(field_type or ''),
+            'da': str(da or ''),
+            'widgets': [(widget_pages.get(widget.objgen), widget) for widget in kids or [field]],
+        }
+    return fields
+
+
+def _rect(widget: Dictionary) -> Tuple[float, float, float, float]:
+    x0, y0, x1, y1 = [float(v) for v in widget.Rect]
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def _on_states(widget: Dictionary) -> List[str]:
+    normal = widget.get('/AP', {}).get('/N')
+    if not isinstance(normal, Dictionary) or isinstance(normal, pikepdf.Stream):
+        return []
+    return [str(state) for state in normal.keys() if state != '/Off']
+
+
+def _button_state(widget: Dictionary, value: str, single: bool) -> str:
+    """Appearance state for a check box or radio button widget"""
+    states = _on_states(widget)
+    if '/' + value in states:
+        return '/' + value
+    if single and states and value.strip().lower() in TRUE_VALUES:
+        return states[0]
+    return '/Off'
+
+
+class MergeTemplate:
+    """
+    Template document with a rewritable overlay stream on every page
+
+    render() writes one record into the overlays (and field values) and
+    save() writes the document; the template's own streams are passed
+    through without being decoded.
+    """
+
+    def __init__(self, template_path: Path, placements: List[dict] = None,
+                 flatten: bool = True, base_font: str = 'Helvetica'):
+        self.pdf = pikepdf.open(template_path)
+        self.flatten = flatten
+        self.base_font = base_font
+        self.fields = form_fields(self.pdf)
+
+        page_count = len(self.pdf.pages)
+        self._placements: Dict[int, List[dict]] = {}
+        for placement in placements or []:
+            if not 1 <= placement['page'] <= page_count:
+                raise ValueError(f"Placement page {placement['page']} is out of range")
+            self._placements.setdefault(placement['page'] - 1, []).append(placement)
+
+        self._stamper = PageStamper(self.pdf)
+        font = self._stamper.standard_font(base_font)
+        self._fonts = []
+        self._matrices = []
+        for page in self.pdf.pages:
+            self._fonts.append(self._stamper.add_resources(page, fonts={'F': font})['F'])
+            self._matrices.append(' '.join(fmt(v) for v in display_matrix(page)[0]))
+            # Indirect resources can be shared by the pages of combined output
+            if not page.obj.Resources.is_indirect:
+                page.obj.Resources = self.pdf.make_indirect(page.obj.Resources)
+        self._overlays = [self._stamper.add_overlay(page) for page in self.pdf.pages]
+
+        # Widget objgen -> {state (None for a single appearance): resource name}
+        self._appearances: Dict[Tuple[int, int], Dict[Optional[str], Name]] = {}
+        if self.flatten:
+            self._flatten_form()
+        elif self.fields:
+            self._prepare_form()
+
+    def close(self) -> None:
+        self.pdf.close()
+
+    def _flatten_form(self) -> None:
+        """Register widget appearances as page XObjects and drop the form"""
+        for field in self.fields.values():
+            for page_index, widget in field['widgets']:
+                if page_index is None:
+                    continue
+                normal = widget.get('/AP', {}).get('/N')
+                if isinstance(normal, pikepdf.Stream):
+                    forms = {None: normal}
+                elif isinstance(normal, Dictionary):
+                    forms = {str(state): form for state, form in normal.items()}
+                else:
+                    continue
+                page = self.pdf.pages[page_index]
+                keys = {f'AP{len(self._appearances)}_{i}': form for i, form in enumerate(forms.values())}
+                names = self._stamper.add_resources(page, xobjects=keys)
+                self._appearances[widget.objgen] = dict(zip(forms, names.values()))
+
+        for page in self.pdf.pages:
+            annots = page.obj.get('/Annots')
+            if annots is not None:
+                page.obj.Annots = Array([a for a in annots if a.get('/Subtype') != Name.Widget])
+        if '/AcroForm' in self.pdf.Root:
+            del self.pdf.Root['/AcroForm']
+
+    def _prepare_form(self) -> None:
+        """Let viewers regenerate text field appearances from the filled values"""
+        self.pdf.Root.AcroForm.NeedAppearances = True
+        for field in self.fields.values():
+            if field['type'] in ('/Tx', '/Ch'):
+                for _, widget in field['widgets']:
+                    if '/AP' in widget:
+                        del widget['/AP']
+
+    def _field_text(self, field: dict, widget: Dictionary, font: Name, value: str) -> str:
+        """Operators drawing a text field value inside its widget"""
+        x0, y0, x1, y1 = _rect(widget)
+        width, height = x1 - x0, y1 - y0
+        match = FONT_SIZE_PATTERN.search(field['da'])
+        size = float(match.group(1)) if match else DEFAULT_FIELD_FONT_SIZE
+        if size == 0:
+            # Auto-sized text fills the field height
+            size = max(1.0, min(DEFAULT_FIELD_FONT_SIZE, (height - 2 * FIELD_PADDING) * 0.8))
+
+        text_width = stringWidth(value, self.base_font, size)
+        quadding = int(field['field'].get('/Q', 0))
+        if quadding == 1:
+            x = x0 + (width - text_width) / 2
+        elif quadding == 2:
+            x = x1 - FIELD_PADDING - text_width
+        else:
+            x = x0 + FIELD_PADDING
+        y = y0 + (height - size) / 2 + DESCENT * size
+
+        return (f'q {fmt(x0)} {fmt(y0)} {fmt(width)} {fmt(height)} re W n '
+                f'BT {font} {fmt(size)} Tf 0 g {fmt(x)} {fmt(y)} Td {pdf_string(value)} Tj ET Q')
+
+    def _draw_appearance(self, widget: Dictionary, state: Optional[str]) -> str:
+        """Operators drawing a widget appearance form fitted to its rectangle"""
+        forms = self._appearances.get(widget.objgen, {})
+        name = forms.get(state) if state in forms else forms.get(None)
+        if name is None:
+            return ''
+        form = widget.AP.N if None in forms else widget.AP.N[state]
+        bx0, by0, bx1, by1 = [float(v) for v in form.get('/BBox', widget.Rect)]
+        x0, y0, x1, y1 = _rect(widget)
+        sx = (x1 - x0) / (bx1 - bx0) if bx1 != bx0 else 1
+        sy = (y1 - y0) / (by1 - by0) if by1 != by0 else 1
+        return (f'q {fmt(sx)} 0 0 {fmt(sy)} {fmt(x0 - bx0 * sx)} {fmt(y0 - by0 * sy)} cm '
+                f'{name} Do Q')
+
+    def _fill_field(self, field: dict, value: str) -> None:
+        """Set a field's /V (and button states) for the record"""
+        if field['type'] == '/Btn':
+            single = len(field['widgets']) == 1
+            states = [_button_state(widget, value, single) for _, widget in field['widgets']]
+            for (_, widget), state in zip(field['widgets'], states):
+                if _on_states(widget):
+                    widget.AS = Name(state)
+            field['field'].V = Name(next((s for s in states if s != '/Off'), '/Off'))
+        else:
+            field['field'].V = String(value)
+
+    def overlay_content(self, page_index: int, record: dict) -> bytes:
+        """Overlay stream content for one page of a record"""
+        parts = ['Q']
+
+        if self.flatten:
+            ops = []
+            for name, field in self.fields.items():
+                single = len(field['widgets']) == 1
+                for widget_page, widget in field['widgets']:
+                    if widget_page != page_index:
+                        continue
+                    if name not in record:
+                        state = widget.get('/AS')
+                        ops.append(self._draw_appearance(widget, str(state) if state is not None else None))
+                    elif field['type'] == '/Btn':
+                        ops.append(self._draw_appearance(widget, _button_state(widget, record[name], single)))
+                    elif record[name]:
+                        ops.append(self._field_text(field, widget, self._fonts[page_index], record[name]))
+            ops = [op for op in ops if op]
+            if ops:
+                parts.append('q ' + ' '.join(ops) + ' Q')
+
+        placements = self._placements.get(page_index)
+        if placements:
+            font = self._fonts[page_index]
+            ops = [f"BT {font} {fmt(p['size'])} Tf 0 g {fmt(p['x'])} {fmt(p['y'])} Td "
+                   f"{pdf_string(p['text'].format_map(record))} Tj ET" for p in placements]
+            parts.append(f'q {self._matrices[page_index]} cm ' + ' '.join(ops) + ' Q')
+
+        return ('\n'.join(parts) + '\n').encode('latin-1')
+
+    def render(self, record: dict) -> None:
+        """Write a record into the overlays and form fields"""
+        record = _Record(record)
+        for index, overlay in enumerate(self._overlays):
+            overlay.write(self.overlay_content(index, record))
+        if not self.flatten:
+            for name, field in self.fields.items():
+                if name in record:
+                    self._fill_field(field, record[name])
+
+    def save(self, output_path: Path) -> Path:
+        self.pdf.save(output_path, stream_decode_level=pikepdf.StreamDecodeLevel.none)
+        return output_path
+
+    def _copy_annotations(self, annots: Array, page: Dictionary) -> Array:
+        """
+        Copies of a template page's annotations for one record page
+
+        An annotation object must belong to a single page, so each record
+        page gets its own. /P points at the new page, and popup and reply
+        links between annotations of the page point at the copies;
+        appearance streams are shared.
+        """
+        copies = [self.pdf.make_indirect(Dictionary({key: value for key, value in annot.items()}))
+                  for annot in annots]
+        by_original = {annot.objgen: copy for annot, copy in zip(annots, copies) if annot.is_indirect}
+        for copy in copies:
+            if '/P' in copy:
+                copy.P = page
+            for key in ('/Popup', '/Parent', '/IRT'):
+                target = copy.get(key)
+                if target is not None and target.is_indirect and target.objgen in by_original:
+                    copy[key] = by_original[target.objgen]
+        return Array(copies)
+
+    def save_combined(self, records: Iterable[dict], output_path: Path) -> int:
+        """
+        Write every record into one document
+
+        Each record's pages are new page dictionaries pointing at the
+        template's content streams and resources plus their own overlay,
+        so the template is stored once however many records there are.
+        Form fields must be flattened.
+
+        Returns:
+            Number of records written
+        """
+        if not self.flatten:
+            raise ValueError("Combined output needs flattened form fields")
+
+        template_pages = list(self.pdf.pages)
+        count = 0
+        for record in records:
+            record = _Record(record)
+            for index, page in enumerate(template_pages):
+                contents = list(page.obj.Contents)[:-1]
+                contents.append(self.pdf.make_stream(self.overlay_content(index, record)))
+                new_page = Dictionary({key: value for key, value in page.obj.items()
+                                       if key not in ('/Contents', '/Parent', '/MediaBox', '/Rotate')})
+                # Inherited attributes are set on each page
+                new_page.MediaBox = page.mediabox
+                new_page.Rotate = page.obj.get('/Rotate', 0)
+                new_page.Contents = Array(contents)
+                new_page = self.pdf.make_indirect(new_page)
+                if '/Annots' in page.obj:
+                    new_page.Annots = self._copy_annotations(page.obj.Annots, new_page)
+                self.pdf.pages.append(pikepdf.Page(new_page))
+            count += 1
+
+        if count == 0:
+            raise ValueError("The CSV file has no records")
+        for _ in template_pages:
+            del self.pdf.pages[0]
+        self.save(output_path)
+        return count
+
+
+def output_name(index: int, record: dict, stem: str, name_column: str = None) -> str:
+    """File name for a record: numbered, plus a column's value if given"""
+    value = record.get(name_column, '') if name_column else ''
+    safe = re.sub(r'[^\w\- ]+', '_', value).strip()[:80]
+    return f'{stem}_{index:05d}_{safe}.pdf' if safe else f'{stem}_{index:05d}.pdf'
+
+
+_template: Optional[MergeTemplate] = None
+
+
+def _init_worker(template_path: str, placements: List[dict], flatten: bool) -> None:
+    global _template
+    _template = MergeTemplate(Path(template_path), placements, flatten)
+
+
+def _merge_batch(jobs: List[Job]) -> List[str]:
+    for record, output_path in jobs:
+        _template.render(record)
+        _template.save(Path(output_path))
+    return [output_path for _, output_path in jobs]
+
+
+def merge_to_files(template_path: Path, records: Iterable[dict], output_dir: Path, stem: str,
+                   placements: List[dict] = None, flatten: bool = True,
+                   name_column: str = None, processes: int = None) -> List[Path]:
+    """
+    Write one PDF per record
+
+    Records are sent to worker processes in batches, each worker holding
+    its own parsed copy of the template; only a bounded number of batches
+    is in flight, so the CSV is never loaded as a whole.
+
+    Returns:
+        Paths of the generated PDFs, in record order
+    """
+    jobs = ((record, str(output_dir / output_name(index, record, stem, name_column)))
+            for index, record in enumerate(records, 1))
+    batches = iter(lambda: list(islice(jobs, RECORDS_PER_TASK)), [])
+
+    processes = processes or default_process_count()
+    first = list(islice(batches, MIN_TASKS_FOR_POOL))
+    output_paths = []
+
+    if processes <= 1 or len(first) < MIN_TASKS_FOR_POOL:
+        template = MergeTemplate(template_path, placements, flatten)
+        try:
+            for batch in first + list(batches):
+                for record, output_path in batch:
+                    template.render(record)
+                    output_paths.append(template.save(Path(output_path)))
+        finally:
+            template.close()
+    else:
+        output_paths = _merge_in_pool(template_path, first, batches, placements, flatten, processes)
+
+    if not output_paths:
+        raise ValueError("The CSV file has no records")
+    return output_paths
+
+
+def _merge_in_pool(template_path: Path, first: List[List[Job]], batches: Iterator[List[Job]],
+                   placements: List[dict], flatten: bool, processes: int) -> List[Path]:
+    output_paths = []
+    window = processes * TASKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(str(template_path), placements, flatten)) as executor:
+        pending = [executor.submit(_merge_batch, batch) for batch in first]
+        for batch in batches:
+            pending.append(executor.submit(_merge_batch, batch))
+            if len(pending) >= window:
+                break
+
+        while pending:
+            output_paths.extend(Path(path) for path in pending.pop(0).result())
+            for batch in batches:
+                pending.append(executor.submit(_merge_batch, batch))
+                break
+    return output_paths
@@ -0,0 +1,84 @@
+"""
+Process-pool helpers for per-page work
+- Each worker process opens the PDF once and keeps the reader; the file
+  is memory-mapped, so workers share one copy in the page cache
+- Page results come back in page order with a bounded number in flight
+- Small jobs run in-process to avoid pool start-up cost
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .inputs import mapped_reader, open_reader
+
+# Below this many pages a pool costs more than it saves
+MIN_PAGES_FOR_POOL = 8
+
+# Tasks kept queued per worker so workers never sit idle
+TASKS_PER_WORKER = 4
+
+_reader = None
+
+
+def default_process_count() -> int:
+    """Number of worker processes to use by default"""
+    return max(1, os.cpu_count() or 1)
+
+
+def _init_worker(pdf_path: str, password: Optional[str]) -> None:
+    global _reader
+    _reader = mapped_reader(pdf_path, password)
+
+
+def _run_page(page_func: Callable, page_index: int, kwargs: dict) -> Any:
+    return page_func(_reader.pages[page_index], **kwargs)
+
+
+def map_pages(pdf_path: Path, page_func: Callable, page_indexes: Iterable[int],
+              processes: int = None, password: str = None, **kwargs) -> Iterator[Any]:
+    """
+    Apply page_func(page, **kwargs) to pages and yield results in order
+
+    page_func must be a module-level function so it can be sent to worker
+    processes, and its result must be picklable.
+
+    Args:
+        pdf_path: Path to the PDF
+        page_func: Function taking a pypdf page
+        page_indexes: 0-based page indexes to process
+        processes: Worker processes (default: CPU count, 1 = in-process)
+        password: User password for encrypted PDFs
+        **kwargs: Extra keyword arguments for page_func
+
+    Yields:
+        page_func results, in the order of page_indexes
+    """
+    page_indexes = list(page_indexes)
+    processes = processes or default_process_count()
+
+    if processes <= 1 or len(page_indexes) < MIN_PAGES_FOR_POOL:
+        with open_reader(pdf_path, password) as reader:
+            for page_index in page_indexes:
+                yield page_func(reader.pages[page_index], **kwargs)
+        return
+
+    processes = min(processes, len(page_indexes))
+    window = processes * TASKS_PER_WORKER
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(str(pdf_path), password)) as executor:
+        pending = []
+        remaining = iter(page_indexes)
+
+        for page_index in remaining:
+            pending.append(executor.submit(_run_page, page_func, page_index, kwargs))
+            if len(pending) >= window:
+                break
+
+        while pending:
+            result = pending.pop(0).result()
+            for page_index in remaining:
+                pending.append(executor.submit(_run_page, page_func, page_index, kwargs))
+                break
+            yield result
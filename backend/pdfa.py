@@ -0,0 +1,222 @@
+"""
+PDF/A-2b conversion
+- Adds one sRGB OutputIntent and PDF/A identification metadata
+- Checks fonts, actions, annotations, images and transparency in a
+  single pass over the object graph, fixing what can be fixed in place
+- Saves without linearization or stream recompression by default
+"""
+import warnings
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name, Stream
+
+SRGB_CONDITION = 'sRGB IEC61966-2.1'
+
+# Action types ISO 19005-2 does not permit
+FORBIDDEN_ACTIONS = {
+    '/Launch', '/Sound', '/Movie', '/ResetForm', '/ImportData', '/JavaScript',
+    '/Hide', '/SetOCGState', '/Rendition', '/Trans', '/GoTo3DView',
+}
+
+FORBIDDEN_ANNOTATIONS = {'/Sound', '/Movie', '/Screen', '/3D', '/TrapNet'}
+
+# Annotation flags: Invisible, Hidden, Print, NoView
+ANNOT_INVISIBLE, ANNOT_HIDDEN, ANNOT_PRINT, ANNOT_NOVIEW = 1, 2, 4, 32
+
+EMBEDDED_FONT_KEYS = ('/FontFile', '/FontFile2', '/FontFile3')
+
+
+@lru_cache(maxsize=1)
+def srgb_profile() -> bytes:
+    """ICC profile bytes for sRGB, built once per process"""
+    from PIL import ImageCms
+
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+
+
+class _Findings:
+    """Issues, applied fixes and notes collected during the scan"""
+
+    def __init__(self):
+        self.issues = Counter()
+        self.fixed = Counter()
+        self.notes = Counter()
+
+    def report(self) -> dict:
+        return {
+            'conformant': not self.issues,
+            'issues': dict(self.issues),
+            'fixed': dict(self.fixed),
+            'notes': dict(self.notes),
+        }
+
+
+def _check_font(font: Dictionary, findings: _Findings) -> None:
+    subtype = font.get('/Subtype')
+    # Type3 glyphs are content streams; Type0 is checked via its CIDFont
+    if subtype in (Name.Type3, Name.Type0):
+        return
+    descriptor = font.get('/FontDescriptor')
+    if descriptor is None or not any(key in descriptor for key in EMBEDDED_FONT_KEYS):
+        findings.issues[f"Font not embedded: {str(font.get('/BaseFont', '?'))[1:]}"] += 1
+
+
+def _check_action(parent: Dictionary, key: str, findings: _Findings) -> None:
+    action = parent.get(key)
+    if isinstance(action, Dictionary) and action.get('/S') is not None:
+        action_type = str(action.S)
+        if action_type in FORBIDDEN_ACTIONS:
+            del parent[key]
+            findings.fixed[f"Removed {action_type[1:]} action"] += 1
+
+
+def _check_annotation(annot: Dictionary, findings: _Findings) -> None:
+    subtype = str(annot.get('/Subtype', ''))
+    if subtype in FORBIDDEN_ANNOTATIONS:
+        findings.issues[f"{subtype[1:]} annotation"] += 1
+    if subtype == '/Popup':
+        return
+    flags = int(annot.get('/F', 0))
+    fixed_flags = (flags | ANNOT_PRINT) & ~(ANNOT_INVISIBLE | ANNOT_HIDDEN | ANNOT_NOVIEW)
+    if flags != fixed_flags:
+        annot.F = fixed_flags
+        findings.fixed['Set annotation print flag'] += 1
+
+
+def _check_stream(stream: Stream, findings: _Findings) -> None:
+    filters = stream.get('/Filter')
+    if filters == Name.LZWDecode or (isinstance(filters, Array) and list(filters) == [Name.LZWDecode]):
+        # Decoded here, Flate-compressed again when the file is saved
+        stream.write(stream.read_bytes())
+        findings.fixed['Re-encoded LZW stream'] += 1
+    elif isinstance(filters, Array) and Name.LZWDecode in list(filters):
+        findings.issues['LZW-compressed stream'] += 1
+
+    subtype = stream.get('/Subtype')
+    if stream.get('/Type') == Name.EmbeddedFile:
+        findings.issues['Embedded file (must itself be PDF/A)'] += 1
+    elif subtype == Name.PS or stream.get('/Subtype2') == Name.PS:
+        findings.issues['PostScript XObject'] += 1
+    elif subtype == Name.Image:
+        for key in ('/Alternates', '/OPI'):
+            if key in stream:
+                del stream[key]
+                findings.fixed[f"Removed image {key[1:]}"] += 1
+        if stream.get('/Interpolate') is True:
+            stream.Interpolate = False
+            findings.fixed['Disabled image interpolation'] += 1
+        if stream.get('/ColorSpace') == Name.DeviceCMYK:
+            findings.issues['DeviceCMYK image with an sRGB OutputIntent'] += 1
+        if '/SMask' in stream:
+            findings.notes['Soft-masked images (transparency is allowed in PDF/A-2)'] += 1
+
+
+def _check_dictionary(obj: Dictionary, findings: _Findings) -> None:
+    obj_type = obj.get('/Type')
+
+    if obj_type == Name.Font or (obj_type is None and '/BaseFont' in obj and '/Subtype' in obj):
+        _check_font(obj, findings)
+    elif obj_type == Name.Annot or (obj_type is None and '/Rect' in obj and '/Subtype' in obj):
+        _check_annotation(obj, findings)
+    elif obj_type == Name.ExtGState or (obj_type is None and any(k in obj for k in ('/ca', '/CA', '/BM'))):
+        smask = obj.get('/SMask')
+        blend = obj.get('/BM')
+        if (smask is not None and smask != Name('/None')) or \
+                float(obj.get('/CA', 1)) < 1 or float(obj.get('/ca', 1)) < 1 or \
+                (blend is not None and blend not in (Name.Normal, Name.Compatible)):
+            findings.notes['Transparency (allowed in PDF/A-2)'] += 1
+
+    for key in ('/A', '/OpenAction', '/Next'):
+        if key in obj:
+            _check_action(obj, key, findings)
+    if '/AA' in obj:
+        del obj['/AA']
+        findings.fixed['Removed additional actions'] += 1
+
+
+def _scan(pdf: pikepdf.Pdf, findings: _Findings) -> None:
+    """
+    Visit every object once
+
+    Each indirect object is walked together with the direct objects
+    nested in it; references to other indirect objects are not followed,
+    since those are visited from the object table themselves.
+    """
+    for root in pdf.objects:
+        stack = [root]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, Stream):
+                _check_stream(obj, findings)
+                _check_dictionary(obj.stream_dict, findings)
+                children = obj.stream_dict.values()
+            elif isinstance(obj, Dictionary):
+                _check_dictionary(obj, findings)
+                children = obj.values()
+            elif isinstance(obj, Array):
+                children = obj
+            else:
+                continue
+            stack.extend(child for child in children
+                         if isinstance(child, (Dictionary, Array)) and not child.is_indirect)
+
+
+def _add_output_intent(pdf: pikepdf.Pdf, findings: _Findings) -> None:
+    """Use an existing PDF/A OutputIntent or add the shared sRGB one"""
+    intents = pdf.Root.get('/OutputIntents')
+    if intents is not None and any(i.get('/S') == Name.GTS_PDFA1 for i in intents):
+        return
+
+    profile = pdf.make_stream(srgb_profile())
+    profile.N = 3
+    intent = pdf.make_indirect(Dictionary(
+        Type=Name.OutputIntent,
+        S=Name.GTS_PDFA1,
+        OutputConditionIdentifier=SRGB_CONDITION,
+        Info=SRGB_CONDITION,
+        DestOutputProfile=profile,
+    ))
+    pdf.Root.OutputIntents = Array([intent])
+    findings.fixed['Added sRGB OutputIntent'] += 1
+
+
+def convert_to_pdfa(pdf: pikepdf.Pdf, output_path: Path, linearize: bool = False) -> dict:
+    """
+    Convert an open PDF to PDF/A-2b and save it
+
+    Args:
+        pdf: Open (and decrypted) pikepdf document
+        output_path: Path to save the PDF/A file
+        linearize: Also linearize the output (slower)
+
+    Returns:
+        Dictionary with conformant, issues, fixed and notes. issues holds
+        problems that could not be fixed (e.g. fonts that are not
+        embedded); each maps a description to its number of occurrences.
+    """
+    findings = _Findings()
+    _scan(pdf, findings)
+
+    names = pdf.Root.get('/Names')
+    if names is not None and '/JavaScript' in names:
+        del names['/JavaScript']
+        findings.fixed['Removed document JavaScript'] += 1
+    if pdf.is_encrypted:
+        findings.fixed['Removed encryption'] += 1
+
+    _add_output_intent(pdf, findings)
+
+    with pdf.open_metadata(set_pikepdf_as_editor=False) as meta, warnings.catch_warnings():
+        # Info keys without an XMP equivalent (e.g. /Trapped) are dropped
+        warnings.simplefilter('ignore', UserWarning)
+        meta.load_from_docinfo(pdf.docinfo)
+        meta['pdfaid:part'] = '2'
+        meta['pdfaid:conformance'] = 'B'
+
+    # Saving without an encryption argument writes the file unencrypted
+    pdf.save(output_path, linearize=linearize,
+             force_version='1.7' if pdf.pdf_version > '1.7' else '')
+    return findings.report()
@@ -0,0 +1,677 @@
+"""
+Preflight inspection of PDFs without loading them
+- Reads only the header, the file tail (startxref), the cross-reference
+  sections and trailers, and a handful of objects: the catalog, the page
+  tree root, the encryption dictionary and the linearization dictionary
+- Cost depends on the number of xref sections, not the file size, so
+  multi-GB files are inspected in milliseconds
+- Reports version, page count, encryption and permissions (including
+  whether a password is needed to open the file), linearization and the
+  number of incremental updates
+- Files whose xref or trailer cannot be read directly (wrong startxref,
+  missing %%EOF, shifted offsets) are opened with pikepdf's recovery
+  instead, so only files without a PDF header are reported invalid
+"""
+import hashlib
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+# Bytes read from the start and the end of the file
+HEAD_SIZE = 1024
+TAIL_SIZE = 2048
+
+# Bytes read per object; grown until the object parses
+OBJECT_CHUNK = 4096
+MAX_OBJECT_SIZE = 16 * 1024 * 1024
+
+# Protects against xref /Prev loops in damaged files
+MAX_XREF_SECTIONS = 4096
+
+HEADER_PATTERN = re.compile(rb'%PDF-(\d\.\d)')
+STARTXREF_PATTERN = re.compile(rb'startxref\s+(\d+)\s+%%EOF', re.S)
+OBJECT_PATTERN = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj\b')
+# Arrays made only of references (page tree /Kids) are parsed in one step
+REF_ARRAY_PATTERN = re.compile(rb'\[((?:\s*\d+\s+\d+\s+R)*)\s*\]')
+REF_PATTERN = re.compile(rb'(\d+)\s+(\d+)\s+R')
+
+# Padding string of the standard security handler (Algorithm 2)
+PASSWORD_PADDING = bytes.fromhex('28bf4e5e4e758a4164004e56fffa01082e2e00b6d0683e802f0ca9fe6453697a')
+
+# /P permission bits (1-based as in the PDF specification)
+PERMISSION_BITS = {
+    'print': 3,
+    'modify': 4,
+    'copy': 5,
+    'annotate': 6,
+    'fill_forms': 9,
+    'accessibility': 10,
+    'assemble': 11,
+    'print_high_quality': 12,
+}
+
+WHITESPACE = b' \t\r\n\f\x00'
+DELIMITERS = b'()<>[]{}/%'
+
+
+class Ref(tuple):
+    """Indirect reference (object number, generation)"""
+
+
+class PreflightError(ValueError):
+    """The file is not a PDF that can be inspected without repair"""
+
+
+class _Parser:
+    """Parses PDF objects from a byte buffer"""
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def skip(self):
+        data = self.data
+        while self.pos < len(data):
+            c = data[self.pos]
+            if c in WHITESPACE:
+                self.pos += 1
+            elif c == 0x25:  # % comment
+                end = data.find(b'\n', self.pos)
+                self.pos = len(data) if end < 0 else end + 1
+            else:
+                break
+
+    def _token(self) -> bytes:
+        start = self.pos
+        data = self.data
+        while self.pos < len(data) and data[self.pos] not in WHITESPACE and data[self.pos] not in DELIMITERS:
+            self.pos += 1
+        return data[start:self.pos]
+
+    def parse(self):
+        self.skip()
+        if self.pos >= len(self.data):
+            raise EOFError
+        c = self.data[self.pos:self.pos + 1]
+        if c == b'/':
+            self.pos += 1
+            return '/' + self._token().decode('latin-1')
+        if c == b'<':
+            if self.data[self.pos + 1:self.pos + 2] == b'<':
+                self.pos += 2
+                result = {}
+                while True:
+                    self.skip()
+                    if self.data[self.pos:self.pos + 2] == b'>>':
+                        self.pos += 2
+                        return result
+                    if self.pos >= len(self.data):
+                        raise EOFError
+                    key = self.parse()
+                    result[key] = self.parse()
+            end = self.data.find(b'>', self.pos)
+            if end < 0:
+                raise EOFError
+            hex_digits = re.sub(rb'\s', b'', self.data[self.pos + 1:end])
+            self.pos = end + 1
+            return bytes.fromhex((hex_digits + b'0' * (len(hex_digits) % 2)).decode('latin-1'))
+        if c == b'[':
+            match = REF_ARRAY_PATTERN.match(self.data, self.pos)
+            if match:
+                self.pos = match.end()
+                return [Ref((int(n), int(g))) for n, g in REF_PATTERN.findall(match.group(1))]
+            self.pos += 1
+            result = []
+            while True:
+                self.skip()
+                if self.data[self.pos:self.pos + 1] == b']':
+                    self.pos += 1
+                    return result
+                if self.pos >= len(self.data):
+                    raise EOFError
+                result.append(self.parse())
+        if c == b'(':
+            return self._string()
+
+        token = self._token()
+        if not token:
+            raise ValueError(f"Unexpected byte {c!r} at {self.pos}")
+        if token == b'true':
+            return True
+        if token == b'false':
+            return False
+        if token == b'null':
+            return None
+        try:
+            number = float(token) if b'.' in token else int(token)
+        except ValueError:
+            return token.decode('latin-1')
+        if isinstance(number, int):
+            # "n g R" is a reference
+            saved = self.pos
+            match = re.match(rb'\s+(\d+)\s+R(?=[\s/<>\[\]()%]|$)', self.data[self.pos:self.pos + 24])
+            if match:
+                self.pos = saved + match.end()
+                return Ref((number, int(match.group(1))))
+        return number
+
+    def _string(self) -> bytes:
+        data = self.data
+        self.pos += 1
+        depth = 1
+        out = bytearray()
+        while self.pos < len(data):
+            c = data[self.pos]
+            self.pos += 1
+            if c == 0x5c:  # backslash
+                e = data[self.pos:self.pos + 1]
+                self.pos += 1
+                if e in b'nrtbf':
+                    out += {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}[e]
+                elif e.isdigit():
+                    digits = e
+                    while len(digits) < 3 and data[self.pos:self.pos + 1].isdigit():
+                        digits += data[self.pos:self.pos + 1]
+                        self.pos += 1
+                    out.append(int(digits, 8) & 0xff)
+                elif e == b'\r':
+                    if data[self.pos:self.pos + 1] == b'\n':
+                        self.pos += 1
+                elif e != b'\n':
+                    out += e
+            elif c == 0x28:
+                depth += 1
+                out.append(c)
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    return bytes(out)
+                out.append(c)
+            else:
+                out.append(c)
+        raise EOFError
+
+
+def _unpredict(data: bytes, columns: int) -> bytes:
+    """Undo PNG row predictors (FlateDecode /Predictor >= 10)"""
+    import numpy as np
+
+    row_size = columns + 1
+    rows = np.frombuffer(data[:len(data) // row_size * row_size], dtype=np.uint8).reshape(-1, row_size)
+    if rows.size and (rows[:, 0] == 2).all():
+        # Up predictor on every row (what xref streams use): column sums
+        return (np.cumsum(rows[:, 1:], axis=0, dtype=np.uint64) % 256).astype(np.uint8).tobytes()
+
+    previous = bytearray(columns)
+    out = bytearray()
+    for start in range(0, len(data) - row_size + 1, row_size):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + row_size])
+        for i in range(columns):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xff
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xff
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xff
+            elif kind == 4:
+                upper_left = previous[i - 1] if i else 0
+                p = left + up - upper_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - upper_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else upper_left)) & 0xff
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def _rc4(key: bytes, data: bytes) -> bytes:
+    s = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + s[i] + key[i % len(key)]) & 0xff
+        s[i], s[j] = s[j], s[i]
+    i = j = 0
+    out = bytearray()
+    for byte in data:
+        i = (i + 1) & 0xff
+        j = (j + s[i]) & 0xff
+        s[i], s[j] = s[j], s[i]
+        out.append(byte ^ s[(s[i] + s[j]) & 0xff])
+    return bytes(out)
+
+
+def _hash_r6(password: bytes, salt: bytes, udata: bytes = b'') -> bytes:
+    """Algorithm 2.B (ISO 32000-2) for revision 6 passwords"""
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    k = hashlib.sha256(password + salt + udata).digest()
+    round_number = 0
+    while True:
+        k1 = (password + k + udata) * 64
+        encryptor = Cipher(algorithms.AES(k[:16]), modes.CBC(k[16:32])).encryptor()
+        e = encryptor.update(k1) + encryptor.finalize()
+        k = (hashlib.sha256, hashlib.sha384, hashlib.sha512)[sum(e[:16]) % 3](e).digest()
+        round_number += 1
+        if round_number >= 64 and e[-1] <= round_number - 32:
+            return k[:32]
+
+
+def opens_without_password(encrypt: dict, first_id: bytes) -> Optional[bool]:
+    """
+    Whether the empty user password opens the file
+
+    Returns:
+        True or False for the standard security handler, None for other
+        handlers (certificates, custom) that cannot be checked
+    """
+    if encrypt.get('/Filter') != '/Standard':
+        return None
+    revision = encrypt.get('/R', 2)
+    u = encrypt.get('/U', b'')
+    if revision >= 5:
+        if len(u) < 40:
+            return None
+        if revision == 5:
+            return hashlib.sha256(u[32:40]).digest() == u[:32]
+        return _hash_r6(b'', u[32:40]) == u[:32]
+
+    length = encrypt.get('/Length', 40) // 8 if revision >= 3 else 5
+    permissions = encrypt.get('/P', 0) & 0xffffffff
+    h = hashlib.md5(PASSWORD_PADDING + encrypt.get('/O', b'') + permissions.to_bytes(4, 'little') + first_id)
+    if revision >= 4 and encrypt.get('/EncryptMetadata', True) is False:
+        h.update(b'\xff\xff\xff\xff')
+    key = h.digest()[:length]
+    if revision == 2:
+        return _rc4(key, PASSWORD_PADDING) == u[:32]
+    for _ in range(50):
+        key = hashlib.md5(key).digest()[:length]
+    value = _rc4(key, hashlib.md5(PASSWORD_PADDING + first_id).digest())
+    for i in range(1, 20):
+        value = _rc4(bytes(b ^ i for b in key), value)
+    return value == u[:16]
+
+
+def encryption_method(encrypt: dict) -> str:
+    """Readable cipher name of an encryption dictionary"""
+    version = encrypt.get('/V', 0)
+    if version == 5:
+        return 'AES-256'
+    if version == 4:
+        filters = encrypt.get('/CF', {})
+        crypt_filter = filters.get(encrypt.get('/StmF', '/Identity'), {})
+        method = crypt_filter.get('/CFM') if isinstance(crypt_filter, dict) else None
+        return {'/AESV2': 'AES-128', '/AESV3': 'AES-256', '/V2': 'RC4-128'}.get(method, 'none')
+    return f"RC4-{encrypt.get('/Length', 40) if version == 2 else 40}"
+
+
+def permissions(p: int) -> Dict[str, bool]:
+    """Decode the /P permission flags"""
+    return {name: bool(p & (1 << (bit - 1))) for name, bit in PERMISSION_BITS.items()}
+
+
+class PDFInspector:
+    """
+    Reads a PDF's structure from its cross-reference data only
+
+    Objects are located through the xref sections (newest first) and
+    parsed on demand, so only the bytes of requested objects are read.
+    """
+
+    def __init__(self, source: BinaryIO):
+        self.f = source
+        self.f.seek(0, os.SEEK_END)
+        self.size = self.f.tell()
+        self.sections: List[dict] = []
+        self._object_streams: Dict[int, Tuple[bytes, List[int]]] = {}
+
+    def _read(self, offset: int, length: int) -> bytes:
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def header_version(self) -> str:
+        match = HEADER_PATTERN.search(self._read(0, HEAD_SIZE))
+        if not match:
+            raise PreflightError("No %PDF header")
+        return match.group(1).decode()
+
+    def startxref(self) -> int:
+        tail = self._read(max(0, self.size - TAIL_SIZE), TAIL_SIZE)
+        matches = STARTXREF_PATTERN.findall(tail)
+        if not matches:
+            raise PreflightError("startxref not found (truncated or damaged file)")
+        return int(matches[-1])
+
+    def _object_at(self, offset: int, with_stream: bool = False):
+        """Parse 'n g obj <value>' at offset; streams return (dict, raw data)"""
+        chunk = OBJECT_CHUNK
+        while True:
+            data = self._read(offset, chunk)
+            match = OBJECT_PATTERN.match(data)
+            if not match:
+                raise PreflightError(f"No object at offset {offset}")
+            # Read the whole object before parsing rather than parsing again per chunk
+            complete = b'endobj' in data or b'stream' in data or len(data) < chunk
+            if not complete and chunk < MAX_OBJECT_SIZE:
+                chunk *= 4
+                continue
+            parser = _Parser(data, match.end())
+            try:
+                value = parser.parse()
+                parser.skip()
+                break
+            except (EOFError, IndexError):
+                if chunk >= MAX_OBJECT_SIZE or len(data) < chunk:
+                    raise PreflightError(f"Object at offset {offset} is too large or truncated")
+                chunk *= 4
+
+        if not with_stream:
+            return value
+        if not isinstance(value, dict) or data[parser.pos:parser.pos + 6] != b'stream':
+            raise PreflightError(f"Object at offset {offset} is not a stream")
+        start = offset + parser.pos + 6
+        newline = self._read(start, 2)
+        start += 2 if newline == b'\r\n' else 1
+        length = value.get('/Length')
+        if isinstance(length, Ref):
+            length = self.resolve(length)
+        if not isinstance(length, int) or length < 0:
+            raise PreflightError(f"Stream at offset {offset} has no usable /Length")
+        return value, self._read(start, length)
+
+    @staticmethod
+    def _decode(stream: dict, raw: bytes) -> bytes:
+        filters = stream.get('/Filter')
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        if any(f not in ('/FlateDecode', '/Fl') for f in filters):
+            raise PreflightError(f"Unsupported filter {filters}")
+        data = zlib.decompress(raw) if filters else raw
+        params = stream.get('/DecodeParms') or {}
+        params = params[0] if isinstance(params, list) else params
+        if params and params.get('/Predictor', 1) >= 10:
+            data = _unpredict(data, params.get('/Columns', 1))
+        return data
+
+    def _load_table(self, offset: int) -> dict:
+        """Index a classic xref table by seeking over its fixed-size entries"""
+        subsections = []
+        pos = offset + 4
+        while True:
+            data = self._read(pos, 64)
+            match = re.match(rb'\s*(\d+)\s+(\d+)[ \t]*\r?\n?', data)
+            if not match:
+                break
+            first, count = int(match.group(1)), int(match.group(2))
+            entries = pos + match.end()
+            # Entries are 20 bytes; some writers use a 19-byte form
+            sample = self._read(entries, 20)
+            width = 20 if sample[18:20] in (b' \n', b' \r', b'\r\n') or count == 0 else 19
+            subsections.append((first, count, entries, width))
+            pos = entries + count * width
+
+        data = self._read(pos, OBJECT_CHUNK)
+        match = re.match(rb'\s*trailer', data)
+        if not match:
+            raise PreflightError(f"No trailer after xref table at {offset}")
+        parser = _Parser(data, match.end())
+        return {'type': 'table', 'subsections': subsections, 'trailer': parser.parse()}
+
+    def _load_stream(self, offset: int) -> dict:
+        stream, raw = self._object_at(offset, with_stream=True)
+        if stream.get('/Type') != '/XRef':
+            raise PreflightError(f"No cross-reference stream at {offset}")
+        widths = stream['/W']
+        index = stream.get('/Index', [0, stream['/Size']])
+        return {
+            'type': 'stream',
+            'rows': self._decode(stream, raw),
+            'widths': widths,
+            'index': list(zip(index[::2], index[1::2])),
+            'trailer': stream,
+        }
+
+    def load_xref(self):
+        """Follow the /Prev chain from startxref, newest section first"""
+        offset = self.startxref()
+        seen = set()
+        while offset is not None and len(self.sections) < MAX_XREF_SECTIONS:
+            if offset in seen or not 0 <= offset < self.size:
+                raise PreflightError(f"Bad xref offset {offset}")
+            seen.add(offset)
+            is_table = self._read(offset, 32).lstrip().startswith(b'xref')
+            section = self._load_table(offset) if is_table else self._load_stream(offset)
+            section['offset'] = offset
+            self.sections.append(section)
+            trailer = section['trailer']
+            if is_table and isinstance(trailer.get('/XRefStm'), int):
+                hybrid = self._load_stream(trailer['/XRefStm'])
+                hybrid['hybrid'] = True
+                hybrid['offset'] = trailer['/XRefStm']
+                self.sections.append(hybrid)
+            offset = trailer.get('/Prev')
+        return self.sections
+
+    @property
+    def trailer(self) -> dict:
+        return self.sections[0]['trailer']
+
+    def _entry(self, number: int) -> Optional[Tuple[int, int, int]]:
+        """(type, field 2, field 3) of an object's newest xref entry"""
+        for section in self.sections:
+            if section['type'] == 'table':
+                for first, count, entries, width in section['subsections']:
+                    if first <= number < first + count:
+                        line = self._read(entries + (number - first) * width, width)
+                        offset, generation, kind = int(line[:10]), int(line[11:16]), line[17:18]
+                        return (1 if kind == b'n' else 0), offset, generation
+            else:
+                row_size = sum(section['widths'])
+                row = None
+                base = 0
+                for first, count in section['index']:
+                    if first <= number < first + count:
+                        row = base + number - first
+                        break
+                    base += count
+                if row is None:
+                    continue
+                data = section['rows'][row * row_size:(row + 1) * row_size]
+                fields = []
+                pos = 0
+                for width in section['widths']:
+                    fields.append(int.from_bytes(data[pos:pos + width], 'big') if width else None)
+                    pos += width
+                kind = 1 if fields[0] is None else fields[0]
+                return kind, fields[1] or 0, fields[2] or 0
+        return None
+
+    def resolve(self, value):
+        """Follow an indirect reference (values that are not references are returned as is)"""
+        if not isinstance(value, Ref):
+            return value
+        entry = self._entry(value[0])
+        if entry is None or entry[0] == 0:
+            return None
+        kind, field2, field3 = entry
+        if kind == 1:
+            return self._object_at(field2)
+        return self._from_object_stream(field2, field3)
+
+    def _from_object_stream(self, stream_number: int, index: int):
+        if stream_number not in self._object_streams:
+            entry = self._entry(stream_number)
+            if entry is None or entry[0] != 1:
+                raise PreflightError(f"Object stream {stream_number} not found")
+            stream, raw = self._object_at(entry[1], with_stream=True)
+            data = self._decode(stream, raw)
+            parser = _Parser(data[:stream['/First']])
+            header = [parser.parse() for _ in range(2 * stream['/N'])]
+            offsets = [stream['/First'] + offset for offset in header[1::2]]
+            self._object_streams[stream_number] = (data, offsets)
+        data, offsets = self._object_streams[stream_number]
+        return _Parser(data, offsets[index]).parse()
+
+    def linearization(self) -> Optional[dict]:
+        """The linearization dictionary, if the first object is one"""
+        head = self._read(0, HEAD_SIZE)
+        match = OBJECT_PATTERN.search(head)
+        if not match:
+            return None
+        try:
+            value = _Parser(head, match.end()).parse()
+        except (EOFError, IndexError, ValueError):
+            return None
+        return value if isinstance(value, dict) and '/Linearized' in value else None
+
+
+def inspect_pdf(source: Union[str, Path, BinaryIO]) -> dict:
+    """
+    Inspect a PDF from its header, trailer and cross-reference data
+
+    Args:
+        source: Path or seekable binary file object (left at an undefined
+            position; callers re-seek before reading)
+
+    Returns:
+        Dictionary with valid (False only without a PDF header), structure
+        ('ok', 'recovered' when pikepdf had to reconstruct the xref, or
+        'unknown' when that failed too), error (why the direct read
+        failed), file_size, version, page_count, encrypted, encryption
+        (method, revision), needs_password, permissions, linearized,
+        linearization_valid, xref ('table', 'stream' or 'hybrid'),
+        incremental_updates, estimated_page_bytes and elapsed_ms
+    """
+    started = time.perf_counter()
+    if isinstance(source, (str, Path)):
+        with open(source, 'rb') as f:
+            return _inspect(f, started)
+    return _inspect(source, started)
+
+
+def _inspect(f: BinaryIO, started: float) -> dict:
+    inspector = PDFInspector(f)
+    report = {
+        'valid': False,
+        'structure': None,
+        'file_size': inspector.size,
+        'version': None,
+        'page_count': None,
+        'encrypted': False,
+        'encryption': None,
+        'needs_password': False,
+        'permissions': None,
+        'linearized': False,
+        'linearization_valid': False,
+        'xref': None,
+        'incremental_updates': None,
+        'estimated_page_bytes': None,
+    }
+    try:
+        report['version'] = inspector.header_version()
+    except PreflightError as e:
+        report['error'] = str(e)
+        report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return report
+
+    report['valid'] = True
+    try:
+        inspector.load_xref()
+        trailer = inspector.trailer
+
+        newest = inspector.sections[:2]
+        report['xref'] = 'hybrid' if any(s.get('hybrid') for s in newest) else newest[0]['type']
+
+        linearization = inspector.linearization()
+        report['linearized'] = linearization is not None
+        report['linearization_valid'] = bool(linearization) and linearization.get('/L') == inspector.size
+        # A linearized file starts with two sections (first page + rest)
+        sections = sum(1 for section in inspector.sections if not section.get('hybrid'))
+        report['incremental_updates'] = max(0, sections - 1 - (1 if report['linearized'] else 0))
+
+        encrypt = inspector.resolve(trailer.get('/Encrypt'))
+        if encrypt:
+            file_id = trailer.get('/ID') or [b'']
+            report['encrypted'] = True
+            report['encryption'] = {
+                'method': encryption_method(encrypt),
+                'revision': encrypt.get('/R'),
+                'handler': (encrypt.get('/Filter') or '').lstrip('/'),
+            }
+            opens = opens_without_password(encrypt, file_id[0])
+            report['needs_password'] = opens is not True
+            report['permissions'] = permissions(encrypt.get('/P', -1))
+
+        try:
+            root = inspector.resolve(trailer.get('/Root'))
+            if isinstance(root, dict):
+                catalog_version = (root.get('/Version') or '').lstrip('/')
+                if catalog_version > report['version']:
+                    report['version'] = catalog_version
+                pages = inspector.resolve(root.get('/Pages'))
+                if isinstance(pages, dict) and isinstance(pages.get('/Count'), int):
+                    report['page_count'] = pages['/Count']
+        except (PreflightError, zlib.error):
+            # Encrypted object streams cannot be read without the key
+            if not report['encrypted']:
+                raise
+
+        report['structure'] = 'ok'
+    except (PreflightError, ValueError, KeyError, TypeError, IndexError, EOFError, zlib.error) as e:
+        report['error'] = str(e) or e.__class__.__name__
+        _recover(f, report)
+
+    if report['page_count']:
+        report['estimated_page_bytes'] = inspector.size // report['page_count']
+
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def _recover(f: BinaryIO, report: dict) -> None:
+    """
+    Fill in a report with pikepdf when the structure cannot be read directly
+
+    pikepdf (qpdf) rebuilds a damaged cross-reference table by scanning
+    the file, which costs a full read but only happens for such files.
+    """
+    import pikepdf
+
+    f.seek(0)
+    try:
+        with pikepdf.open(f) as pdf:
+            report['version'] = max(report['version'], pdf.pdf_version)
+            report['page_count'] = len(pdf.pages)
+            report['linearized'] = pdf.is_linearized
+            if pdf.is_encrypted:
+                info = pdf.encryption
+                method = {
+                    'aesv3': 'AES-256',
+                    'aes': f'AES-{info.bits}',
+                    'rc4': f'RC4-{info.bits}',
+                }.get(info.stream_method.name, 'none')
+                allow = pdf.allow
+                report['encrypted'] = True
+                # Recovery can open a file without finding its key
+                report['needs_password'] = not info.encryption_key
+                report['encryption'] = {'method': method, 'revision': info.R, 'handler': 'Standard'}
+                report['permissions'] = {
+                    'print': allow.print_lowres,
+                    'modify': allow.modify_other,
+                    'copy': allow.extract,
+                    'annotate': allow.modify_annotation,
+                    'fill_forms': allow.modify_form,
+                    'accessibility': allow.accessibility,
+                    'assemble': allow.modify_assembly,
+                    'print_high_quality': allow.print_highres,
+                }
+        report['structure'] = 'recovered'
+    except pikepdf.PasswordError:
+        report['encrypted'] = True
+        report['needs_password'] = True
+        report['structure'] = 'recovered'
+    except Exception:
+        report['structure'] = 'unknown'
@@ -0,0 +1,271 @@
+"""
+Batch password protection and removal
+- Passwords come from a CSV map (file name → password) or one shared
+  password
+- Files are encrypted or decrypted in worker processes, a bounded number
+  in flight
+- Results are added to a ZIP archive as they finish, together with a
+  per-file status report, so outputs never pile up in memory or on disk
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import pikepdf
+
+from .parallel import TASKS_PER_WORKER, default_process_count
+
+# pikepdf security handler revision for each AES key length
+AES_REVISIONS = {128: 4, 256: 6}
+
+# Columns accepted in a password map
+NAME_COLUMNS = ('file', 'filename', 'name')
+PASSWORD_COLUMNS = ('password', 'user_password')
+OWNER_COLUMNS = ('owner_password', 'owner')
+
+REPORT_NAME = 'report.csv'
+
+
+def encryption(user_password: str, owner_password: str, strength: int = 256,
+               allow_printing: bool = True, allow_commenting: bool = False,
+               allow_copying: bool = False, allow_forms: bool = True) -> pikepdf.Encryption:
+    """
+    AES encryption settings for pikepdf
+
+    Args:
+        strength: AES key length, 128 or 256
+    """
+    if strength not in AES_REVISIONS:
+        raise ValueError(f"Unsupported encryption strength {strength} (use 128 or 256)")
+    return pikepdf.Encryption(
+        user=user_password or "",
+        owner=owner_password or "",
+        R=AES_REVISIONS[strength],
+        aes=True,
+        allow=pikepdf.Permissions(
+            print_highres=allow_printing,
+            print_lowres=allow_printing,
+            modify_annotation=allow_commenting,
+            extract=allow_copying,
+            modify_form=allow_forms,
+            accessibility=True
+        )
+    )
+
+
+def _column(fieldnames: List[str], candidates: Tuple[str, ...]) -> Optional[str]:
+    for name in fieldnames:
+        if name.strip().lower() in candidates:
+            return name
+    return None
+
+
+def read_password_map(csv_file: BinaryIO) -> Dict[str, Tuple[str, str]]:
+    """
+    Read a password map
+
+    The CSV has a header with a file column (file, filename or name), a
+    password column (password or user_password) and optionally an owner
+    password column (owner_password or owner). Without a recognised
+    header the columns are taken in that order.
+
+    Returns:
+        {file name: (user password, owner password)}, also keyed by the
+        name without extension so either form matches
+    """
+    text = io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline='')
+    try:
+        rows = list(csv.reader(text))
+    finally:
+        text.detach()
+    if not rows:
+        return {}
+
+    header = rows[0]
+    name_col = _column(header, NAME_COLUMNS)
+    password_col = _column(header, PASSWORD_COLUMNS)
+    if name_col is not None and password_col is not None:
+        owner_col = _column(header, OWNER_COLUMNS)
+        indexes = (header.index(name_col), header.index(password_col),
+                   header.index(owner_col) if owner_col is not None else None)
+        rows = rows[1:]
+    else:
+        indexes = (0, 1, 2)
+
+    passwords = {}
+    for row in rows:
+        if len(row) <= max(indexes[0], indexes[1]) or not row[indexes[0]].strip():
+            continue
+        name = row[indexes[0]].strip()
+        owner = row[indexes[2]] if indexes[2] is not None and len(row) > indexes[2] else ''
+        passwords[name] = (row[indexes[1]], owner)
+        passwords.setdefault(Path(name).stem, (row[indexes[1]], owner))
+    return passwords
+
+
+def password_for(name: str, password_map: Dict[str, Tuple[str, str]],
+                 shared: Tuple[str, str]) -> Optional[Tuple[str, str]]:
+    """Passwords for a file: its map entry, else the shared ones, else None"""
+    entry = password_map.get(name) or password_map.get(Path(name).stem)
+    if entry is not None:
+        return entry
+    return shared if shared[0] or shared[1] else None
+
+
+def protect_file(pdf_path: str, output_path: str, user_password: str, owner_password: str,
+                 options: dict) -> dict:
+    """Encrypt one file; runs in worker processes and reports instead of raising"""
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            pdf.save(output_path, encryption=encryption(user_password, owner_password, **options))
+        return {'status': 'protected', 'error': ''}
+    except pikepdf.PasswordError:
+        return {'status': 'failed', 'error': 'already password protected'}
+    except Exception as e:
+        return {'status': 'failed', 'error': str(e)}
+
+
+def unlock_file(pdf_path: str, output_path: str, password: str) -> dict:
+    """Decrypt one file; runs in worker processes and reports instead of raising"""
+    try:
+        with pikepdf.open(pdf_path, password=password or '') as pdf:
+            status = 'unlocked' if pdf.is_encrypted else 'not encrypted'
+            pdf.save(output_path)
+        return {'status': status, 'error': ''}
+    except pikepdf.PasswordError:
+        return {'status': 'failed', 'error': 'wrong password'}
+    except Exception as e:
+        return {'status': 'failed', 'error': str(e)}
+
+
+def _run_jobs(func, jobs: List[tuple], processes: int) -> Iterator[Tuple[int, dict]]:
+    """Yield (job index, result) as jobs finish, with a bounded window in flight"""
+    processes = min(processes or default_process_count(), len(jobs))
+    if processes <= 1:
+        for index, job in enumerate(jobs):
+            yield index, func(*job)
+        return
+
+    window = processes * TASKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = {}
+        remaining = iter(enumerate(jobs))
+        for index, job in remaining:
+            pending[executor.submit(func, *job)] = index
+            if len(pending) >= window:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                for next_index, job in remaining:
+                    pending[executor.submit(func, *job)] = next_index
+                    break
+                yield index, future.result()
+
+
+def _output_names(names: List[str], suffix: str) -> List[str]:
+    """Archive entry names, made unique when inputs share a name"""
+    seen = {}
+    result = []
+    for name in names:
+        stem = Path(name).stem
+        count = seen.get(stem, 0)
+        seen[stem] = count + 1
+        result.append(f"{stem}_{suffix}.pdf" if count == 0 else f"{stem}_{suffix}_{count + 1}.pdf")
+    return result
+
+
+def _archive(func, jobs: List[tuple], skipped: Dict[int, dict], entries: List[str],
+             names: List[str], archive_path: Path, processes: int) -> List[dict]:
+    """Run jobs and stream each finished output into the archive"""
+    report: List[Optional[dict]] = [None] * len(names)
+    for position, result in skipped.items():
+        report[position] = {'file': names[position], 'output': '', **result}
+
+    positions = [job[0] for job in jobs]
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as archive:
+        for index, result in _run_jobs(func, [job[1:] for job in jobs], processes):
+            position = positions[index]
+            output = Path(jobs[index][2])
+            entry = ''
+            if result['status'] != 'failed':
+                entry = entries[position]
+                archive.write(output, entry)
+            if output.exists():
+                os.unlink(output)
+            report[position] = {'file': names[position], 'output': entry, **result}
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=['file', 'output', 'status', 'error'])
+        writer.writeheader()
+        writer.writerows(report)
+        archive.writestr(REPORT_NAME, buffer.getvalue().encode('utf-8'))
+    return report
+
+
+def protect_files(pdf_paths: List[Path], archive_path: Path, password_map: Dict[str, Tuple[str, str]],
+                  shared: Tuple[str, str] = ('', ''), names: List[str] = None,
+                  processes: int = None, **options) -> List[dict]:
+    """
+    Encrypt PDFs into a ZIP archive
+
+    Args:
+        password_map: {file name: (user password, owner password)}
+        shared: (user password, owner password) for files not in the map
+        names: File names used for lookups and outputs (default: the paths)
+        **options: Keyword arguments for encryption (strength, permissions)
+
+    Returns:
+        Status per input file (file, output, status, error), also written
+        to the archive as report.csv
+    """
+    encryption('', '', **options)  # reject bad settings before starting the batch
+    names = names or [Path(path).name for path in pdf_paths]
+    entries = _output_names(names, 'protected')
+    work_dir = Path(tempfile.mkdtemp(prefix='protect_'))
+    try:
+        jobs = []
+        skipped = {}
+        for position, (path, name) in enumerate(zip(pdf_paths, names)):
+            passwords = password_for(name, password_map, shared)
+            if passwords is None:
+                skipped[position] = {'status': 'failed', 'error': 'no password for this file'}
+                continue
+            jobs.append((position, str(path), str(work_dir / f"{position}.pdf"),
+                         passwords[0], passwords[1], options))
+        return _archive(protect_file, jobs, skipped, entries, names, archive_path, processes)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def unlock_files(pdf_paths: List[Path], archive_path: Path, password_map: Dict[str, Tuple[str, str]],
+                 shared: str = '', names: List[str] = None, processes: int = None) -> List[dict]:
+    """
+    Decrypt PDFs into a ZIP archive
+
+    Each file is opened with its mapped password (user or owner) or the
+    shared one; files that are not encrypted are passed through.
+
+    Returns:
+        Status per input file (file, output, status, error), also written
+        to the archive as report.csv
+    """
+    names = names or [Path(path).name for path in pdf_paths]
+    entries = _output_names(names, 'unlocked')
+    work_dir = Path(tempfile.mkdtemp(prefix='unlock_'))
+    try:
+        jobs = []
+        for position, (path, name) in enumerate(zip(pdf_paths, names)):
+            user_password, owner_password = password_for(name, password_map, (shared, '')) or ('', '')
+            jobs.append((position, str(path), str(work_dir / f"{position}.pdf"),
+                         owner_password or user_password))
+        return _archive(unlock_file, jobs, {}, entries, names, archive_path, processes)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
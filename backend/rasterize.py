@@ -0,0 +1,552 @@
+"""
+Page rasterization helpers
+- Renders PDF pages in page-range batches with poppler (pdf2image)
+- Several batches render concurrently; pages are written or yielded
+  as soon as their batch finishes, in page order
+- Memory stays bounded by the batches in flight, not the page count
+- Full-page JPEG scans can be exported without rendering
+- Oversized pages can be rendered in tiles and streamed to PNG
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+# pdf2image format name and file extension for each supported output format
+IMAGE_FORMATS = {
+    'jpg': ('jpeg', 'jpg'),
+    'jpeg': ('jpeg', 'jpg'),
+    'png': ('png', 'png'),
+}
+
+DEFAULT_BATCH_SIZE = 8
+
+
+def default_thread_count() -> int:
+    """Number of concurrent render batches to use by default"""
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+class PageRasterizer:
+
+    @staticmethod
+    def page_count(pdf_path: Path, password: str = None) -> int:
+        """Get the number of pages without rendering anything"""
+        from pdf2image import pdfinfo_from_path
+
+        return int(pdfinfo_from_path(str(pdf_path), userpw=password)['Pages'])
+
+    @staticmethod
+    def page_batches(pages: Iterable[int],
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> List[Tuple[int, int]]:
+        """
+        Group 1-based page numbers into inclusive (first, last) batches
+
+        Only consecutive pages share a batch, so a sparse selection still
+        renders exactly the requested pages.
+        """
+        batch_size = max(1, batch_size)
+        batches = []
+        for page in sorted(set(pages)):
+            if batches and page == batches[-1][1] + 1 and page - batches[-1][0] < batch_size:
+                batches[-1] = (batches[-1][0], page)
+            else:
+                batches.append((page, page))
+        return batches
+
+    @staticmethod
+    def resolve_pages(pdf_path: Path, first_page: Optional[int], last_page: Optional[int],
+                      pages: Optional[List[int]] = None, password: str = None) -> List[int]:
+        """Expand a page selection into a sorted list of 1-based page numbers"""
+        if pages is not None:
+            return sorted(pages)
+        total = PageRasterizer.page_count(pdf_path, password)
+        first = max(1, first_page or 1)
+        last = min(total, last_page or total)
+        return list(range(first, last + 1))
+
+    @staticmethod
+    def _render_batch(pdf_path: Path, batch: Tuple[int, int], work_dir: Path,
+                      dpi: int, fmt: str, quality: int, grayscale: bool,
+                      password: str, use_cropbox: bool = False) -> List[Path]:
+        """Render one page range straight to disk and return the file paths"""
+        from pdf2image import convert_from_path
+
+        batch_dir = Path(tempfile.mkdtemp(prefix=f'p{batch[0]}_', dir=work_dir))
+        return convert_from_path(
+            str(pdf_path),
+            dpi=dpi,
+            first_page=batch[0],
+            last_page=batch[1],
+            fmt=fmt,
+            jpegopt={'quality': quality, 'optimize': False, 'progressive': False} if fmt == 'jpeg' else None,
+            grayscale=grayscale,
+            userpw=password,
+            use_cropbox=use_cropbox,
+            thread_count=1,
+            output_folder=str(batch_dir),
+            output_file='page',
+            paths_only=True,
+        )
+
+    @staticmethod
+    def _iter_rendered(pdf_path: Path, pages: List[int], work_dir: Path, dpi: int, fmt: str, quality: int,
+                       grayscale: bool, password: str, batch_size: int,
+                       thread_count: int, use_cropbox: bool = False) -> Iterator[Tuple[int, Path]]:
+        """
+        Yield (page_number, rendered_file) in page order
+
+        At most thread_count batches are rendering or waiting to be
+        consumed at any time. Each batch's files are deleted once the
+        consumer moves past them.
+        """
+        batches = PageRasterizer.page_batches(pages, batch_size)
+        thread_count = max(1, thread_count or default_thread_count())
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            pending = []
+            next_batch = 0
+
+            def submit():
+                nonlocal next_batch
+                while next_batch < len(batches) and len(pending) < thread_count:
+                    batch = batches[next_batch]
+                    pending.append((batch, executor.submit(
+                        PageRasterizer._render_batch, pdf_path, batch, work_dir,
+                        dpi, fmt, quality, grayscale, password, use_cropbox
+                    )))
+                    next_batch += 1
+
+            submit()
+            while pending:
+                batch, future = pending.pop(0)
+                paths = [Path(p) for p in future.result()]
+                submit()
+
+                for page_number, path in zip(range(batch[0], batch[1] + 1), paths):
+                    yield page_number, path
+
+                if paths:
+                    shutil.rmtree(paths[0].parent, ignore_errors=True)
+
+    @staticmethod
+    def render_to_files(pdf_path: Path, output_dir: Path, image_format: str = 'jpg',
+                        dpi: int = 200, quality: int = 95,
+                        first_page: int = None, last_page: int = None,
+                        thread_count: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                        password: str = None, name_template: str = 'page_{n}.{ext}',
+                        pages: List[int] = None, use_cropbox: bool = False) -> List[Path]:
+        """
+        Render pages directly to image files
+
+        poppler writes each page to disk itself, so page bitmaps never pass
+        through Python memory.
+
+        Args:
+            pdf_path: Path to the PDF
+            output_dir: Directory to save images
+            image_format: 'jpg' or 'png'
+            dpi: Image resolution
+            quality: JPEG quality (1-100)
+            first_page: First page to render (1-based, default: 1)
+            last_page: Last page to render (default: last page)
+            thread_count: Number of batches rendered concurrently
+            batch_size: Pages rendered per poppler invocation
+            password: User password for encrypted PDFs
+            name_template: Output name with {n} page number and {ext}
+            pages: Explicit 1-based page numbers (overrides first/last_page)
+            use_cropbox: Render the visible CropBox instead of the MediaBox
+
+        Returns:
+            List of paths to created images, in page order
+        """
+        fmt, ext = IMAGE_FORMATS[image_format.lower()]
+        pages = PageRasterizer.resolve_pages(pdf_path, first_page, last_page, pages, password)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = Path(tempfile.mkdtemp(prefix='.render_', dir=output_dir))
+
+        output_files = []
+        try:
+            for page_number, path in PageRasterizer._iter_rendered(
+                    pdf_path, pages, work_dir, dpi, fmt, quality, False,
+                    password, batch_size, thread_count, use_cropbox):
+                output_path = output_dir / name_template.format(n=page_number, ext=ext)
+                os.replace(path, output_path)
+                output_files.append(output_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return output_files
+
+    @staticmethod
+    def iter_pages(pdf_path: Path, dpi: int = 200,
+                   first_page: int = None, last_page: int = None,
+                   thread_count: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                   grayscale: bool = False, password: str = None,
+                   pages: List[int] = None) -> Iterator[Tuple[int, Image.Image]]:
+        """
+        Yield (page_number, PIL image) for each page, in page order
+
+        Pages are rendered ahead in concurrent batches to lossless PNG files
+        and decoded one at a time, so only the current page is held in
+        memory by the caller.
+        """
+        pages = PageRasterizer.resolve_pages(pdf_path, first_page, last_page, pages, password)
+        work_dir = Path(tempfile.mkdtemp(prefix='render_'))
+
+        try:
+            for page_number, path in PageRasterizer._iter_rendered(
+                    pdf_path, pages, work_dir, dpi, 'png', 100, grayscale,
+                    password, batch_size, thread_count):
+                image = Image.open(path)
+                image.load()
+                yield page_number, image
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# EXIF orientation that displays an upright image for each /Rotate value
+ROTATE_TO_EXIF_ORIENTATION = {0: 1, 90: 6, 180: 3, 270: 8}
+
+# Content stream operators allowed on a page that only places one image
+PASSTHROUGH_OPERATORS = {'q', 'Q', 'cm', 'Do'}
+
+PASSTHROUGH_COLORSPACES = {'/DeviceGray', '/DeviceRGB'}
+
+
+def _concat_matrix(m, ctm):
+    """Return m x ctm for PDF [a b c d e f] matrices"""
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = ctm
+    return (
+        a * A + b * C, a * B + b * D,
+        c * A + d * C, c * B + d * D,
+        e * A + f * C + E, e * B + f * D + F,
+    )
+
+
+class ScanPageDetector:
+    """
+    Find pages that are nothing but one full-page JPEG
+
+    Such pages can be exported by copying the embedded DCT stream instead
+    of rendering and re-encoding it.
+    """
+
+    @staticmethod
+    def passthrough_image(page):
+        """
+        Return the image XObject if the page is a single full-page JPEG
+
+        The page must draw exactly one image with only q/Q/cm/Do, placed
+        axis-aligned over the whole mediabox, with no annotations. The
+        image must be a plain 8-bit gray or RGB DCT stream with no masks
+        or decode remapping, so its bytes render identically on their own.
+        """
+        import pikepdf
+
+        if page.obj.get('/Annots'):
+            return None
+
+        xobjects = page.obj.get('/Resources', {}).get('/XObject', {})
+        ctm = (1, 0, 0, 1, 0, 0)
+        stack = []
+        placed = None
+
+        for operands, operator in pikepdf.parse_content_stream(page):
+            op = str(operator)
+            if op not in PASSTHROUGH_OPERATORS:
+                return None
+            if op == 'q':
+                stack.append(ctm)
+            elif op == 'Q':
+                ctm = stack.pop() if stack else ctm
+            elif op == 'cm':
+                ctm = _concat_matrix(tuple(float(v) for v in operands), ctm)
+            elif op == 'Do':
+                if placed is not None:
+                    return None
+                placed = (xobjects.get(str(operands[0])), ctm)
+
+        if placed is None or placed[0] is None:
+            return None
+
+        image, (a, b, c, d, e, f) = placed
+        if image.get('/Subtype') != '/Image':
+            return None
+        filters = image.get('/Filter')
+        filters = [str(f) for f in filters] if isinstance(filters, pikepdf.Array) else [str(filters)]
+        if filters != ['/DCTDecode']:
+            return None
+        if int(image.get('/BitsPerComponent', 8)) != 8:
+            return None
+        if any(key in image for key in ('/SMask', '/Mask', '/Decode', '/ImageMask')):
+            return None
+
+        colorspace = image.get('/ColorSpace')
+        if isinstance(colorspace, pikepdf.Array) and str(colorspace[0]) == '/ICCBased':
+            if int(colorspace[1].get('/N', 0)) not in (1, 3):
+                return None
+        elif str(colorspace) not in PASSTHROUGH_COLORSPACES:
+            return None
+
+        # Placement must be upright and cover the mediabox edge to edge
+        if b != 0 or c != 0 or a <= 0 or d <= 0:
+            return None
+        llx, lly, urx, ury = (float(v) for v in page.mediabox)
+        tolerance = max(2.0, 0.005 * max(urx - llx, ury - lly))
+        if (abs(e - llx) > tolerance or abs(f - lly) > tolerance or
+                abs(e + a - urx) > tolerance or abs(f + d - ury) > tolerance):
+            return None
+
+        return image
+
+    @staticmethod
+    def oriented_jpeg(data: bytes, rotation: int) -> bytes:
+        """
+        Tag JPEG bytes with an EXIF orientation for the page /Rotate value
+
+        The entropy-coded data is untouched; viewers apply the rotation.
+        """
+        orientation = ROTATE_TO_EXIF_ORIENTATION.get(rotation % 360, 1)
+        if orientation == 1:
+            return data
+
+        # Big-endian TIFF header with a single IFD entry: Orientation (SHORT)
+        tiff = (
+            b'MM\x00\x2a\x00\x00\x00\x08'
+            + b'\x00\x01'
+            + b'\x01\x12\x00\x03\x00\x00\x00\x01'
+            + orientation.to_bytes(2, 'big') + b'\x00\x00'
+            + b'\x00\x00\x00\x00'
+        )
+        payload = b'Exif\x00\x00' + tiff
+        segment = b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+
+        # Keep a leading JFIF APP0 segment first, as the JFIF spec requires
+        insert_at = 2
+        if data[2:4] == b'\xff\xe0':
+            insert_at = 4 + int.from_bytes(data[4:6], 'big')
+        return data[:insert_at] + segment + data[insert_at:]
+
+    @staticmethod
+    def export_jpegs(pdf_path: Path, output_dir: Path, pages: List[int],
+                     password: str = None, name_template: str = 'page_{n}.{ext}') -> dict:
+        """
+        Copy the JPEG of every full-page scan among pages to output_dir
+
+        Returns:
+            Dictionary of page number to written file path
+        """
+        import pikepdf
+
+        exported = {}
+        with pikepdf.open(pdf_path, password=password or '') as pdf:
+            for page_number in pages:
+                page = pdf.pages[page_number - 1]
+                try:
+                    image = ScanPageDetector.passthrough_image(page)
+                except Exception:
+                    # Anything unexpected just means the page gets rendered
+                    image = None
+                if image is None:
+                    continue
+
+                # /Rotate is inheritable, so look it up through the page tree
+                node = page.obj
+                while node is not None and '/Rotate' not in node:
+                    node = node.get('/Parent')
+                rotation = int(node.Rotate) % 360 if node is not None else 0
+                output_path = output_dir / name_template.format(n=page_number, ext='jpg')
+                with open(output_path, 'wb') as output_file:
+                    output_file.write(ScanPageDetector.oriented_jpeg(image.read_raw_bytes(), rotation))
+                exported[page_number] = output_path
+
+        return exported
+
+
+DEFAULT_TILE_SIZE = 1024
+
+# Pages larger than this many pixels are rendered tile by tile
+DEFAULT_MAX_PAGE_PIXELS = 40_000_000
+
+
+class _PngStreamWriter:
+    """Write an 8-bit gray or RGB PNG one band of rows at a time"""
+
+    def __init__(self, output_file: BinaryIO, width: int, height: int, mode: str,
+                 compress_level: int = 6):
+        self.output_file = output_file
+        self.channels = 1 if mode == 'L' else 3
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = []
+        self.pending_size = 0
+
+        color_type = 0 if mode == 'L' else 2
+        output_file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+
+    def _chunk(self, chunk_type: bytes, data: bytes):
+        self.output_file.write(struct.pack('>I', len(data)))
+        self.output_file.write(chunk_type)
+        self.output_file.write(data)
+        self.output_file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def _emit(self, data: bytes):
+        if data:
+            self.pending.append(data)
+            self.pending_size += len(data)
+        if self.pending_size >= 256 * 1024:
+            self._chunk(b'IDAT', b''.join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def write_band(self, band: Image.Image):
+        data = band.tobytes()
+        stride = band.width * self.channels
+        for row in range(band.height):
+            # Filter type 0 (None) per scanline
+            self._emit(self.compressor.compress(b'\x00' + data[row * stride:(row + 1) * stride]))
+
+    def close(self):
+        self.pending.append(self.compressor.flush())
+        self._chunk(b'IDAT', b''.join(self.pending))
+        self._chunk(b'IEND', b'')
+
+
+class TiledRenderer:
+    """
+    Render one page as a grid of fixed-size tiles
+
+    Each tile is a pdftoppm crop window (-x/-y/-W/-H) on the page, so peak
+    memory is bounded by the tile size instead of the page area. Tiles of
+    one row are rendered concurrently and stitched into a full-width band,
+    which consumers can encode incrementally.
+    """
+
+    @staticmethod
+    def page_pixel_size(page, dpi: int) -> Tuple[int, int]:
+        """Rendered (width, height) of a pikepdf page at dpi, after /Rotate"""
+        llx, lly, urx, ury = (float(v) for v in page.mediabox)
+        width = math.ceil(abs(urx - llx) * dpi / 72)
+        height = math.ceil(abs(ury - lly) * dpi / 72)
+        if int(page.obj.get('/Rotate', 0)) % 180 == 90:
+            width, height = height, width
+        return width, height
+
+    @staticmethod
+    def oversized_pages(pdf_path: Path, pages: List[int], dpi: int,
+                        max_pixels: int = DEFAULT_MAX_PAGE_PIXELS,
+                        password: str = None) -> List[int]:
+        """Return the pages whose raster at dpi would exceed max_pixels"""
+        import pikepdf
+
+        oversized = []
+        with pikepdf.open(pdf_path, password=password or '') as pdf:
+            for page_number in pages:
+                width, height = TiledRenderer.page_pixel_size(pdf.pages[page_number - 1], dpi)
+                if width * height > max_pixels:
+                    oversized.append(page_number)
+        return oversized
+
+    @staticmethod
+    def render_tile(pdf_path: Path, page_number: int, dpi: int,
+                    x: int, y: int, width: int, height: int,
+                    grayscale: bool = False, password: str = None) -> Image.Image:
+        """Render the pixel window (x, y, width, height) of one page"""
+        command = [
+            'pdftoppm', '-r', str(dpi),
+            '-f', str(page_number), '-l', str(page_number),
+            '-x', str(x), '-y', str(y), '-W', str(width), '-H', str(height),
+        ]
+        if grayscale:
+            command.append('-gray')
+        if password:
+            command.extend(['-upw', password])
+        command.append(str(pdf_path))
+
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        if result.returncode != 0 or not result.stdout:
+            raise Exception(f"pdftoppm failed on page {page_number}: {result.stderr.decode(errors='replace').strip()}")
+
+        tile = Image.open(io.BytesIO(result.stdout))
+        tile.load()
+        return tile
+
+    @staticmethod
+    def iter_bands(pdf_path: Path, page_number: int, dpi: int, size: Tuple[int, int],
+                   tile_size: int = DEFAULT_TILE_SIZE, grayscale: bool = False,
+                   password: str = None, thread_count: int = None) -> Iterator[Tuple[int, Image.Image]]:
+        """Yield (y, band) full-width strips of tile_size rows, top to bottom"""
+        width, height = size
+        mode = 'L' if grayscale else 'RGB'
+        thread_count = max(1, thread_count or default_thread_count())
+
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            for y in range(0, height, tile_size):
+                band_height = min(tile_size, height - y)
+                xs = range(0, width, tile_size)
+                tiles = executor.map(
+                    lambda x: TiledRenderer.render_tile(
+                        pdf_path, page_number, dpi, x, y,
+                        min(tile_size, width - x), band_height, grayscale, password
+                    ),
+                    xs
+                )
+
+                band = Image.new(mode, (width, band_height), 'white')
+                for x, tile in zip(xs, tiles):
+                    band.paste(tile.convert(mode), (x, 0))
+                yield y, band
+
+    @staticmethod
+    def iter_tiles(pdf_path: Path, page_number: int, dpi: int,
+                   tile_size: int = DEFAULT_TILE_SIZE, grayscale: bool = False,
+                   password: str = None) -> Iterator[Tuple[int, int, Image.Image]]:
+        """Yield (x, y, tile) for one page in row-major order"""
+        import pikepdf
+
+        with pikepdf.open(pdf_path, password=password or '') as pdf:
+            width, height = TiledRenderer.page_pixel_size(pdf.pages[page_number - 1], dpi)
+
+        for y in range(0, height, tile_size):
+            for x in range(0, width, tile_size):
+                yield x, y, TiledRenderer.render_tile(
+                    pdf_path, page_number, dpi, x, y,
+                    min(tile_size, width - x), min(tile_size, height - y),
+                    grayscale, password
+                )
+
+    @staticmethod
+    def render_page_png(pdf_path: Path, page_number: int, output_path: Path,
+                        dpi: int = 200, tile_size: int = DEFAULT_TILE_SIZE,
+                        grayscale: bool = False, password: str = None,
+                        thread_count: int = None) -> Path:
+        """
+        Render one page to PNG without ever holding the full bitmap
+
+        Bands are compressed into the PNG stream as soon as they are
+        stitched, so memory is about one band (width x tile_size).
+        """
+        import pikepdf
+
+        with pikepdf.open(pdf_path, password=password or '') as pdf:
+            size = TiledRenderer.page_pixel_size(pdf.pages[page_number - 1], dpi)
+
+        with open(output_path, 'wb') as output_file:
+            writer = _PngStreamWriter(output_file, size[0], size[1], 'L' if grayscale else 'RGB')
+            for _, band in TiledRenderer.iter_bands(pdf_path, page_number, dpi, size,
+                                                    tile_size, grayscale, password, thread_count):
+                writer.write_band(band)
+            writer.close()
+
+        return output_path
@@ -0,0 +1,723 @@
+"""
+Text-search redaction
+- Glyphs are positioned by walking each page's content stream (and the
+  form XObjects it draws) with the text state, font widths and ToUnicode
+  maps
+- Page text is matched against all literal terms at once with an
+  Aho-Corasick automaton, plus compiled regexes for common identifiers
+- Matched glyphs are removed from the text-showing operators, the rest
+  of the text keeps its position, and the matched areas are painted over
+- Pages are processed in worker processes; pages without matches are
+  left untouched
+"""
+import math
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import pikepdf
+from pikepdf import Array, Dictionary, Name, Operator, String
+from reportlab.pdfbase.pdfmetrics import standardFonts, stringWidth
+
+from .glyphlist import GLYPH_LIST
+from .parallel import TASKS_PER_WORKER, default_process_count
+from .stamp import fmt
+from .text_layout import ASCENT, DESCENT, _multiply
+
+# Built-in patterns selectable by name
+PATTERNS = {
+    'ssn': r'\b\d{3}-\d{2}-\d{4}\b',
+    'iban': r'\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,4})?\b',
+    'email': r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b',
+    'phone': r'(?<![\w+])\+?\d{1,3}?[ .-]?\(?\d{3}\)?[ .-]?\d{3}[ .-]?\d{4}\b',
+}
+
+# Pages sent to a worker per task
+PAGES_PER_TASK = 8
+
+# Below this many pages a pool costs more than it saves
+MIN_PAGES_FOR_POOL = 16
+
+# Nesting limit for form XObjects
+MAX_FORM_DEPTH = 8
+
+# Gap between glyphs (as a share of the font size) read as a word space
+SPACE_GAP = 0.2
+
+# Extra margin around covered glyph boxes, in points
+BOX_PADDING = 0.5
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+BFCHAR_PATTERN = re.compile(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>')
+BFRANGE_PATTERN = re.compile(rb'<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])')
+CODESPACE_PATTERN = re.compile(rb'begincodespacerange\s*<([0-9A-Fa-f]+)>')
+WHITESPACE_RUN = re.compile(r'\s+')
+# Glyph names that encode Unicode values directly (AGL specification)
+UNI_NAME = re.compile(r'uni(?:[0-9A-F]{4})+')
+U_NAME = re.compile(r'u[0-9A-F]{4,6}')
+
+SIMPLE_ENCODINGS = {
+    '/WinAnsiEncoding': 'cp1252',
+    '/MacRomanEncoding': 'mac_roman',
+}
+
+
+class TermAutomaton:
+    """Aho-Corasick automaton finding every occurrence of many terms in one pass"""
+
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for term in terms:
+            if not term:
+                continue
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(len(term))
+
+        # Failure links in breadth-first order
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) of every term occurrence"""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length in self._out[state]:
+                yield index + 1 - length, index + 1
+
+
+class RedactionMatcher:
+    """Literal terms and regexes matched together against page text"""
+
+    def __init__(self, terms: Iterable[str] = (), patterns: Iterable[str] = (),
+                 regexes: Iterable[str] = (), case_sensitive: bool = False,
+                 whole_words: bool = True):
+        self.case_sensitive = case_sensitive
+        self.whole_words = whole_words
+        # Words of a term match across any run of whitespace, as in the page text
+        terms = [' '.join(term.split()) for term in terms if term and term.strip()]
+        self._automaton = TermAutomaton(terms if case_sensitive else [self._fold(t) for t in terms])
+
+        self._regexes = []
+        for name in patterns:
+            if name not in PATTERNS:
+                raise ValueError(f"Unknown pattern '{name}'")
+            self._regexes.append(re.compile(PATTERNS[name]))
+        for expression in regexes:
+            try:
+                self._regexes.append(re.compile(expression, 0 if case_sensitive else re.IGNORECASE))
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression '{expression}': {e}")
+
+        self.empty = not terms and not self._regexes
+
+    @staticmethod
+    def _fold(text: str) -> str:
+        # Lower-case one character at a time so offsets stay aligned
+        return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+    @staticmethod
+    def _squeeze(text: str) -> Tuple[str, List[int]]:
+        """Text with each whitespace run replaced by one space, and the offset in text of each character"""
+        pieces = []
+        offsets: List[int] = []
+        position = 0
+        for match in WHITESPACE_RUN.finditer(text):
+            pieces.append(text[position:match.start()])
+            pieces.append(' ')
+            offsets.extend(range(position, match.start() + 1))
+            position = match.end()
+        pieces.append(text[position:])
+        offsets.extend(range(position, len(text) + 1))
+        return ''.join(pieces), offsets
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Matched (start, end) character ranges in text"""
+        squeezed, offsets = self._squeeze(text)
+        folded = squeezed if self.case_sensitive else self._fold(squeezed)
+        spans = []
+        for start, end in self._automaton.find(folded):
+            if self.whole_words and ((start > 0 and folded[start - 1].isalnum()) or
+                                     (end < len(folded) and folded[end].isalnum())):
+                continue
+            spans.append((offsets[start], offsets[end - 1] + 1))
+        for regex in self._regexes:
+            spans.extend(match.span() for match in regex.finditer(text) if match.end() > match.start())
+        return spans
+
+
+def _unicode_value(value: int) -> str:
+    return chr(value) if value <= 0x10FFFF and not 0xD800 <= value <= 0xDFFF else ''
+
+
+def _glyph_unicode(name: str) -> str:
+    """
+    Unicode text for a glyph name, following the AGL specification
+
+    The suffix after the first period is dropped and ligature components
+    joined by underscores are decoded one by one: from the Adobe Glyph
+    List, as uniXXXX[XXXX...] or uXXXX[XX], or as a single character.
+    """
+    text = []
+    for component in name.lstrip('/').split('.', 1)[0].split('_'):
+        if component in GLYPH_LIST:
+            text.append(GLYPH_LIST[component])
+        elif UNI_NAME.fullmatch(component):
+            digits = component[3:]
+            text.extend(_unicode_value(int(digits[i:i + 4], 16)) for i in range(0, len(digits), 4))
+        elif U_NAME.fullmatch(component):
+            text.append(_unicode_value(int(component[1:], 16)))
+        elif len(component) == 1:
+            text.append(component)
+    return ''.join(text)
+
+
+class _Font:
+    """Code splitting, widths and Unicode text for one font"""
+
+    def __init__(self, font: Dictionary):
+        subtype = font.get('/Subtype')
+        self.composite = subtype == Name.Type0
+        self.scale = 0.001
+        if subtype == Name.Type3 and '/FontMatrix' in font:
+            self.scale = float(font.FontMatrix[0])
+
+        # Composite fonts use 2-byte codes unless their ToUnicode map says otherwise
+        self.code_length = 2 if self.composite else 1
+        self._unicode: Dict[int, str] = {}
+        if '/ToUnicode' in font:
+            self._read_to_unicode(font.ToUnicode.read_bytes())
+
+        self._widths: Dict[int, float] = {}
+        self._encoding: List[str] = []
+        base_font = str(font.get('/BaseFont', '')).lstrip('/').split('+')[-1]
+        if self.composite:
+            descendant = font.DescendantFonts[0]
+            self._default_width = float(descendant.get('/DW', 1000))
+            self._read_cid_widths(descendant.get('/W', []))
+        else:
+            self._read_simple_encoding(font.get('/Encoding'))
+            descriptor = font.get('/FontDescriptor', {})
+            self._default_width = float(descriptor.get('/MissingWidth', 0)) or 500.0
+            first = int(font.get('/FirstChar', 0))
+            for offset, width in enumerate(font.get('/Widths', [])):
+                self._widths[first + offset] = float(width)
+            if not self._widths and base_font in standardFonts:
+                for code, char in enumerate(self._encoding):
+                    try:
+                        self._widths[code] = stringWidth(char, base_font, 1000)
+                    except Exception:
+                        continue
+
+    def _read_to_unicode(self, data: bytes) -> None:
+        codespace = CODESPACE_PATTERN.search(data)
+        if codespace and self.composite:
+            self.code_length = max(1, len(codespace.group(1)) // 2)
+        for block in re.findall(rb'beginbfchar(.*?)endbfchar', data, re.S):
+            for source, target in BFCHAR_PATTERN.findall(block):
+                self._unicode[int(source, 16)] = bytes.fromhex(target.decode()).decode('utf-16-be', 'replace')
+        for block in re.findall(rb'beginbfrange(.*?)endbfrange', data, re.S):
+            for low, high, target in BFRANGE_PATTERN.findall(block):
+                low, high = int(low, 16), int(high, 16)
+                if target.startswith(b'['):
+                    values = re.findall(rb'<([0-9A-Fa-f]*)>', target)
+                    for code, value in zip(range(low, high + 1), values):
+                        self._unicode[code] = bytes.fromhex(value.decode()).decode('utf-16-be', 'replace')
+                else:
+                    raw = bytes.fromhex(target[1:-1].decode())
+                    start = int.from_bytes(raw, 'big') if raw else 0
+                    for offset in range(high - low + 1):
+                        value = (start + offset).to_bytes(max(len(raw), 2), 'big')
+                        self._unicode[low + offset] = value.decode('utf-16-be', 'replace')
+
+    def _read_cid_widths(self, widths) -> None:
+        items = list(widths)
+        index = 0
+        while index + 1 < len(items):
+            first = int(items[index])
+            if isinstance(items[index + 1], Array):
+                for offset, width in enumerate(items[index + 1]):
+                    self._widths[first + offset] = float(width)
+                index += 2
+            elif index + 2 < len(items):
+                for code in range(first, int(items[index + 1]) + 1):
+                    self._widths[code] = float(items[index + 2])
+                index += 3
+            else:
+                break
+
+    def _read_simple_encoding(self, encoding) -> None:
+        base = encoding.get('/BaseEncoding') if isinstance(encoding, Dictionary) else encoding
+        codec = SIMPLE_ENCODINGS.get(str(base) if base is not None else '', 'latin-1')
+        self._encoding = [bytes([code]).decode(codec, 'replace') for code in range(256)]
+        if isinstance(encoding, Dictionary) and '/Differences' in encoding:
+            code = 0
+            for item in encoding.Differences:
+                if isinstance(item, Name):
+                    self._encoding[code % 256] = _glyph_unicode(str(item))
+                    code += 1
+                else:
+                    code = int(item)
+
+    def codes(self, data: bytes) -> List[bytes]:
+        size = self.code_length
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def width(self, code: bytes) -> float:
+        """Advance width as a share of the font size"""
+        return self._widths.get(int.from_bytes(code, 'big'), self._default_width) * self.scale
+
+    def text(self, code: bytes) -> str:
+        value = int.from_bytes(code, 'big')
+        if value in self._unicode:
+            return self._unicode[value]
+        if not self.composite and self._encoding:
+            return self._encoding[value]
+        return ''
+
+
+class _Glyph(NamedTuple):
+    stream: Tuple[str, ...]
+    op_index: int
+    piece_index: int
+    text: str
+    bbox: Tuple[float, float, float, float]
+    origin: Tuple[float, float]
+    end: Tuple[float, float]
+    size: float
+
+
+class _TextState:
+    __slots__ = ('font', 'size', 'char_spacing', 'word_spacing', 'scale', 'leading', 'rise')
+
+    def __init__(self):
+        self.font: Optional[_Font] = None
+        self.size = 0.0
+        self.char_spacing = 0.0
+        self.word_spacing = 0.0
+        self.scale = 1.0
+        self.leading = 0.0
+        self.rise = 0.0
+
+    def copy(self) -> '_TextState':
+        state = _TextState()
+        for slot in self.__slots__:
+            setattr(state, slot, getattr(self, slot))
+        return state
+
+
+def _transform(m, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = m
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def page_resources(page: pikepdf.Page) -> Dictionary:
+    """Page /Resources, looked up through the page tree if inherited"""
+    node = page.obj
+    while node is not None and Name.Resources not in node:
+        node = node.get('/Parent')
+    return node.Resources if node is not None else Dictionary()
+
+
+class PageScanner:
+    """Positions every glyph drawn by a page, including inside form XObjects"""
+
+    def __init__(self):
+        self._fonts: Dict[Tuple[int, int], _Font] = {}
+        self.glyphs: List[_Glyph] = []
+        # Stream key -> parsed instructions; op index -> list of TJ pieces
+        self.streams: Dict[Tuple[str, ...], list] = {}
+        self.pieces: Dict[Tuple[Tuple[str, ...], int], list] = {}
+
+    def _font(self, resources: Dictionary, name) -> Optional[_Font]:
+        font = resources.get('/Font', {}).get(name)
+        if font is None:
+            return None
+        key = font.objgen if font.is_indirect else (id(font), -1)
+        if key not in self._fonts:
+            self._fonts[key] = _Font(font)
+        return self._fonts[key]
+
+    def scan(self, page: pikepdf.Page) -> None:
+        resources = page_resources(page)
+        self._walk((), pikepdf.parse_content_stream(page), resources, IDENTITY, set())
+
+    def _walk(self, key, instructions, resources, ctm, visiting) -> None:
+        self.streams[key] = instructions
+        stack = []
+        state = _TextState()
+        tm = tlm = IDENTITY
+
+        def show(op_index, items):
+            nonlocal tm
+            font = state.font
+            if font is None or state.size == 0:
+                return
+            pieces = []
+            for item in items:
+                if isinstance(item, String):
+                    for code in font.codes(bytes(item)):
+                        width = font.width(code)
+                        spacing = state.char_spacing
+                        if code == b' ' and not font.composite:
+                            spacing += state.word_spacing
+                        advance = (width * state.size + spacing) * state.scale
+
+                        trm = _multiply((state.size * state.scale, 0, 0, state.size, 0, state.rise),
+                                        _multiply(tm, ctm))
+                        corners = [_transform(trm, x, y) for x in (0, width or 0.5)
+                                   for y in (-DESCENT, ASCENT)]
+                        xs, ys = [c[0] for c in corners], [c[1] for c in corners]
+                        end = _transform(_multiply((1, 0, 0, 1, advance, 0), _multiply(tm, ctm)), 0, state.rise)
+                        self.glyphs.append(_Glyph(
+                            key, op_index, len(pieces), font.text(code),
+                            (min(xs), min(ys), max(xs), max(ys)),
+                            _transform(trm, 0, 0), end,
+                            math.hypot(trm[2], trm[3]),
+                        ))
+                        # TJ adjustment that replaces the glyph if it is removed
+                        pieces.append([code, -advance * 1000 / (state.size * state.scale)])
+                        tm = _multiply((1, 0, 0, 1, advance, 0), tm)
+                else:
+                    value = float(item)
+                    pieces.append(value)
+                    tm = _multiply((1, 0, 0, 1, -value / 1000 * state.size * state.scale, 0), tm)
+            self.pieces[(key, op_index)] = pieces
+
+        def next_line(tx, ty):
+            nonlocal tm, tlm
+            tlm = _multiply((1, 0, 0, 1, tx, ty), tlm)
+            tm = tlm
+
+        for op_index, instruction in enumerate(instructions):
+            operator = str(instruction.operator)
+            operands = instruction.operands
+            try:
+                if operator == 'q':
+                    stack.append((ctm, state.copy()))
+                elif operator == 'Q':
+                    if stack:
+                        ctm, state = stack.pop()
+                elif operator == 'cm':
+                    ctm = _multiply(tuple(float(v) for v in operands), ctm)
+                elif operator == 'BT':
+                    tm = tlm = IDENTITY
+                elif operator == 'Tf':
+                    state.font = self._font(resources, operands[0])
+                    state.size = float(operands[1])
+                elif operator == 'Tc':
+                    state.char_spacing = float(operands[0])
+                elif operator == 'Tw':
+                    state.word_spacing = float(operands[0])
+                elif operator == 'Tz':
+                    state.scale = float(operands[0]) / 100
+                elif operator == 'TL':
+                    state.leading = float(operands[0])
+                elif operator == 'Ts':
+                    state.rise = float(operands[0])
+                elif operator == 'Td':
+                    next_line(float(operands[0]), float(operands[1]))
+                elif operator == 'TD':
+                    state.leading = -float(operands[1])
+                    next_line(float(operands[0]), float(operands[1]))
+                elif operator == 'Tm':
+                    tm = tlm = tuple(float(v) for v in operands)
+                elif operator == 'T*':
+                    next_line(0, -state.leading)
+                elif operator == 'Tj':
+                    show(op_index, [operands[0]])
+                elif operator == 'TJ':
+                    show(op_index, list(operands[0]))
+                elif operator == "'":
+                    next_line(0, -state.leading)
+                    show(op_index, [operands[0]])
+                elif operator == '"':
+                    state.word_spacing = float(operands[0])
+                    state.char_spacing = float(operands[1])
+                    next_line(0, -state.leading)
+                    show(op_index, [operands[2]])
+                elif operator == 'Do':
+                    self._walk_form(key, operands[0], resources, ctm, visiting)
+            except (IndexError, TypeError, ValueError):
+                # Malformed operands: skip the operator like a viewer would
+                continue
+
+    def _walk_form(self, key, name, resources, ctm, visiting) -> None:
+        form = resources.get('/XObject', {}).get(name)
+        if form is None or form.get('/Subtype') != Name.Form:
+            return
+        if len(key) >= MAX_FORM_DEPTH or form.objgen in visiting:
+            return
+        matrix = tuple(float(v) for v in form.get('/Matrix', IDENTITY))
+        visiting.add(form.objgen)
+        self._walk(key + (str(name),), pikepdf.parse_content_stream(form),
+                   form.get('/Resources', resources), _multiply(matrix, ctm), visiting)
+        visiting.discard(form.objgen)
+
+    def text(self) -> Tuple[str, List[int]]:
+        """
+        Page text in drawing order, with the glyph index of each character
+
+        A space or line break (glyph index -1) is inserted where the next
+        glyph does not continue from where the previous one ended.
+        """
+        chars: List[str] = []
+        owners: List[int] = []
+        previous = None
+        for index, glyph in enumerate(self.glyphs):
+            if previous is not None and chars and not chars[-1].isspace() \
+                    and not glyph.text[:1].isspace():
+                dx = glyph.origin[0] - previous.end[0]
+                dy = glyph.origin[1] - previous.end[1]
+                size = max(previous.size, 0.1)
+                if math.hypot(dx, dy) > SPACE_GAP * size:
+                    # Offset across the previous glyph's baseline direction
+                    direction = (previous.end[0] - previous.origin[0], previous.end[1] - previous.origin[1])
+                    length = math.hypot(*direction) or 1
+                    across = abs(dx * -direction[1] + dy * direction[0]) / length
+                    chars.append('\n' if across > size / 2 else ' ')
+                    owners.append(-1)
+            for char in glyph.text:
+                chars.append(char)
+                owners.append(index)
+            previous = glyph
+        return ''.join(chars), owners
+
+
+def _rewrite_show(instruction, pieces: list, removed: set) -> list:
+    """Replacement instructions for a text-showing operator with glyphs removed"""
+    items = []
+    run = b''
+    for index, piece in enumerate(pieces):
+        if isinstance(piece, list):
+            code, adjustment = piece
+            if index in removed:
+                if run:
+                    items.append(String(run))
+                    run = b''
+                items.append(adjustment)
+            else:
+                run += code
+        else:
+            if run:
+                items.append(String(run))
+                run = b''
+            items.append(piece)
+    if run:
+        items.append(String(run))
+
+    operator = str(instruction.operator)
+    result = []
+    if operator == '"':
+        operands = instruction.operands
+        result.append(pikepdf.ContentStreamInstruction([operands[0]], Operator('Tw')))
+        result.append(pikepdf.ContentStreamInstruction([operands[1]], Operator('Tc')))
+    if operator in ("'", '"'):
+        result.append(pikepdf.ContentStreamInstruction([], Operator('T*')))
+    result.append(pikepdf.ContentStreamInstruction([Array(items)], Operator('TJ')))
+    return result
+
+
+def redact_page(page: pikepdf.Page, matcher: RedactionMatcher) -> Optional[dict]:
+    """
+    Find and remove matched text on one page
+
+    Returns:
+        None when nothing matched, otherwise a dictionary with content
+        (new page content), forms ({form name path: new content}), boxes
+        (covered areas in user space) and matches (number of matches)
+    """
+    scanner = PageScanner()
+    scanner.scan(page)
+    if not scanner.glyphs:
+        return None
+    text, owners = scanner.text()
+    spans = matcher.spans(text)
+    if not spans:
+        return None
+
+    removed: Dict[Tuple[Tuple[str, ...], int], set] = {}
+    boxes = []
+    for start, end in spans:
+        box = None
+        for position in range(start, end):
+            owner = owners[position]
+            if owner < 0:
+                if text[position] == '\n' and box is not None:
+                    boxes.append(box)
+                    box = None
+                continue
+            glyph = scanner.glyphs[owner]
+            removed.setdefault((glyph.stream, glyph.op_index), set()).add(glyph.piece_index)
+            x0, y0, x1, y1 = glyph.bbox
+            box = (x0, y0, x1, y1) if box is None else \
+                (min(box[0], x0), min(box[1], y0), max(box[2], x1), max(box[3], y1))
+        if box is not None:
+            boxes.append(box)
+
+    contents = {}
+    for stream_key, instructions in scanner.streams.items():
+        changes = {op_index: indexes for (key, op_index), indexes in removed.items() if key == stream_key}
+        if not changes:
+            continue
+        rewritten = []
+        for op_index, instruction in enumerate(instructions):
+            if op_index in changes:
+                rewritten.extend(_rewrite_show(instruction, scanner.pieces[(stream_key, op_index)],
+                                               changes[op_index]))
+            else:
+                rewritten.append(instruction)
+        contents[stream_key] = rewritten
+
+    page_instructions = contents.pop((), scanner.streams[()])
+    covers = ' '.join(f'{fmt(x0 - BOX_PADDING)} {fmt(y0 - BOX_PADDING)} '
+                      f'{fmt(x1 - x0 + 2 * BOX_PADDING)} {fmt(y1 - y0 + 2 * BOX_PADDING)} re'
+                      for x0, y0, x1, y1 in boxes)
+    content = (b'q\n' + pikepdf.unparse_content_stream(page_instructions) +
+               f'\nQ\nq 0 g {covers} f Q\n'.encode('latin-1'))
+
+    return {
+        'content': content,
+        'forms': {key: pikepdf.unparse_content_stream(instructions)
+                  for key, instructions in contents.items()},
+        'boxes': boxes,
+        'matches': len(spans),
+    }
+
+
+def _copy_resources(owner: Dictionary, inherited: Dictionary) -> Dictionary:
+    """Give an object its own /Resources and /XObject dictionaries"""
+    resources = Dictionary({key: value for key, value in owner.get('/Resources', inherited).items()})
+    if '/XObject' in resources:
+        resources.XObject = Dictionary({key: value for key, value in resources.XObject.items()})
+    owner.Resources = resources
+    return resources
+
+
+def apply_page_result(pdf: pikepdf.Pdf, page: pikepdf.Page, result: dict) -> None:
+    """
+    Put a redacted page's new content into the document
+
+    Changed form XObjects are replaced by page-local copies (as are the
+    forms leading to them), since other pages may draw the originals.
+    """
+    copies: Dict[Tuple[str, ...], pikepdf.Object] = {}
+    for path in sorted(result['forms'], key=len):
+        owner = page.obj
+        inherited = page_resources(page)
+        for depth in range(1, len(path) + 1):
+            prefix = path[:depth]
+            if prefix not in copies:
+                resources = _copy_resources(owner, inherited)
+                original = resources.XObject[Name(path[depth - 1])]
+                keys = {key: value for key, value in original.stream_dict.items()
+                        if key not in ('/Length', '/Filter', '/DecodeParms')}
+                data = result['forms'].get(prefix)
+                if data is None:
+                    data = original.read_bytes()
+                copy = pdf.make_stream(data)
+                for key, value in keys.items():
+                    copy[key] = value
+                resources.XObject[Name(path[depth - 1])] = copy
+                copies[prefix] = copy
+            owner = copies[prefix]
+            # Forms without /Resources use those of the content drawing them
+            inherited = owner.Resources if '/Resources' in owner else inherited
+
+    page.obj.Contents = pdf.make_stream(result['content'])
+
+
+_pdf: Optional[pikepdf.Pdf] = None
+_matcher: Optional[RedactionMatcher] = None
+
+
+def _init_worker(pdf_path: str, password: Optional[str], matcher_args: dict) -> None:
+    global _pdf, _matcher
+    _pdf = pikepdf.open(pdf_path, password=password or '')
+    _matcher = RedactionMatcher(**matcher_args)
+
+
+def _redact_batch(page_indexes: List[int]) -> List[Optional[dict]]:
+    return [redact_page(_pdf.pages[index], _matcher) for index in page_indexes]
+
+
+def redact_file(pdf_path: Path, output_path: Path, matcher_args: dict,
+                processes: int = None, password: str = None) -> dict:
+    """
+    Redact a PDF and save the result
+
+    Pages are matched and rewritten in worker processes, each holding
+    the document and the compiled matcher; the parent only replaces the
+    content of pages that had matches.
+
+    Returns:
+        Dictionary with matches (total) and pages (pages changed)
+    """
+    matcher = RedactionMatcher(**matcher_args)
+    if matcher.empty:
+        raise ValueError("Enter at least one search term or pattern")
+
+    report = {'matches': 0, 'pages': 0}
+    with pikepdf.open(pdf_path, password=password or '') as pdf:
+        page_count = len(pdf.pages)
+        processes = processes or default_process_count()
+
+        if processes <= 1 or page_count < MIN_PAGES_FOR_POOL:
+            results = (redact_page(page, matcher) for page in pdf.pages)
+        else:
+            results = _results_in_pool(pdf_path, password, matcher_args, page_count, processes)
+
+        for index, result in enumerate(results):
+            if result is None:
+                continue
+            apply_page_result(pdf, pdf.pages[index], result)
+            report['matches'] += result['matches']
+            report['pages'] += 1
+
+        pdf.save(output_path, stream_decode_level=pikepdf.StreamDecodeLevel.none)
+    return report
+
+
+def _results_in_pool(pdf_path: Path, password: Optional[str], matcher_args: dict,
+                     page_count: int, processes: int) -> Iterator[Optional[dict]]:
+    indexes = iter(range(page_count))
+    batches = iter(lambda: list(islice(indexes, PAGES_PER_TASK)), [])
+    window = processes * TASKS_PER_WORKER
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(str(pdf_path), password, matcher_args)) as executor:
+        pending = deque(executor.submit(_redact_batch, batch) for batch in islice(batches, window))
+        while pending:
+            results = pending.popleft().result()
+            for batch in batches:
+                pending.append(executor.submit(_redact_batch, batch))
+                break
+            yield from results
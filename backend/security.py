@@ -1,19 +1,16 @@
 """
 PDF Security Tools
-- Unlock PDF
-- Protect PDF
-- Sign PDF
-- Redact PDF
-- Compare PDF
+- Unlock PDF (single files or batches)
+- Protect PDF (AES-128/256, single files or batches)
+- Sign PDF (PKCS#7, single files or batches)
+- Redact PDF (text search, patterns and regexes)
+- Compare PDF (page hash prefilter, line and word diffs)
+- Find near-duplicate PDFs (MinHash/LSH index over a corpus)
+- Preflight inspection (trailer and xref only)
 """
 from pathlib import Path
-from typing import BinaryIO
-from PyPDF2 import PdfReader, PdfWriter
+from typing import BinaryIO, List, Tuple
 import pikepdf
-from reportlab.pdfgen import canvas
-from reportlab.lib.colors import black
-import io
-import hashlib
 
 class PDFSecurity:
     
@@ -48,7 +45,8 @@ class PDFSecurity:
                    allow_printing: bool = True,
                    allow_commenting: bool = False,
                    allow_copying: bool = False,
-                   allow_forms: bool = True) -> Path:
+                   allow_forms: bool = True,
+                   strength: int = 256) -> Path:
         """
         Add password protection and permissions to PDF
         
@@ -61,29 +59,21 @@ class PDFSecurity:
             allow_commenting: Allow commenting/annotations
             allow_copying: Allow copying text
             allow_forms: Allow filling forms
+            strength: AES key length, 128 or 256
             
         Returns:
             Path to protected PDF
         """
         try:
+            from .protection import encryption
+            
             # Use pikepdf for better encryption
             pdf = pikepdf.open(pdf_file)
             
-            # Set up encryption
-            encryption = pikepdf.Encryption(
-                user=user_password or "",
-                owner=owner_password or "",
-                allow=pikepdf.Permissions(
-                    print_highres=allow_printing,
-                    print_lowres=allow_printing,
-                    modify_annotation=allow_commenting,
-                    extract=allow_copying,
-                    modify_form=allow_forms,
-                    accessibility=True
-                )
-            )
-            
-            pdf.save(output_path, encryption=encryption)
+            pdf.save(output_path, encryption=encryption(
+                user_password, owner_password, strength,
+                allow_printing, allow_commenting, allow_copying, allow_forms
+            ))
             pdf.close()
             
             return output_path
@@ -91,150 +81,292 @@ class PDFSecurity:
         except Exception as e:
             raise Exception(f"Error protecting PDF: {str(e)}")
     
+    @staticmethod
+    def unlock_pdfs(pdf_paths: List[Path], output_path: Path, password: str = None,
+                    password_map_file: BinaryIO = None, processes: int = None,
+                    names: List[str] = None) -> Tuple[Path, List[dict]]:
+        """
+        Remove password protection from a batch of PDFs
+        
+        Files are decrypted in parallel and streamed into one ZIP archive
+        as they finish. A file that fails (wrong password, damaged file)
+        is reported and does not stop the batch.
+        
+        Args:
+            pdf_paths: Paths of the PDFs to unlock
+            output_path: Path of the ZIP archive to create
+            password: Password for files not in the password map
+            password_map_file: CSV file object mapping file names to passwords
+            processes: Worker processes (default: CPU count)
+            names: File names used for password lookups and outputs
+                (default: input file names)
+            
+        Returns:
+            Tuple of (archive path, status per file with file, output,
+            status and error); the archive also holds the report as CSV
+        """
+        try:
+            from .protection import read_password_map, unlock_files
+            
+            password_map = read_password_map(password_map_file) if password_map_file else {}
+            report = unlock_files(pdf_paths, output_path, password_map, password or '',
+                                  names, processes)
+            return output_path, report
+            
+        except Exception as e:
+            raise Exception(f"Error unlocking PDFs: {str(e)}")
+    
+    @staticmethod
+    def protect_pdfs(pdf_paths: List[Path], output_path: Path,
+                     user_password: str = None, owner_password: str = None,
+                     password_map_file: BinaryIO = None,
+                     allow_printing: bool = True, allow_commenting: bool = False,
+                     allow_copying: bool = False, allow_forms: bool = True,
+                     strength: int = 256, processes: int = None,
+                     names: List[str] = None) -> Tuple[Path, List[dict]]:
+        """
+        Add password protection to a batch of PDFs
+        
+        Each file gets the passwords from its row in the password map, or
+        the shared passwords when it has none. Files are encrypted in
+        parallel and streamed into one ZIP archive as they finish.
+        
+        Args:
+            pdf_paths: Paths of the PDFs to protect
+            output_path: Path of the ZIP archive to create
+            user_password: Shared password to open the PDFs
+            owner_password: Shared password to change permissions
+            password_map_file: CSV file object with file, password and
+                optional owner_password columns
+            allow_printing: Allow printing
+            allow_commenting: Allow commenting/annotations
+            allow_copying: Allow copying text
+            allow_forms: Allow filling forms
+            strength: AES key length, 128 or 256
+            processes: Worker processes (default: CPU count)
+            names: File names used for password lookups and outputs
+                (default: input file names)
+            
+        Returns:
+            Tuple of (archive path, status per file with file, output,
+            status and error); the archive also holds the report as CSV
+        """
+        try:
+            from .protection import protect_files, read_password_map
+            
+            password_map = read_password_map(password_map_file) if password_map_file else {}
+            report = protect_files(pdf_paths, output_path, password_map,
+                                   (user_password or '', owner_password or ''), names, processes,
+                                   strength=strength, allow_printing=allow_printing,
+                                   allow_commenting=allow_commenting, allow_copying=allow_copying,
+                                   allow_forms=allow_forms)
+            return output_path, report
+            
+        except Exception as e:
+            raise Exception(f"Error protecting PDFs: {str(e)}")
+    
     @staticmethod
     def add_digital_signature(pdf_file: BinaryIO, output_path: Path,
-                             signature_text: str = "Digitally Signed") -> Path:
+                             signature_text: str = "Digitally Signed",
+                             certificate_file: BinaryIO = None,
+                             certificate_password: str = None,
+                             reason: str = "", location: str = "",
+                             visible: bool = True) -> Path:
         """
-        Add digital signature placeholder to PDF
+        Digitally sign a PDF with a PKCS#12 certificate
         
-        Note: Full digital signature requires certificate infrastructure.
-        This is a simplified version that adds signature text.
+        The signature (PKCS#7 detached) is appended as an incremental
+        update, so the original bytes and any earlier signatures stay
+        valid. A visible signature box is placed on the first page.
         
         Args:
             pdf_file: PDF file object
             output_path: Path to save signed PDF
-            signature_text: Signature text to add
+            signature_text: Text shown in the signature box
+            certificate_file: PKCS#12 (.p12/.pfx) file object with the
+                private key and certificate
+            certificate_password: Password of the PKCS#12 file
+            reason: Reason for signing
+            location: Location of signing
+            visible: Show a signature box on the first page
             
         Returns:
             Path to signed PDF
         """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
-            
-            for page_num, page in enumerate(reader.pages):
-                # Add signature to first page only
-                if page_num == 0:
-                    # Create signature overlay
-                    packet = io.BytesIO()
-                    can = canvas.Canvas(packet)
-                    
-                    # Draw signature box
-                    can.setStrokeColor(black)
-                    can.rect(400, 50, 150, 50)
-                    can.setFont("Helvetica", 10)
-                    can.drawString(410, 75, signature_text)
-                    can.drawString(410, 60, f"Document Hash:")
-                    
-                    # Calculate simple hash
-                    pdf_file.seek(0)
-                    file_hash = hashlib.sha256(pdf_file.read()).hexdigest()[:16]
-                    can.setFont("Courier", 8)
-                    can.drawString(410, 45, file_hash)
-                    
-                    can.save()
-                    
-                    # Merge with page
-                    packet.seek(0)
-                    signature_reader = PdfReader(packet)
-                    page.merge_page(signature_reader.pages[0])
-                
-                writer.add_page(page)
-            
-            # Save
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
+            from .inputs import pdf_path_for
+            from .signing import Signer
             
-            return output_path
+            if certificate_file is None:
+                raise ValueError("A PKCS#12 certificate file is required")
+            
+            signer = Signer(certificate_file.read(), certificate_password)
+            with pdf_path_for(pdf_file) as pdf_path:
+                return signer.sign_file(pdf_path, output_path, signature_text,
+                                        reason, location, visible)
+            
+        except Exception as e:
+            raise Exception(f"Error adding signature: {str(e)}")
+    
+    @staticmethod
+    def sign_pdfs(pdf_paths: List[Path], output_dir: Path,
+                  certificate_file: BinaryIO, certificate_password: str = None,
+                  signature_text: str = "Digitally Signed",
+                  reason: str = "", location: str = "",
+                  processes: int = None, names: List[str] = None) -> List[Path]:
+        """
+        Digitally sign a batch of PDFs with one certificate
+        
+        The PKCS#12 file is decrypted once per worker process, so each
+        further document only costs hashing its bytes and one signing
+        operation.
+        
+        Args:
+            pdf_paths: Paths of the PDFs to sign
+            output_dir: Directory to save signed PDFs
+            certificate_file: PKCS#12 (.p12/.pfx) file object
+            certificate_password: Password of the PKCS#12 file
+            signature_text: Text shown in the signature box
+            reason: Reason for signing
+            location: Location of signing
+            processes: Worker processes (default: CPU count)
+            names: Base names for the outputs (default: input file names)
+            
+        Returns:
+            Paths of the signed PDFs, in input order
+        """
+        try:
+            from .signing import sign_files
+            
+            output_dir.mkdir(parents=True, exist_ok=True)
+            names = names or [Path(path).name for path in pdf_paths]
+            jobs = [(Path(path), output_dir / f"{Path(name).stem}_signed.pdf")
+                    for path, name in zip(pdf_paths, names)]
+            
+            return sign_files(certificate_file.read(), certificate_password, jobs, processes,
+                              signature_text=signature_text, reason=reason, location=location)
             
         except Exception as e:
             raise Exception(f"Error adding signature: {str(e)}")
     
     @staticmethod
     def redact_pdf(pdf_file: BinaryIO, output_path: Path,
-                  redaction_text: str = "REDACTED") -> Path:
+                  terms: List[str] = None, patterns: List[str] = None,
+                  regexes: List[str] = None, case_sensitive: bool = False,
+                  whole_words: bool = True, processes: int = None,
+                  password: str = None) -> Path:
         """
         Redact sensitive information from PDF
         
-        Note: This is a basic implementation that adds redaction marks.
-        For production, you'd need text search and replacement.
-        
         Args:
             pdf_file: PDF file object
             output_path: Path to save redacted PDF
-            redaction_text: Text to search and redact
+            terms: Literal words or phrases to redact
+            patterns: Built-in patterns to redact ('ssn', 'iban', 'email', 'phone')
+            regexes: Additional regular expressions to redact
+            case_sensitive: Match terms and regexes case-sensitively
+            whole_words: Only match terms as whole words
+            processes: Worker processes (default: CPU count)
+            password: Password for encrypted PDFs
             
         Returns:
             Path to redacted PDF
         """
+        return PDFSecurity.redact_pdf_with_report(pdf_file, output_path, terms, patterns, regexes,
+                                                  case_sensitive, whole_words, processes, password)[0]
+    
+    @staticmethod
+    def redact_pdf_with_report(pdf_file: BinaryIO, output_path: Path,
+                               terms: List[str] = None, patterns: List[str] = None,
+                               regexes: List[str] = None, case_sensitive: bool = False,
+                               whole_words: bool = True, processes: int = None,
+                               password: str = None) -> Tuple[Path, dict]:
+        """
+        Redact sensitive information and report what was found
+        
+        All terms are matched in one pass per page (Aho-Corasick) together
+        with the regexes. Matched glyphs are removed from the content
+        streams, including inside form XObjects, so the text cannot be
+        copied or extracted, and the areas are covered with black boxes.
+        Images under a box are covered but not altered. Pages are
+        processed in parallel.
+        
+        Args:
+            See redact_pdf
+            
+        Returns:
+            Tuple of (path to redacted PDF, report) where the report has
+            matches (total matches) and pages (pages changed)
+        """
         try:
-            reader = PdfReader(pdf_file)
-            writer = PdfWriter()
-            
-            for page in reader.pages:
-                # In a full implementation, you would:
-                # 1. Search for sensitive text
-                # 2. Get text coordinates
-                # 3. Draw black rectangles over sensitive areas
-                # 4. Remove text layer underneath
-                
-                # For now, we'll just copy pages
-                # Real redaction requires more sophisticated text analysis
-                writer.add_page(page)
-            
-            # Save
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
+            from .inputs import pdf_path_for
+            from .redact import redact_file
             
-            return output_path
+            matcher_args = {
+                'terms': list(terms or []),
+                'patterns': list(patterns or []),
+                'regexes': list(regexes or []),
+                'case_sensitive': case_sensitive,
+                'whole_words': whole_words,
+            }
+            with pdf_path_for(pdf_file) as pdf_path:
+                report = redact_file(pdf_path, output_path, matcher_args, processes, password)
+            
+            return output_path, report
             
         except Exception as e:
             raise Exception(f"Error redacting PDF: {str(e)}")
     
     @staticmethod
-    def compare_pdfs(pdf_file1: BinaryIO, pdf_file2: BinaryIO) -> dict:
+    def compare_pdfs(pdf_file1: BinaryIO, pdf_file2: BinaryIO, processes: int = None,
+                     visual: bool = False, output_dir: Path = None, dpi: int = 50,
+                     name_prefix: str = 'compare') -> dict:
         """
         Compare two PDFs and return differences
         
+        Pages are matched by a hash of their content streams, resources
+        and page boxes, so unchanged pages (also after pages were inserted
+        or removed) are skipped without extracting text. Only the changed
+        pages are extracted, in parallel, and diffed line by line and word
+        by word.
+        
+        The visual mode also renders each changed page pair at a low DPI
+        and diffs the pixels, catching layout, image and colour changes
+        that the text diff misses. A heatmap is written per changed pair.
+        
         Args:
             pdf_file1: First PDF file object
             pdf_file2: Second PDF file object
+            processes: Worker processes for text extraction (default: CPU count)
+            visual: Add the rendered pixel diff
+            output_dir: Directory for the heatmap images (visual mode)
+            dpi: Render resolution for the visual diff
+            name_prefix: Start of the heatmap file names
             
         Returns:
-            Dictionary with comparison results
+            Dictionary with comparison results: identical, page counts,
+            metadata_match, identical_pages, page_changes, hunks (text
+            changes with page coordinates) and differences; in visual mode
+            modified pages carry changed_fraction and regions, and heatmaps
+            lists the image paths
         """
         try:
-            reader1 = PdfReader(pdf_file1)
-            reader2 = PdfReader(pdf_file2)
-            
-            comparison = {
-                'identical': False,
-                'page_count_match': len(reader1.pages) == len(reader2.pages),
-                'page_count_1': len(reader1.pages),
-                'page_count_2': len(reader2.pages),
-                'metadata_match': reader1.metadata == reader2.metadata,
-                'differences': []
-            }
+            from .compare import compare_files
+            from .inputs import open_reader, pdf_path_for
             
-            # Compare page count
-            if not comparison['page_count_match']:
-                comparison['differences'].append(
-                    f"Page count differs: {comparison['page_count_1']} vs {comparison['page_count_2']}"
-                )
+            if visual and output_dir is None:
+                raise ValueError("An output directory is needed for the visual diff")
             
-            # Compare text content of each page
-            min_pages = min(len(reader1.pages), len(reader2.pages))
-            for page_num in range(min_pages):
-                text1 = reader1.pages[page_num].extract_text()
-                text2 = reader2.pages[page_num].extract_text()
-                
-                if text1 != text2:
-                    comparison['differences'].append(
-                        f"Page {page_num + 1}: Text content differs"
-                    )
+            with pdf_path_for(pdf_file1) as path1, pdf_path_for(pdf_file2) as path2:
+                comparison = compare_files(path1, path2, processes, visual=visual,
+                                           output_dir=output_dir, dpi=dpi, name_prefix=name_prefix)
+                with open_reader(path1) as reader1, open_reader(path2) as reader2:
+                    comparison['metadata_match'] = reader1.metadata == reader2.metadata
             
-            # Check if identical
-            comparison['identical'] = len(comparison['differences']) == 0
+            if not comparison['page_count_match']:
+                comparison['differences'].insert(
+                    0, f"Page count differs: {comparison['page_count_1']} vs {comparison['page_count_2']}"
+                )
             
             return comparison
             
@@ -242,43 +374,93 @@ class PDFSecurity:
             raise Exception(f"Error comparing PDFs: {str(e)}")
     
     @staticmethod
-    def check_pdf_security(pdf_file: BinaryIO) -> dict:
+    def find_duplicates(pdf_paths: List[Path], index_path: Path, threshold: float = 0.8,
+                        processes: int = None, names: List[str] = None,
+                        report_path: Path = None) -> dict:
         """
-        Check PDF security settings
+        Find near-duplicate documents across a corpus
+        
+        Each PDF is reduced to a MinHash signature of its text (and
+        perceptual hashes of image-only pages) in worker processes. The
+        signatures are kept in an on-disk LSH index, so repeated runs only
+        process new files and candidate duplicates come from shared
+        buckets rather than pairwise comparison of the whole corpus.
         
         Args:
-            pdf_file: PDF file object
+            pdf_paths: Paths of the PDFs to index
+            index_path: SQLite index file (created if missing, reused otherwise)
+            threshold: Minimum similarity (0-1) for documents to be grouped
+            processes: Worker processes (default: CPU count)
+            names: Names recorded for the documents (default: their paths)
+            report_path: Optional CSV file listing the groups
             
         Returns:
-            Dictionary with security information
+            Dictionary with indexed, skipped (already in the index), failed
+            and clusters (groups of near-duplicates that include at least
+            one of the given PDFs)
         """
         try:
-            pdf = pikepdf.open(pdf_file)
-            
-            security_info = {
-                'is_encrypted': pdf.is_encrypted,
-                'encryption_method': None,
-                'permissions': {}
-            }
+            from .dedupe import find_duplicates
             
-            if pdf.is_encrypted:
-                # Get permissions
-                try:
-                    security_info['permissions'] = {
-                        'can_print': True,  # Default assumptions
-                        'can_modify': True,
-                        'can_copy': True,
-                        'can_annotate': True,
-                    }
-                except:
-                    pass
+            return find_duplicates(pdf_paths, index_path, threshold, processes, names,
+                                   report_path=report_path)
             
-            pdf.close()
+        except Exception as e:
+            raise Exception(f"Error finding duplicates: {str(e)}")
+    
+    @staticmethod
+    def preflight_pdf(pdf_file: BinaryIO) -> dict:
+        """
+        Inspect a PDF before processing it
+        
+        Only the header, trailer, cross-reference sections and a few
+        objects (catalog, page tree root, encryption dictionary) are read,
+        so this takes milliseconds even on multi-GB files.
+        
+        Args:
+            pdf_file: PDF file object (rewound afterwards)
             
-            return security_info
+        Returns:
+            Dictionary with valid, error, file_size, version, page_count,
+            encrypted, encryption, needs_password, permissions, linearized,
+            linearization_valid, xref, incremental_updates,
+            estimated_page_bytes and elapsed_ms
+        """
+        from .preflight import inspect_pdf
+        
+        try:
+            return inspect_pdf(pdf_file)
+        finally:
+            pdf_file.seek(0)
+    
+    @staticmethod
+    def check_pdf_security(pdf_file: BinaryIO) -> dict:
+        """
+        Check PDF security settings
+        
+        Args:
+            pdf_file: PDF file object
             
-        except Exception as e:
+        Returns:
+            Dictionary with security information
+        """
+        report = PDFSecurity.preflight_pdf(pdf_file)
+        if not report['valid'] or report['structure'] == 'unknown':
             return {
                 'is_encrypted': False,
-                'error': str(e)
+                'error': report['error']
             }
+        
+        encryption = report['encryption'] or {}
+        permissions = report['permissions']
+        return {
+            'is_encrypted': report['encrypted'],
+            'encryption_method': encryption.get('method'),
+            'needs_password': report['needs_password'],
+            'permissions': {
+                'can_print': permissions['print'],
+                'can_modify': permissions['modify'],
+                'can_copy': permissions['copy'],
+                'can_annotate': permissions['annotate'],
+            } if permissions else {}
+        }
@@ -0,0 +1,346 @@
+"""
+PDF digital signatures (PKCS#7 / CMS, adbe.pkcs7.detached)
+- The key and certificate chain are loaded from a PKCS#12 file once per
+  Signer and reused for every document in a batch
+- The signature field, its appearance and the signature dictionary are
+  appended to the original file as an incremental update
+- The signed byte ranges are hashed by streaming the output file in
+  chunks, so documents are never read into memory as a whole
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from pikepdf import Array, Dictionary, Name, String
+
+from .incremental import IncrementalUpdate
+from .parallel import default_process_count
+from .stamp import fmt, pdf_string
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes reserved in /Contents beyond the certificates, for the signed
+# attributes, the signature value and the CMS structure
+SIGNATURE_OVERHEAD = 4096
+
+# Visible signature box on the first page: x, y, width, height in points
+SIGNATURE_RECT = (400, 50, 150, 50)
+
+# ByteRange placeholder, patched once the file offsets are known
+BYTE_RANGE_PLACEHOLDER = [0, 9999999999, 9999999999, 9999999999]
+
+OID_DATA = '1.2.840.113549.1.7.1'
+OID_SIGNED_DATA = '1.2.840.113549.1.7.2'
+OID_CONTENT_TYPE = '1.2.840.113549.1.9.3'
+OID_MESSAGE_DIGEST = '1.2.840.113549.1.9.4'
+OID_SIGNING_TIME = '1.2.840.113549.1.9.5'
+OID_SHA256 = '2.16.840.1.101.3.4.2.1'
+OID_RSA = '1.2.840.113549.1.1.1'
+OID_ECDSA_SHA256 = '1.2.840.10045.4.3.2'
+
+
+def _der(tag: int, content: bytes) -> bytes:
+    """DER TLV with a definite length"""
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    size = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([tag, 0x80 | len(size)]) + size + content
+
+
+def _sequence(*items: bytes) -> bytes:
+    return _der(0x30, b''.join(items))
+
+
+def _set(*items: bytes) -> bytes:
+    # DER orders SET OF elements by their encodings
+    return _der(0x31, b''.join(sorted(items)))
+
+
+def _integer(value: int) -> bytes:
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True))
+
+
+def _oid(dotted: str) -> bytes:
+    numbers = [int(part) for part in dotted.split('.')]
+    body = bytes([numbers[0] * 40 + numbers[1]])
+    for number in numbers[2:]:
+        chunk = [number & 0x7F]
+        number >>= 7
+        while number:
+            chunk.append(0x80 | (number & 0x7F))
+            number >>= 7
+        body += bytes(reversed(chunk))
+    return _der(0x06, body)
+
+
+def _algorithm(dotted: str, null_params: bool = True) -> bytes:
+    return _sequence(_oid(dotted), b'\x05\x00' if null_params else b'')
+
+
+def _attribute(dotted: str, value: bytes) -> bytes:
+    return _sequence(_oid(dotted), _set(value))
+
+
+def _utc_time(moment: datetime) -> bytes:
+    return _der(0x17, moment.astimezone(timezone.utc).strftime('%y%m%d%H%M%SZ').encode('ascii'))
+
+
+def pdf_date(moment: datetime) -> str:
+    """PDF date string, e.g. D:20240131120000Z"""
+    return moment.astimezone(timezone.utc).strftime("D:%Y%m%d%H%M%SZ")
+
+
+class Signer:
+    """
+    Signs PDFs with one PKCS#12 key and certificate chain
+
+    Loading and decrypting the PKCS#12 file happens once, in __init__;
+    each signature then costs two hashing passes over the file and one
+    private-key operation.
+    """
+
+    def __init__(self, pkcs12_data: bytes, password: str = None):
+        key, certificate, extra = pkcs12.load_key_and_certificates(
+            pkcs12_data, password.encode('utf-8') if password else None)
+        if key is None or certificate is None:
+            raise ValueError("The PKCS#12 file must contain a private key and its certificate")
+        if not isinstance(key, (rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey)):
+            raise ValueError("Only RSA and ECDSA keys are supported")
+
+        self.key = key
+        self.certificate = certificate
+
+        chain = [certificate] + list(extra or [])
+        self._certificates = b''.join(c.public_bytes(serialization.Encoding.DER) for c in chain)
+        self._signer_id = _sequence(certificate.issuer.public_bytes(), _integer(certificate.serial_number))
+        self.reserved_size = len(self._certificates) + SIGNATURE_OVERHEAD
+
+        names = certificate.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        self.name = str(names[0].value) if names else certificate.subject.rfc4514_string()
+
+    def _sign(self, data: bytes) -> Tuple[bytes, bytes]:
+        """(signature algorithm, signature value) for data"""
+        if isinstance(self.key, rsa.RSAPrivateKey):
+            return _algorithm(OID_RSA), self.key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+        return _algorithm(OID_ECDSA_SHA256, null_params=False), \
+            self.key.sign(data, ec.ECDSA(hashes.SHA256()))
+
+    def cms_signature(self, digest: bytes, signing_time: datetime) -> bytes:
+        """
+        Detached CMS SignedData for a SHA-256 digest of the signed bytes
+
+        The digest goes into the signed attributes, so the document bytes
+        themselves are never needed here.
+        """
+        attributes = [
+            _attribute(OID_CONTENT_TYPE, _oid(OID_DATA)),
+            _attribute(OID_SIGNING_TIME, _utc_time(signing_time)),
+            _attribute(OID_MESSAGE_DIGEST, _der(0x04, digest)),
+        ]
+        # Attributes are signed as a SET and stored as [0] IMPLICIT
+        signed_attributes = _set(*attributes)
+        signature_algorithm, signature = self._sign(signed_attributes)
+
+        signer_info = _sequence(
+            _integer(1),
+            self._signer_id,
+            _algorithm(OID_SHA256),
+            b'\xa0' + signed_attributes[1:],
+            signature_algorithm,
+            _der(0x04, signature),
+        )
+        signed_data = _sequence(
+            _integer(1),
+            _set(_algorithm(OID_SHA256)),
+            _sequence(_oid(OID_DATA)),
+            _der(0xA0, self._certificates),
+            _set(signer_info),
+        )
+        return _sequence(_oid(OID_SIGNED_DATA), _der(0xA0, signed_data))
+
+    def _appearance(self, update: IncrementalUpdate, text: str, signing_time: datetime):
+        """Form XObject for the visible signature box"""
+        _, _, width, height = SIGNATURE_RECT
+        lines = [text, f'Signed by: {self.name}', signing_time.strftime('Date: %Y-%m-%d %H:%M %Z')]
+        content = [f'0 g 0.5 w 0.25 0.25 {fmt(width - 0.5)} {fmt(height - 0.5)} re S BT /F 8 Tf']
+        y = height - 14
+        for line in lines:
+            content.append(f'1 0 0 1 6 {fmt(y)} Tm {pdf_string(line)} Tj')
+            y -= 12
+        content.append('ET')
+
+        font = update.add(Dictionary(Type=Name.Font, Subtype=Name.Type1,
+                                     BaseFont=Name.Helvetica, Encoding=Name.WinAnsiEncoding))
+        form = update.pdf.make_stream(
+            '\n'.join(content).encode('latin-1'),
+            Type=Name.XObject, Subtype=Name.Form,
+            BBox=[0, 0, width, height],
+            Resources=Dictionary(Font=Dictionary(F=font)),
+        )
+        update.mark(form)
+        return form
+
+    @staticmethod
+    def _field_name(fields) -> str:
+        names = {str(field.get('/T', '')) for field in fields}
+        number = 1
+        while f'Signature{number}' in names:
+            number += 1
+        return f'Signature{number}'
+
+    def _add_signature_field(self, update: IncrementalUpdate, signature_text: str,
+                             reason: str, location: str, visible: bool,
+                             signing_time: datetime):
+        """Add the signature dictionary and its field/widget to the update"""
+        pdf = update.pdf
+        signature = update.add(Dictionary(
+            Type=Name.Sig,
+            Filter=Name('/Adobe.PPKLite'),
+            SubFilter=Name('/adbe.pkcs7.detached'),
+            ByteRange=Array(BYTE_RANGE_PLACEHOLDER),
+            Contents=String(bytes(self.reserved_size)),
+            M=pdf_date(signing_time),
+            Name=self.name,
+        ))
+        if reason:
+            signature.Reason = reason
+        if location:
+            signature.Location = location
+
+        acroform = pdf.Root.get('/AcroForm')
+        if acroform is None:
+            acroform = update.add(Dictionary(Fields=Array()))
+            pdf.Root.AcroForm = acroform
+            update.mark(pdf.Root)
+        elif acroform.is_indirect:
+            update.mark(acroform)
+        else:
+            update.mark(pdf.Root)
+        if '/Fields' not in acroform:
+            acroform.Fields = Array()
+        fields = acroform.Fields
+        if fields.is_indirect:
+            update.mark(fields)
+        # SignaturesExist | AppendOnly
+        acroform.SigFlags = 3
+
+        page = pdf.pages[0]
+        x, y, width, height = SIGNATURE_RECT if visible else (0, 0, 0, 0)
+        widget = Dictionary(
+            Type=Name.Annot, Subtype=Name.Widget, FT=Name.Sig,
+            T=String(self._field_name(fields)),
+            V=signature, P=page.obj, F=4,
+            Rect=[x, y, x + width, y + height],
+        )
+        if visible:
+            widget.AP = Dictionary(N=self._appearance(update, signature_text, signing_time))
+        widget = update.add(widget)
+        fields.append(widget)
+
+        annots = page.obj.get('/Annots')
+        if annots is None:
+            page.obj.Annots = Array([widget])
+            update.mark(page.obj)
+        else:
+            annots.append(widget)
+            update.mark(annots if annots.is_indirect else page.obj)
+        return signature
+
+    def sign_file(self, pdf_path: Path, output_path: Path,
+                  signature_text: str = 'Digitally Signed', reason: str = '',
+                  location: str = '', visible: bool = True) -> Path:
+        """
+        Sign a PDF, writing the original bytes plus a signed update
+
+        Returns:
+            output_path
+        """
+        signing_time = datetime.now(timezone.utc)
+        with IncrementalUpdate(pdf_path) as update:
+            signature = self._add_signature_field(update, signature_text, reason, location,
+                                                  visible, signing_time)
+            update.write(output_path)
+            signature_offset = update.offsets[signature.objgen]
+
+        with open(output_path, 'r+b') as f:
+            f.seek(signature_offset)
+            obj = b''
+            while b'endobj' not in obj:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    raise ValueError("Signature object not found in the update")
+                obj += chunk
+            contents_start = signature_offset + obj.index(b'/Contents <') + len(b'/Contents ')
+            contents_end = signature_offset + obj.index(b'>', obj.index(b'/Contents <')) + 1
+            range_start = signature_offset + obj.index(b'/ByteRange [')
+            range_end = signature_offset + obj.index(b']', range_start - signature_offset) + 1
+
+            f.seek(0, 2)
+            file_size = f.tell()
+            byte_range = [0, contents_start, contents_end, file_size - contents_end]
+            text = ('/ByteRange [' + ' '.join(str(v) for v in byte_range) + ']').encode('ascii')
+            f.seek(range_start)
+            f.write(text.ljust(range_end - range_start))
+
+            digest = hashlib.sha256()
+            for start, length in ((0, contents_start), (contents_end, file_size - contents_end)):
+                f.seek(start)
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+
+            cms = self.cms_signature(digest.digest(), signing_time).hex().encode('ascii')
+            if len(cms) > contents_end - contents_start - 2:
+                raise ValueError("Signature does not fit the reserved space")
+            f.seek(contents_start + 1)
+            f.write(cms)
+
+        return output_path
+
+
+_signer: Optional[Signer] = None
+
+
+def _init_worker(pkcs12_data: bytes, password: Optional[str]) -> None:
+    global _signer
+    _signer = Signer(pkcs12_data, password)
+
+
+def _sign_job(pdf_path: str, output_path: str, options: dict) -> str:
+    return str(_signer.sign_file(Path(pdf_path), Path(output_path), **options))
+
+
+def sign_files(pkcs12_data: bytes, password: Optional[str], jobs: List[Tuple[Path, Path]],
+               processes: int = None, **options) -> List[Path]:
+    """
+    Sign many PDFs, loading the key once per worker process
+
+    Args:
+        pkcs12_data: PKCS#12 file contents
+        password: PKCS#12 password
+        jobs: (input path, output path) pairs
+        processes: Worker processes (default: CPU count, 1 = in-process)
+        **options: Keyword arguments for Signer.sign_file
+
+    Returns:
+        Output paths, in job order
+    """
+    processes = min(processes or default_process_count(), len(jobs))
+    if processes <= 1:
+        signer = Signer(pkcs12_data, password)
+        return [signer.sign_file(pdf_path, output_path, **options) for pdf_path, output_path in jobs]
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(pkcs12_data, password)) as executor:
+        futures = [executor.submit(_sign_job, str(pdf_path), str(output_path), options)
+                   for pdf_path, output_path in jobs]
+        return [Path(future.result()) for future in futures]
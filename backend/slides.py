@@ -0,0 +1,152 @@
+"""
+Picture-slide presentations
+- Each slide shows one rendered page as a full-slide picture
+- Identical page images share a single media part
+- Image parts read their bytes from disk only while the PPTX is written
+- Optional invisible text boxes make the page text selectable
+"""
+import hashlib
+from pathlib import Path
+from typing import List, Tuple
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.enum.text import MSO_AUTO_SIZE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml.ns import qn
+from pptx.parts.image import ImagePart
+from pptx.util import Emu, Pt
+
+EMU_PER_POINT = 12700
+
+# Slide size limits accepted by PowerPoint (1 to 56 inches)
+MIN_SLIDE_EMU = 914400
+MAX_SLIDE_EMU = 51206400
+
+IMAGE_CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+}
+
+
+def file_sha1(path: Path) -> str:
+    """SHA-1 of a file, read in chunks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _FileImagePart(ImagePart):
+    """Image part whose bytes stay on disk until the package is saved"""
+
+    def __init__(self, partname: PackURI, content_type: str, package, path: Path):
+        super().__init__(partname, content_type, package, None, path.name)
+        self._path = path
+
+    @property
+    def blob(self) -> bytes:
+        return self._path.read_bytes()
+
+    def scale(self, scaled_cx, scaled_cy):
+        # Pictures are always placed with an explicit size, so the image
+        # never has to be opened to find its native size
+        if scaled_cx is not None and scaled_cy is not None:
+            return scaled_cx, scaled_cy
+        return super().scale(scaled_cx, scaled_cy)
+
+
+def slide_size(width_pt: float, height_pt: float) -> Tuple[int, int]:
+    """Slide size in EMU matching a page size, scaled into PowerPoint's limits"""
+    width = width_pt * EMU_PER_POINT
+    height = height_pt * EMU_PER_POINT
+    scale = min(1.0, MAX_SLIDE_EMU / max(width, height))
+    if min(width, height) * scale < MIN_SLIDE_EMU:
+        scale = MIN_SLIDE_EMU / min(width, height)
+    return (int(min(max(width * scale, MIN_SLIDE_EMU), MAX_SLIDE_EMU)),
+            int(min(max(height * scale, MIN_SLIDE_EMU), MAX_SLIDE_EMU)))
+
+
+class PictureDeck:
+    """Presentation built from page images, one slide per page"""
+
+    def __init__(self, width_pt: float, height_pt: float):
+        self.prs = Presentation()
+        self.prs.slide_width, self.prs.slide_height = slide_size(width_pt, height_pt)
+        self._blank_layout = self.prs.slide_layouts[6]
+        self._image_parts = {}
+
+    def _image_part(self, image_path: Path) -> ImagePart:
+        """
+        Return the media part for an image file, reusing an identical one
+
+        python-pptx looks for duplicates by walking and hashing every
+        image part in the package on each insert; a digest table keeps
+        this constant per page.
+        """
+        sha1 = file_sha1(image_path)
+        part = self._image_parts.get(sha1)
+        if part is None:
+            ext = image_path.suffix.lower()
+            partname = PackURI(f'/ppt/media/page{len(self._image_parts) + 1}{ext}')
+            part = _FileImagePart(partname, IMAGE_CONTENT_TYPES[ext], self.prs.part.package, image_path)
+            self._image_parts[sha1] = part
+        return part
+
+    def add_page(self, image_path: Path, page_width: float, page_height: float,
+                 lines: List[dict] = None) -> None:
+        """
+        Add a slide showing a page image
+
+        Args:
+            image_path: Rendered page image (JPEG or PNG)
+            page_width: Page width in points
+            page_height: Page height in points
+            lines: Optional text lines (text, x0, x1, top, size in page
+                points from the top-left) added as invisible text boxes
+        """
+        slide = self.prs.slides.add_slide(self._blank_layout)
+
+        # Fit the page inside the slide, centred
+        scale = min(self.prs.slide_width / page_width, self.prs.slide_height / page_height)
+        width, height = int(page_width * scale), int(page_height * scale)
+        left = (self.prs.slide_width - width) // 2
+        top = (self.prs.slide_height - height) // 2
+
+        image_part = self._image_part(image_path)
+        rId = slide.part.relate_to(image_part, RT.IMAGE)
+        slide.shapes._add_pic_from_image_part(image_part, rId, Emu(left), Emu(top),
+                                              Emu(width), Emu(height))
+
+        for line in lines or []:
+            self._add_text_line(slide, line, left, top, scale)
+
+    @staticmethod
+    def _add_text_line(slide, line: dict, left: int, top: int, scale: float) -> None:
+        """Add one line of invisible, selectable text over the picture"""
+        size = line['size'] * scale / EMU_PER_POINT
+        box = slide.shapes.add_textbox(
+            Emu(left + int(line['x0'] * scale)),
+            Emu(top + int(line['top'] * scale)),
+            Emu(max(1, int((line['x1'] - line['x0']) * scale))),
+            Emu(max(1, int(line['size'] * 1.2 * scale))),
+        )
+        frame = box.text_frame
+        frame.word_wrap = False
+        frame.auto_size = MSO_AUTO_SIZE.NONE
+        frame.margin_left = frame.margin_right = frame.margin_top = frame.margin_bottom = 0
+
+        run = frame.paragraphs[0].add_run()
+        run.text = line['text']
+        run.font.size = Pt(max(1, round(size * 2) / 2))
+
+        # Fully transparent fill keeps the text selectable but unseen
+        run.font.color.rgb = RGBColor(0, 0, 0)
+        srgb = run._r.find(qn('a:rPr')).find(qn('a:solidFill')).find(qn('a:srgbClr'))
+        srgb.append(srgb.makeelement(qn('a:alpha'), {'val': '0'}))
+
+    def save(self, output_path: Path) -> None:
+        self.prs.save(output_path)
@@ -0,0 +1,339 @@
+"""
+Page stamping with shared resources
+- Appends a small content stream to each page instead of merging overlay
+  pages, so nothing is rendered or parsed per page
+- Fonts and XObjects are created once and referenced from every page
+- Stamps are laid out in the page's displayed orientation (/Rotate aware)
+- Watermarks are built once as Form XObjects with an opacity ExtGState
+"""
+import io
+import math
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterable, Tuple
+
+import pikepdf
+from PIL import Image
+from pikepdf import Dictionary, Name
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Distance (in points) of stamped text from the page edges
+EDGE_MARGIN_X = 50
+EDGE_MARGIN_Y = 30
+
+# Share of the font size above/below the baseline for text form boxes
+ASCENT = 0.75
+DESCENT = 0.25
+
+# Width of image watermark forms, in form units
+IMAGE_FORM_WIDTH = 100
+
+JPEG_COLORSPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+POSITIONS = (
+    'bottom-center', 'bottom-right', 'bottom-left',
+    'top-center', 'top-right', 'top-left',
+)
+
+
+def pdf_string(text: str) -> str:
+    """
+    PDF literal string for text shown with a WinAnsi-encoded font
+
+    The result holds one character per byte, so it can be written into a
+    content stream encoded as latin-1.
+    """
+    data = text.encode('cp1252', errors='replace').decode('latin-1')
+    return '(' + data.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def fmt(value: float) -> str:
+    """Format a number for a content stream"""
+    return f'{value:.4f}'.rstrip('0').rstrip('.') or '0'
+
+
+def display_matrix(page: pikepdf.Page) -> Tuple[Tuple[float, ...], float, float]:
+    """
+    Matrix from displayed page coordinates to user space
+
+    Returns:
+        (matrix, width, height) where the matrix maps points measured from
+        the bottom-left of the page as it is displayed (after /Rotate) to
+        the page's user space, and width/height are the displayed size.
+    """
+    box = [float(v) for v in page.cropbox]
+    return display_matrix_for(box, int(page.obj.get('/Rotate', 0)))
+
+
+def display_matrix_for(box, rotation: int) -> Tuple[Tuple[float, ...], float, float]:
+    """display_matrix for a page box (x0, y0, x1, y1) and /Rotate value"""
+    x0, y0, x1, y1 = box
+    x0, x1 = min(x0, x1), max(x0, x1)
+    y0, y1 = min(y0, y1), max(y0, y1)
+    rotation = rotation % 360
+
+    if rotation == 90:
+        return (0, 1, -1, 0, x1, y0), y1 - y0, x1 - x0
+    if rotation == 180:
+        return (-1, 0, 0, -1, x1, y1), x1 - x0, y1 - y0
+    if rotation == 270:
+        return (0, -1, 1, 0, x0, y1), y1 - y0, x1 - x0
+    return (1, 0, 0, 1, x0, y0), x1 - x0, y1 - y0
+
+
+def text_origin(position: str, page_width: float, page_height: float,
+                text_width: float, font_size: float) -> Tuple[float, float]:
+    """Baseline start of a line of text placed at a named position"""
+    vertical, _, horizontal = position.partition('-')
+    # Text is centred on a point EDGE_MARGIN_X in from the side
+    if horizontal == 'right':
+        centre = page_width - EDGE_MARGIN_X
+    elif horizontal == 'left':
+        centre = EDGE_MARGIN_X
+    else:
+        centre = page_width / 2
+    y = page_height - EDGE_MARGIN_Y - font_size if vertical == 'top' else EDGE_MARGIN_Y
+    return centre - text_width / 2, y
+
+
+def place_form(name: str, form: pikepdf.Object, centre_x: float, centre_y: float,
+               angle: float = 0, scale: float = 1.0) -> str:
+    """Operators drawing a form centred on a point, rotated and scaled"""
+    x0, y0, x1, y1 = [float(v) for v in form.BBox]
+    cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    return (f'q 1 0 0 1 {fmt(centre_x)} {fmt(centre_y)} cm '
+            f'{fmt(cos)} {fmt(sin)} {fmt(-sin)} {fmt(cos)} 0 0 cm '
+            f'{fmt(scale)} 0 0 {fmt(scale)} {fmt(-scale * (x0 + x1) / 2)} {fmt(-scale * (y0 + y1) / 2)} cm '
+            f'{name} Do Q')
+
+
+class PageStamper:
+    """Appends content to pages, with resources shared by every page"""
+
+    def __init__(self, pdf: pikepdf.Pdf):
+        self.pdf = pdf
+        # One shared stream saves the graphics state before existing content
+        self._save_state = pdf.make_stream(b'q\n')
+
+    def standard_font(self, base_font: str = 'Helvetica') -> pikepdf.Object:
+        """Indirect font dictionary for one of the standard 14 fonts"""
+        return self.pdf.make_indirect(Dictionary(
+            Type=Name.Font,
+            Subtype=Name.Type1,
+            BaseFont=Name('/' + base_font),
+            Encoding=Name.WinAnsiEncoding,
+        ))
+
+    @staticmethod
+    def _page_resources(page: pikepdf.Page) -> Dictionary:
+        """Page /Resources, copied down from the page tree if inherited"""
+        if Name.Resources not in page.obj:
+            node = page.obj.get('/Parent')
+            while node is not None and Name.Resources not in node:
+                node = node.get('/Parent')
+            inherited = node.Resources if node is not None else Dictionary()
+            page.obj.Resources = Dictionary({key: value for key, value in inherited.items()})
+        return page.obj.Resources
+
+    @staticmethod
+    def _resource_name(resources: Dictionary, res_type: Name, name: str,
+                       obj: pikepdf.Object) -> Name:
+        """Add obj to a resource category under a name not used by the page"""
+        if res_type not in resources:
+            resources[res_type] = Dictionary()
+        category = resources[res_type]
+
+        candidate = Name('/' + name)
+        suffix = 0
+        while candidate in category and category[candidate].objgen != obj.objgen:
+            suffix += 1
+            candidate = Name(f'/{name}{suffix}')
+        category[candidate] = obj
+        return candidate
+
+    def add_resources(self, page: pikepdf.Page, fonts: dict = None,
+                      xobjects: dict = None) -> dict:
+        """
+        Make shared fonts and XObjects available to a page
+
+        Args:
+            page: Page to stamp
+            fonts: {key: font object}
+            xobjects: {key: XObject}
+
+        Returns:
+            {key: resource name} to use in the page's stamp content
+        """
+        resources = self._page_resources(page)
+        names = {}
+        for res_type, objects in ((Name.Font, fonts), (Name.XObject, xobjects)):
+            for key, obj in (objects or {}).items():
+                names[key] = self._resource_name(resources, res_type, f'Stamp{key}', obj)
+        return names
+
+    def stamp(self, page: pikepdf.Page, content: str) -> None:
+        """
+        Draw content over a page
+
+        Args:
+            page: Page to stamp
+            content: Content stream operators in displayed page coordinates,
+                using resource names returned by add_resources
+        """
+        matrix = ' '.join(fmt(v) for v in display_matrix(page)[0])
+        overlay = f'Q\nq {matrix} cm\n{content}\nQ\n'
+
+        page.contents_add(self._save_state, prepend=True)
+        page.contents_add(overlay.encode('latin-1'))
+
+    def add_overlay(self, page: pikepdf.Page) -> pikepdf.Object:
+        """
+        Append an empty overlay stream to a page and return it
+
+        The stream can be rewritten later (e.g. once per mail-merge
+        record). Its content must start with Q, which restores the state
+        saved before the page's own content.
+        """
+        overlay = self.pdf.make_stream(b'Q\n')
+        page.contents_add(self._save_state, prepend=True)
+        page.contents_add(overlay)
+        return overlay
+
+    def opacity_state(self, opacity: float) -> pikepdf.Object:
+        """Indirect ExtGState setting fill and stroke opacity"""
+        return self.pdf.make_indirect(Dictionary(
+            Type=Name.ExtGState,
+            ca=float(opacity),
+            CA=float(opacity),
+        ))
+
+    def text_form(self, text: str, base_font: str, font_size: float,
+                  gray: float = 0.5, opacity: float = 1.0) -> pikepdf.Object:
+        """
+        Form XObject drawing one line of text
+
+        The form's origin is the left end of the baseline and its BBox
+        covers the text, so callers can centre it from its /BBox.
+        """
+        width = stringWidth(text, base_font, font_size)
+        content = (f'/GS gs {fmt(gray)} g BT /F {fmt(font_size)} Tf '
+                   f'0 0 Td {pdf_string(text)} Tj ET')
+        return self.pdf.make_stream(
+            content.encode('latin-1'),
+            Type=Name.XObject,
+            Subtype=Name.Form,
+            BBox=[0, -DESCENT * font_size, width, ASCENT * font_size],
+            Resources=Dictionary(
+                Font=Dictionary(F=self.standard_font(base_font)),
+                ExtGState=Dictionary(GS=self.opacity_state(opacity)),
+            ),
+        )
+
+    def image_form(self, image_file: BinaryIO, opacity: float = 1.0) -> pikepdf.Object:
+        """
+        Form XObject drawing an image
+
+        JPEG files are embedded as they are; other images are stored
+        Flate-compressed, with any alpha channel as a soft mask. The form
+        is IMAGE_FORM_WIDTH units wide and keeps the image's aspect ratio.
+        """
+        image_file.seek(0)
+        data = image_file.read()
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if img.format == 'JPEG' and img.mode in JPEG_COLORSPACES:
+                image = self.pdf.make_stream(
+                    data, Filter=Name.DCTDecode,
+                    ColorSpace=Name(JPEG_COLORSPACES[img.mode]),
+                )
+                if img.mode == 'CMYK' and 'adobe' in img.info:
+                    # Adobe CMYK JPEGs are stored inverted
+                    image.Decode = [1, 0, 1, 0, 1, 0, 1, 0]
+            else:
+                has_alpha = img.mode in ('RGBA', 'LA', 'PA') or \
+                    (img.mode == 'P' and 'transparency' in img.info)
+                base = img.convert('RGBA' if has_alpha else 'RGB')
+                image = self.pdf.make_stream(zlib.compress(base.convert('RGB').tobytes()),
+                                             Filter=Name.FlateDecode,
+                                             ColorSpace=Name.DeviceRGB)
+                if has_alpha:
+                    image.SMask = self.pdf.make_stream(
+                        zlib.compress(base.getchannel('A').tobytes()),
+                        Type=Name.XObject, Subtype=Name.Image,
+                        Width=width, Height=height,
+                        ColorSpace=Name.DeviceGray, BitsPerComponent=8,
+                        Filter=Name.FlateDecode,
+                    )
+
+        image.Type = Name.XObject
+        image.Subtype = Name.Image
+        image.Width = width
+        image.Height = height
+        image.BitsPerComponent = 8
+
+        form_height = IMAGE_FORM_WIDTH * height / width
+        return self.pdf.make_stream(
+            f'/GS gs {IMAGE_FORM_WIDTH} 0 0 {fmt(form_height)} 0 0 cm /Im Do'.encode('latin-1'),
+            Type=Name.XObject,
+            Subtype=Name.Form,
+            BBox=[0, 0, IMAGE_FORM_WIDTH, form_height],
+            Resources=Dictionary(
+                XObject=Dictionary(Im=image),
+                ExtGState=Dictionary(GS=self.opacity_state(opacity)),
+            ),
+        )
+
+
+def stamp_labels(pdf: pikepdf.Pdf, labels: Iterable[str], position: str = 'bottom-center',
+                 font_size: float = 10, base_font: str = 'Helvetica') -> None:
+    """
+    Write one text label on each page, all pages sharing one font
+
+    Args:
+        pdf: Open document, changed in place
+        labels: Label per page, in page order
+        position: One of POSITIONS
+        font_size: Font size in points
+        base_font: Standard 14 font name
+    """
+    stamper = PageStamper(pdf)
+    font = stamper.standard_font(base_font)
+
+    for page, label in zip(pdf.pages, labels):
+        _, page_width, page_height = display_matrix(page)
+        x, y = text_origin(position, page_width, page_height,
+                           stringWidth(label, base_font, font_size), font_size)
+
+        names = stamper.add_resources(page, fonts={'F': font})
+        stamper.stamp(page, f"BT {names['F']} {fmt(font_size)} Tf 0 g "
+                            f"{fmt(x)} {fmt(y)} Td {pdf_string(label)} Tj ET")
+
+
+def page_count(pdf_path: Path) -> int:
+    """
+    Number of pages, counted as bates_stamp_file counts them
+
+    /Count in the page tree root can be wrong, so the page list is used;
+    pikepdf builds it from the page tree nodes without loading content.
+    """
+    with pikepdf.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def bates_label(number: int, prefix: str = '', digits: int = 6) -> str:
+    return f'{prefix}{number:0{digits}d}'
+
+
+def bates_stamp_file(pdf_path: Path, output_path: Path, first_number: int,
+                     prefix: str = '', digits: int = 6, position: str = 'bottom-right',
+                     font_size: float = 10) -> Path:
+    """
+    Stamp consecutive Bates numbers on one file
+
+    Module-level so it can run in worker processes.
+    """
+    with pikepdf.open(pdf_path) as pdf:
+        labels = (bates_label(first_number + i, prefix, digits) for i in range(len(pdf.pages)))
+        stamp_labels(pdf, labels, position, font_size)
+        pdf.save(output_path)
+    return output_path
@@ -0,0 +1,218 @@
+"""
+Geometry-based table extraction
+- Clusters word boxes into rows (by baseline) and columns (by x coverage)
+  with vectorized NumPy operations
+- Uses ruling lines as column and row boundaries when a table has them
+- Lines that are not part of a table are kept as single-cell rows
+"""
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from .text_layout import TextRun, extract_runs, split_words
+
+# A horizontal gap wider than this many font sizes separates two cells
+CELL_GAP = 1.0
+
+# Consecutive table rows may be at most this many line heights apart
+ROW_GAP = 2.5
+
+# Rulings closer than this (in points) are treated as the same line
+RULING_SNAP = 3.0
+
+NUMBER_PATTERN = re.compile(r'^\(?-?[$€£¥]?\s?\d[\d,]*(\.\d+)?%?\)?$')
+
+
+def parse_cell(text: str):
+    """Convert numeric-looking cell text to int/float; keep other text as-is"""
+    text = text.strip()
+    if not NUMBER_PATTERN.match(text):
+        return text
+
+    negative = (text.startswith('(') and text.endswith(')')) or text.startswith('-')
+    digits = re.sub(r'[^\d.]', '', text)
+    if not digits or digits.count('.') > 1:
+        return text
+    # Identifiers like ZIP codes keep their leading zeros
+    if digits.startswith('0') and len(digits) > 1 and not digits.startswith('0.'):
+        return text
+
+    value = float(digits) if '.' in digits else int(digits)
+    if text.endswith('%') or text.endswith('%)'):
+        value = value / 100
+    return -value if negative else value
+
+
+def _cluster(values: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return the mean of each group of sorted values closer than tolerance"""
+    if values.size == 0:
+        return values
+    values = np.sort(values)
+    groups = np.concatenate(([0], np.cumsum(np.diff(values) > tolerance)))
+    return np.bincount(groups, weights=values) / np.bincount(groups)
+
+
+def _row_ids(baselines: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Assign a row index to each word from its baseline, top row first"""
+    order = np.argsort(-baselines, kind='stable')
+    gaps = -np.diff(baselines[order])
+    tolerance = 0.4 * np.maximum(sizes[order][1:], sizes[order][:-1])
+    sorted_rows = np.concatenate(([0], np.cumsum(gaps > tolerance)))
+    rows = np.empty_like(sorted_rows)
+    rows[order] = sorted_rows
+    return rows
+
+
+def _row_cells(words: List[TextRun], x0: np.ndarray, x1: np.ndarray,
+               sizes: np.ndarray) -> List[dict]:
+    """Split one row's words (sorted by x) into cells at wide gaps"""
+    breaks = (x0[1:] - x1[:-1]) > CELL_GAP * np.maximum(sizes[1:], sizes[:-1])
+    cell_ids = np.concatenate(([0], np.cumsum(breaks)))
+
+    cells = []
+    for cell_id in range(int(cell_ids[-1]) + 1):
+        members = np.flatnonzero(cell_ids == cell_id)
+        cells.append({
+            'text': ' '.join(words[i].text for i in members),
+            'x0': float(x0[members].min()),
+            'x1': float(x1[members].max()),
+        })
+    return cells
+
+
+def _column_edges(cells: List[dict], verticals: np.ndarray) -> np.ndarray:
+    """
+    Column separators for a table block
+
+    Vertical rulings win when present; otherwise separators are the
+    centres of x ranges covered by no cell in the block.
+    """
+    if verticals.size >= 2:
+        return verticals
+
+    left = int(np.floor(min(c['x0'] for c in cells)))
+    right = int(np.ceil(max(c['x1'] for c in cells)))
+    coverage = np.zeros(right - left + 2, dtype=np.int32)
+    starts = np.array([int(c['x0']) - left for c in cells])
+    ends = np.array([int(np.ceil(c['x1'])) - left for c in cells])
+    np.add.at(coverage, starts, 1)
+    np.add.at(coverage, ends + 1, -1)
+    empty = np.cumsum(coverage)[:-1] == 0
+
+    # Centres of each run of empty columns
+    padded = np.concatenate(([False], empty, [False])).astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    gap_starts, gap_ends = changes[0::2], changes[1::2]
+    return left + (gap_starts + gap_ends) / 2.0
+
+
+def _table_rows(block: List[dict], horizontals: np.ndarray, verticals: np.ndarray) -> List[list]:
+    """Lay out a block of candidate rows as a grid"""
+    all_cells = [cell for row in block for cell in row['cells']]
+    edges = _column_edges(all_cells, verticals)
+    column_count = len(edges) + 1
+
+    # In a ruled grid, text between two rules is one (wrapped) row. Tables
+    # with only a few rules (top/header/bottom) keep one row per line.
+    if horizontals.size >= 2 and horizontals.size - 1 >= len(block) / 2:
+        bands = np.searchsorted(-horizontals[::-1], [-row['baseline'] for row in block])
+    else:
+        bands = np.arange(len(block))
+
+    grid = []
+    previous_band = None
+    for row, band in zip(block, bands):
+        if band != previous_band:
+            grid.append([''] * column_count)
+            previous_band = band
+        target = grid[-1]
+        for cell in row['cells']:
+            column = int(np.searchsorted(edges, (cell['x0'] + cell['x1']) / 2))
+            target[column] = f"{target[column]} {cell['text']}".strip()
+
+    # Drop columns that stayed empty (e.g. outside the outer rulings)
+    keep = [i for i in range(column_count) if any(r[i] for r in grid)]
+    return [[parse_cell(r[i]) for i in keep] for r in grid]
+
+
+def page_tables(page) -> List[list]:
+    """
+    Extract a page as spreadsheet rows
+
+    Runs in worker processes, so the result only holds plain data.
+
+    Returns:
+        List of rows (lists of cell values) in reading order. Table
+        blocks are laid out on a shared column grid; other text lines
+        become single-cell rows.
+    """
+    rulings = []
+    runs, _ = extract_runs(page, rulings=rulings)
+    words = split_words(runs)
+    if not words:
+        return []
+
+    x0 = np.array([w.x0 for w in words])
+    x1 = np.array([w.x1 for w in words])
+    baselines = np.array([w.baseline for w in words])
+    sizes = np.array([w.size for w in words])
+
+    segments = np.array(rulings, dtype=float).reshape(-1, 4)
+    is_horizontal = np.abs(segments[:, 3] - segments[:, 1]) <= 2
+    horizontal_rules = segments[is_horizontal]
+    vertical_rules = segments[~is_horizontal]
+
+    # Rows: words sharing a baseline, then cells split at wide gaps
+    row_ids = _row_ids(baselines, sizes)
+    rows = []
+    for row_id in range(int(row_ids.max()) + 1):
+        members = np.flatnonzero(row_ids == row_id)
+        members = members[np.argsort(x0[members], kind='stable')]
+        rows.append({
+            'baseline': float(baselines[members].mean()),
+            'size': float(sizes[members].max()),
+            'cells': _row_cells([words[i] for i in members], x0[members], x1[members], sizes[members]),
+        })
+
+    # Blocks: runs of consecutive multi-cell rows
+    output = []
+    block: List[dict] = []
+
+    def flush_block():
+        if not block:
+            return
+        top = block[0]['baseline'] + block[0]['size']
+        bottom = block[-1]['baseline'] - block[-1]['size']
+        left = min(c['x0'] for r in block for c in r['cells']) - RULING_SNAP
+        right = max(c['x1'] for r in block for c in r['cells']) + RULING_SNAP
+
+        in_block_v = vertical_rules[(vertical_rules[:, 3] >= bottom) & (vertical_rules[:, 1] <= top)]
+        in_block_h = horizontal_rules[(horizontal_rules[:, 1] >= bottom - RULING_SNAP) &
+                                      (horizontal_rules[:, 1] <= top + RULING_SNAP) &
+                                      (horizontal_rules[:, 2] >= left) & (horizontal_rules[:, 0] <= right)]
+        verticals = _cluster(in_block_v[:, 0], RULING_SNAP)
+        horizontals = _cluster(in_block_h[:, 1], RULING_SNAP)
+        output.extend(_table_rows(block, horizontals, verticals))
+        block.clear()
+
+    previous: Optional[dict] = None
+    for row in rows:
+        is_table_row = len(row['cells']) >= 2
+        close = previous is not None and previous['baseline'] - row['baseline'] <= ROW_GAP * row['size']
+
+        if is_table_row and (not block or close):
+            block.append(row)
+        elif is_table_row:
+            flush_block()
+            block.append(row)
+        elif block and close and row['cells'][0]['x0'] > block[0]['cells'][0]['x0'] + row['size']:
+            # A row with only one filled cell, not in the first column
+            block.append(row)
+        else:
+            flush_block()
+            output.append([parse_cell(' '.join(c['text'] for c in row['cells']))])
+        previous = row
+
+    flush_block()
+    return output
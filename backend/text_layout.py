@@ -0,0 +1,651 @@
+"""
+Positioned text extraction and layout reconstruction
+- Collects text runs with page coordinates through pypdf's text visitor
+- Groups runs into words, lines, columns and paragraphs from geometry
+- Detects headings from font size and places images by their position
+- Optionally measures shown text glyph by glyph from the font widths,
+  for geometry that must not cut text off (auto-crop)
+"""
+import io
+import math
+from statistics import median
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from reportlab.pdfbase.pdfmetrics import standardFonts, stringWidth
+
+# Fraction of the font size above/below the baseline used for run boxes
+ASCENT = 0.8
+DESCENT = 0.2
+
+# Minimum empty horizontal band (in points) treated as a column gutter
+MIN_GUTTER_WIDTH = 10
+
+DOCX_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff'}
+
+
+class TextRun(NamedTuple):
+    """A piece of text drawn by one text operator, in page coordinates"""
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    size: float
+    font: str
+
+    @property
+    def baseline(self) -> float:
+        return self.y0 + DESCENT * self.size
+
+
+def _multiply(m, n) -> Tuple[float, ...]:
+    """Return m x n for PDF [a b c d e f] matrices"""
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = n
+    return (
+        a * A + b * C, a * B + b * D,
+        c * A + d * C, c * B + d * D,
+        e * A + f * C + E, e * B + f * D + F,
+    )
+
+
+def _text_width(text: str, font_dict, size: float, cache: Dict) -> float:
+    """Estimate the advance width of text in a font"""
+    base_font = str(font_dict.get('/BaseFont', '')).lstrip('/') if font_dict else ''
+    if base_font in standardFonts and '/Widths' not in (font_dict or {}):
+        return stringWidth(text, base_font, size)
+
+    key = id(font_dict)
+    if key not in cache:
+        average = 500.0
+        try:
+            widths = [float(w) for w in font_dict.get('/Widths', []) if float(w) > 0]
+            if widths:
+                average = sum(widths) / len(widths)
+        except Exception:
+            pass
+        cache[key] = average
+    return len(text) * cache[key] / 1000 * size
+
+
+class _FontWidths:
+    """Glyph advance widths of one font, in text space units per unit font size"""
+
+    def __init__(self, font_dict):
+        self.code_length = 1
+        self.scale = 0.001
+        self.widths: Dict[int, float] = {}
+        self.default = None
+        self.measurable = True
+
+        subtype = font_dict.get('/Subtype')
+        base_font = str(font_dict.get('/BaseFont', '')).lstrip('/')
+        if subtype == '/Type0':
+            # Only the identity CMaps map 2-byte codes straight to CIDs
+            if str(font_dict.get('/Encoding', '')) not in ('/Identity-H', '/Identity-V'):
+                self.measurable = False
+                return
+            self.code_length = 2
+            descendant = font_dict['/DescendantFonts'][0].get_object()
+            self.default = float(descendant.get('/DW', 1000))
+            self._read_cid_widths(list(descendant.get('/W', [])))
+            return
+
+        if subtype == '/Type3' and '/FontMatrix' in font_dict:
+            self.scale = float(font_dict['/FontMatrix'][0])
+        first = int(font_dict.get('/FirstChar', 0))
+        for offset, width in enumerate(font_dict.get('/Widths', [])):
+            self.widths[first + offset] = float(width)
+        descriptor = font_dict.get('/FontDescriptor')
+        descriptor = descriptor.get_object() if descriptor is not None else {}
+        if self.widths:
+            self.default = float(descriptor.get('/MissingWidth', 0))
+        elif base_font in standardFonts:
+            for code in range(256):
+                self.widths[code] = stringWidth(bytes([code]).decode('latin-1'), base_font, 1000)
+            self.default = 0.0
+        else:
+            self.measurable = False
+
+    def _read_cid_widths(self, items: list) -> None:
+        index = 0
+        while index + 1 < len(items):
+            first = int(items[index])
+            second = items[index + 1]
+            if isinstance(second, list):
+                for offset, width in enumerate(second):
+                    self.widths[first + offset] = float(width)
+                index += 2
+            elif index + 2 < len(items):
+                for code in range(first, int(second) + 1):
+                    self.widths[code] = float(items[index + 2])
+                index += 3
+            else:
+                break
+
+    def codes(self, data: bytes) -> List[int]:
+        if self.code_length == 2:
+            return [int.from_bytes(data[i:i + 2], 'big') for i in range(0, len(data) - 1, 2)]
+        return list(data)
+
+    def width(self, code: int) -> float:
+        return self.widths.get(code, self.default) * self.scale
+
+
+def _string_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return bytes(value)
+    original = getattr(value, 'get_original_bytes', None)
+    return original() if original is not None else str(value).encode('latin-1', 'replace')
+
+
+class _TextMeasure:
+    """
+    Tracks the text state of a content stream and records the advance
+    box of every shown string in page coordinates
+
+    pypdf's text matrix does not advance over shown strings, so the text
+    and line matrices are followed here from the operators themselves.
+    """
+
+    STATE = ('font', 'size', 'char_spacing', 'word_spacing', 'scaling', 'leading', 'rise')
+
+    def __init__(self, fonts, boxes: list):
+        self.fonts = fonts
+        self.boxes = boxes
+        self._widths: Dict[str, Optional[_FontWidths]] = {}
+        self.font = None
+        self.size = 1.0
+        self.char_spacing = 0.0
+        self.word_spacing = 0.0
+        self.scaling = 1.0
+        self.leading = 0.0
+        self.rise = 0.0
+        self.stack = []
+        self.tm = self.tlm = (1, 0, 0, 1, 0, 0)
+
+    def _font_widths(self, name: str) -> Optional[_FontWidths]:
+        if name not in self._widths:
+            font_dict = self.fonts.get(name)
+            try:
+                self._widths[name] = _FontWidths(font_dict.get_object()) if font_dict is not None else None
+            except Exception:
+                self._widths[name] = None
+        return self._widths[name]
+
+    def _move(self, tx: float, ty: float) -> None:
+        self.tm = self.tlm = _multiply((1, 0, 0, 1, tx, ty), self.tlm)
+
+    def _show(self, items: list, cm) -> None:
+        widths = self._font_widths(self.font) if self.font is not None else None
+        if widths is None or not widths.measurable:
+            self.boxes.append(None)
+            return
+
+        position = low = high = 0.0
+        for item in items:
+            if isinstance(item, (int, float)):
+                position -= float(item) / 1000 * self.size * self.scaling
+            else:
+                for code in widths.codes(_string_bytes(item)):
+                    advance = widths.width(code) * self.size + self.char_spacing
+                    if code == 32 and widths.code_length == 1:
+                        advance += self.word_spacing
+                    position += advance * self.scaling
+            low, high = min(low, position), max(high, position)
+
+        m = _multiply(self.tm, cm)
+        bottom = self.rise - DESCENT * self.size
+        top = self.rise + ASCENT * self.size
+        corners = [(m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5])
+                   for x in (low, high) for y in (bottom, top)]
+        self.boxes.append((min(c[0] for c in corners), min(c[1] for c in corners),
+                           max(c[0] for c in corners), max(c[1] for c in corners)))
+        self.tm = _multiply((1, 0, 0, 1, position, 0), self.tm)
+
+    def operator(self, operator: bytes, operands: list, cm) -> None:
+        try:
+            if operator == b'q':
+                self.stack.append(tuple(getattr(self, name) for name in self.STATE))
+            elif operator == b'Q' and self.stack:
+                for name, value in zip(self.STATE, self.stack.pop()):
+                    setattr(self, name, value)
+            elif operator == b'BT':
+                self.tm = self.tlm = (1, 0, 0, 1, 0, 0)
+            elif operator == b'Tf':
+                self.font, self.size = str(operands[0]), float(operands[1])
+            elif operator == b'Tc':
+                self.char_spacing = float(operands[0])
+            elif operator == b'Tw':
+                self.word_spacing = float(operands[0])
+            elif operator == b'Tz':
+                self.scaling = float(operands[0]) / 100
+            elif operator == b'TL':
+                self.leading = float(operands[0])
+            elif operator == b'Ts':
+                self.rise = float(operands[0])
+            elif operator == b'Td':
+                self._move(float(operands[0]), float(operands[1]))
+            elif operator == b'TD':
+                self.leading = -float(operands[1])
+                self._move(float(operands[0]), float(operands[1]))
+            elif operator == b'Tm':
+                self.tm = self.tlm = tuple(float(v) for v in operands[:6])
+            elif operator == b'T*':
+                self._move(0, -self.leading)
+            elif operator == b'Tj':
+                self._show([operands[0]], cm)
+            elif operator == b'TJ':
+                self._show(list(operands[0]), cm)
+            elif operator == b"'":
+                self._move(0, -self.leading)
+                self._show([operands[0]], cm)
+            elif operator == b'"':
+                self.word_spacing, self.char_spacing = float(operands[0]), float(operands[1])
+                self._move(0, -self.leading)
+                self._show([operands[2]], cm)
+        except (IndexError, TypeError, ValueError):
+            if operator in (b'Tj', b'TJ', b"'", b'"'):
+                self.boxes.append(None)
+
+
+def extract_runs(page, rulings: list = None, paths: list = None,
+                 text_boxes: list = None) -> Tuple[List[TextRun], List[dict]]:
+    """
+    Extract positioned text runs and image placements from a pypdf page
+
+    Args:
+        page: pypdf page
+        rulings: Optional list that receives straight horizontal and
+                 vertical path segments as (x0, y0, x1, y1) tuples
+        paths: Optional list that receives the bbox of every painted
+               path. None entries mark content whose extent is not
+               measured (shadings, inline images).
+        text_boxes: Optional list that receives the advance box of every
+               shown string, measured glyph by glyph from the font's
+               widths. None entries mark text in a font whose widths
+               are unknown.
+
+    Returns:
+        Tuple of (text runs, images) where each image is a dict with
+        name and bbox (x0, y0, x1, y1) in page coordinates
+    """
+    runs = []
+    placements = []
+    width_cache = {}
+    path_start = None
+    path_points = []
+    measure = None
+    if text_boxes is not None:
+        measure = _TextMeasure(page.get('/Resources', {}).get('/Font', {}), text_boxes)
+
+    def visit_text(text, cm, tm, font_dict, font_size):
+        if not text or not text.strip():
+            return
+        m = _multiply(tm, cm)
+        size = (font_size or 1) * (math.hypot(m[2], m[3]) or 1)
+        scale = math.hypot(m[0], m[1]) or 1
+        text = text.replace('\n', ' ').rstrip()
+        x0, baseline = m[4], m[5]
+        width = _text_width(text, font_dict, font_size or 1, width_cache) * scale
+        font = str(font_dict.get('/BaseFont', '')) if font_dict else ''
+        runs.append(TextRun(text, x0, baseline - DESCENT * size, x0 + width,
+                            baseline + ASCENT * size, size, font))
+
+    def visit_operator(operator, operands, cm, tm):
+        nonlocal path_start
+        if rulings is not None and operator in (b're', b'm', b'l'):
+            path_start = _collect_ruling(operator, operands, cm, path_start, rulings)
+        if paths is not None:
+            _collect_path(operator, operands, cm, path_points, paths)
+        if measure is not None:
+            measure.operator(operator, operands, cm)
+        if operator == b'Do' and operands:
+            a, b, c, d, e, f = cm
+            xs = (e, e + a, e + c, e + a + c)
+            ys = (f, f + b, f + d, f + b + d)
+            placements.append({
+                'name': str(operands[0]),
+                'bbox': (min(xs), min(ys), max(xs), max(ys)),
+            })
+
+    page.extract_text(visitor_text=visit_text, visitor_operand_before=visit_operator)
+
+    xobjects = page.get('/Resources', {}).get('/XObject', {})
+    images = []
+    for placement in placements:
+        xobject = xobjects.get(placement['name'])
+        if xobject is not None and xobject.get_object().get('/Subtype') == '/Image':
+            images.append(placement)
+
+    return runs, images
+
+
+PAINT_OPERATORS = {b'S', b's', b'f', b'F', b'f*', b'B', b'B*', b'b', b'b*'}
+
+# Operands per path construction operator that are points
+PATH_OPERATORS = {b'm': 1, b'l': 1, b'c': 3, b'v': 2, b'y': 2}
+
+UNMEASURED_OPERATORS = {b'sh', b'INLINE IMAGE'}
+
+
+def _collect_path(operator, operands, cm, points, paths):
+    """Accumulate path points and record the bbox of each painted path"""
+    a, b, c, d, e, f = cm
+    if operator in PATH_OPERATORS or operator == b're':
+        try:
+            values = [float(v) for v in operands]
+        except (TypeError, ValueError):
+            return
+        if operator == b're' and len(values) == 4:
+            x, y, w, h = values
+            values = [x, y, x + w, y, x + w, y + h, x, y + h]
+        for x, y in zip(values[0::2], values[1::2]):
+            points.append((a * x + c * y + e, b * x + d * y + f))
+    elif operator in PAINT_OPERATORS:
+        if points:
+            xs, ys = [p[0] for p in points], [p[1] for p in points]
+            paths.append((min(xs), min(ys), max(xs), max(ys)))
+        points.clear()
+    elif operator == b'n':
+        # Clipping path only
+        points.clear()
+    elif operator in UNMEASURED_OPERATORS:
+        paths.append(None)
+
+
+def _collect_ruling(operator, operands, cm, path_start, rulings):
+    """Record axis-aligned segments from re/m/l path operators"""
+    def to_page(x, y):
+        a, b, c, d, e, f = cm
+        return a * x + c * y + e, b * x + d * y + f
+
+    try:
+        values = [float(v) for v in operands]
+    except (TypeError, ValueError):
+        return path_start
+
+    if operator == b're' and len(values) == 4:
+        x, y, w, h = values
+        (x0, y0), (x1, y1) = to_page(x, y), to_page(x + w, y + h)
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        if y1 - y0 <= 2 or x1 - x0 <= 2:
+            # A thin filled rectangle is a rule
+            rulings.append((x0, y0, x1, y1))
+        else:
+            # Cell border: keep all four edges
+            rulings.extend([(x0, y0, x1, y0), (x0, y1, x1, y1),
+                            (x0, y0, x0, y1), (x1, y0, x1, y1)])
+        return None
+
+    if len(values) != 2:
+        return path_start
+    point = to_page(*values)
+    if operator == b'l' and path_start is not None:
+        (x0, y0), (x1, y1) = path_start, point
+        if abs(y1 - y0) <= 1 or abs(x1 - x0) <= 1:
+            rulings.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    return point
+
+
+def split_words(runs: List[TextRun]) -> List[TextRun]:
+    """Split runs at spaces, sharing each run's width out by character count"""
+    words = []
+    for run in runs:
+        text = run.text
+        if ' ' not in text.strip():
+            words.append(run._replace(text=text.strip()))
+            continue
+
+        per_char = (run.x1 - run.x0) / max(len(text), 1)
+        position = 0
+        for token in text.split(' '):
+            if token:
+                x0 = run.x0 + position * per_char
+                words.append(run._replace(text=token, x0=x0, x1=x0 + len(token) * per_char))
+            position += len(token) + 1
+    return words
+
+
+def group_lines(runs: List[TextRun]) -> List[List[TextRun]]:
+    """Group runs sharing a baseline into lines, top to bottom, left to right"""
+    lines = []
+    for run in sorted(runs, key=lambda r: (-r.baseline, r.x0)):
+        if lines:
+            line = lines[-1]
+            tolerance = 0.4 * max(run.size, line[0].size)
+            if abs(run.baseline - line[0].baseline) <= tolerance:
+                line.append(run)
+                continue
+        lines.append([run])
+
+    return [sorted(line, key=lambda r: r.x0) for line in lines]
+
+
+def line_text(line: List[TextRun]) -> str:
+    """Join a line's runs, inserting spaces where there is a visible gap"""
+    parts = []
+    previous = None
+    for run in line:
+        if previous is not None and run.x0 - previous.x1 > 0.2 * run.size:
+            parts.append(' ')
+        parts.append(run.text)
+        previous = run
+    return ' '.join(''.join(parts).split())
+
+
+def find_gutters(runs: List[TextRun], min_share: float = 0.15) -> List[float]:
+    """
+    Find x positions of column gutters
+
+    A gutter is a vertical band at least MIN_GUTTER_WIDTH wide that no run
+    crosses, with at least min_share of the characters on either side.
+    """
+    if len(runs) < 4:
+        return []
+
+    left = int(min(r.x0 for r in runs))
+    right = int(math.ceil(max(r.x1 for r in runs)))
+    if right - left < 3 * MIN_GUTTER_WIDTH:
+        return []
+
+    covered = [False] * (right - left + 1)
+    for run in runs:
+        for x in range(int(run.x0) - left, int(math.ceil(run.x1)) - left + 1):
+            covered[x] = True
+
+    total_chars = sum(len(r.text) for r in runs)
+    gutters = []
+    start = None
+    for x, is_covered in enumerate(covered + [True]):
+        if not is_covered and start is None:
+            start = x
+        elif is_covered and start is not None:
+            if x - start >= MIN_GUTTER_WIDTH:
+                middle = left + (start + x) / 2
+                chars_left = sum(len(r.text) for r in runs if r.x1 <= middle)
+                if min_share * total_chars <= chars_left <= (1 - min_share) * total_chars:
+                    gutters.append(middle)
+            start = None
+    return gutters
+
+
+def _body_size(runs: List[TextRun]) -> float:
+    sizes = []
+    for run in runs:
+        sizes.extend([round(run.size, 1)] * len(run.text))
+    return median(sizes) if sizes else 10.0
+
+
+def _heading_level(size: float, body_size: float) -> int:
+    ratio = size / body_size if body_size else 1
+    if ratio >= 1.8:
+        return 1
+    if ratio >= 1.4:
+        return 2
+    if ratio >= 1.2:
+        return 3
+    return 0
+
+
+def _column_blocks(runs: List[TextRun], body_size: float) -> List[dict]:
+    """Turn one column's runs into heading and paragraph blocks"""
+    blocks = []
+    current = None
+
+    for line in group_lines(runs):
+        text = line_text(line)
+        if not text:
+            continue
+        size = max(r.size for r in line)
+        baseline = line[0].baseline
+        level = _heading_level(size, body_size) if len(text) < 200 else 0
+        kind = 'heading' if level else 'paragraph'
+
+        starts_new = (
+            current is None
+            or kind != current['type']
+            or (kind == 'heading' and level != current['level'])
+            or current['last_baseline'] - baseline > 1.6 * max(size, current['size'])
+            or abs(size - current['size']) > 0.15 * current['size']
+        )
+
+        if starts_new:
+            current = {
+                'type': kind,
+                'level': level,
+                'text': text,
+                'top': baseline + ASCENT * size,
+                'size': size,
+                'last_baseline': baseline,
+            }
+            blocks.append(current)
+        else:
+            # Re-join words hyphenated across lines
+            if current['text'].endswith('-') and not current['text'].endswith(' -'):
+                current['text'] = current['text'][:-1] + text
+            else:
+                current['text'] += ' ' + text
+            current['last_baseline'] = baseline
+
+    for block in blocks:
+        del block['last_baseline']
+    return blocks
+
+
+def _image_data(page, name: str):
+    """Return (bytes, extension) for an image XObject in a DOCX-friendly format"""
+    image = page.images[name]
+    extension = '.' + image.name.rsplit('.', 1)[-1].lower() if '.' in image.name else ''
+    if extension in DOCX_IMAGE_EXTENSIONS:
+        return image.data, extension
+
+    buffer = io.BytesIO()
+    pil_image = image.image
+    if pil_image.mode not in ('RGB', 'RGBA', 'L', '1'):
+        pil_image = pil_image.convert('RGB')
+    pil_image.save(buffer, 'PNG')
+    return buffer.getvalue(), '.png'
+
+
+def page_layout(page) -> dict:
+    """
+    Reconstruct a page's reading-order layout from geometry
+
+    Runs in worker processes, so the result only holds plain data.
+
+    Returns:
+        Dictionary with page width, height and blocks. Blocks are in
+        reading order: full-width content above the columns, each column
+        top to bottom, then full-width content below. Each block is a
+        heading (level, text), paragraph (text) or image (data, ext,
+        width, height in points).
+    """
+    box = page.mediabox
+    runs, placements = extract_runs(page)
+    body_size = _body_size(runs)
+
+    gutters = find_gutters(runs)
+    bounds = [-math.inf] + gutters + [math.inf]
+
+    def column_of(x0, x1):
+        for index in range(len(bounds) - 1):
+            if bounds[index] <= x0 and x1 <= bounds[index + 1]:
+                return index
+        return None  # crosses a gutter
+
+    columns = [[] for _ in range(len(bounds) - 1)]
+    spanning = []
+    for run in runs:
+        column = column_of(run.x0, run.x1)
+        (spanning if column is None else columns[column]).append(run)
+
+    column_blocks = [_column_blocks(col, body_size) for col in columns]
+    spanning_blocks = _column_blocks(spanning, body_size)
+
+    # Images go to the column containing their centre, by vertical position
+    for placement in placements:
+        x0, y0, x1, y1 = placement['bbox']
+        try:
+            data, extension = _image_data(page, placement['name'])
+        except Exception:
+            continue
+        block = {'type': 'image', 'data': data, 'ext': extension,
+                 'width': x1 - x0, 'height': y1 - y0, 'top': y1}
+        column = column_of((x0 + x1) / 2, (x0 + x1) / 2)
+        if len(columns) > 1 and x1 - x0 > 0.6 * float(box.width):
+            spanning_blocks.append(block)
+        else:
+            column_blocks[column].append(block)
+
+    for blocks in column_blocks:
+        blocks.sort(key=lambda b: -b['top'])
+    spanning_blocks.sort(key=lambda b: -b['top'])
+
+    columns_top = max((b['top'] for blocks in column_blocks for b in blocks), default=-math.inf)
+    ordered = [b for b in spanning_blocks if b['top'] >= columns_top]
+    for blocks in column_blocks:
+        ordered.extend(blocks)
+    ordered.extend(b for b in spanning_blocks if b['top'] < columns_top)
+
+    return {
+        'width': float(box.width),
+        'height': float(box.height),
+        'blocks': ordered,
+    }
+
+
+def page_text_lines(page) -> dict:
+    """
+    Text lines of a page with their positions, for overlaying a page image
+
+    Runs in worker processes, so the result only holds plain data.
+
+    Returns:
+        Dictionary with the crop box width and height, the page rotation
+        and lines (text, x0, x1, top, size), positioned in points from the
+        crop box's top-left corner.
+    """
+    box = page.cropbox
+    left, top = float(box.left), float(box.top)
+    runs, _ = extract_runs(page)
+
+    lines = []
+    for line in group_lines(runs):
+        text = line_text(line)
+        if text:
+            lines.append({
+                'text': text,
+                'x0': min(r.x0 for r in line) - left,
+                'x1': max(r.x1 for r in line) - left,
+                'top': top - max(r.y1 for r in line),
+                'size': max(r.size for r in line),
+            })
+
+    return {
+        'width': float(box.width),
+        'height': float(box.height),
+        'rotation': page.rotation % 360,
+        'lines': lines,
+    }
@@ -22,6 +22,7 @@ DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 # File upload settings
 MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 200))
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+MAX_PAGES = int(os.getenv('MAX_PAGES', 0))  # 0 = no page limit
 
 # Security settings
 ENCRYPTION_STRENGTH = int(os.getenv('ENCRYPTION_STRENGTH', 256))
@@ -108,7 +108,17 @@ def render_watermark_ui():
     
     uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
     
-    watermark_text = st.text_input("Watermark text:", value="CONFIDENTIAL")
+    watermark_type = st.radio("Watermark type:", ["Text", "Image"], horizontal=True)
+    
+    watermark_text = "CONFIDENTIAL"
+    image_file = None
+    font_size = 60
+    image_scale = 0.5
+    
+    if watermark_type == "Text":
+        watermark_text = st.text_input("Watermark text:", value="CONFIDENTIAL")
+    else:
+        image_file = st.file_uploader("Choose watermark image", type=['png', 'jpg', 'jpeg'])
     
     col1, col2 = st.columns(2)
     
@@ -116,27 +126,168 @@ def render_watermark_ui():
         opacity = st.slider("Opacity:", 0.0, 1.0, 0.3, 0.05)
     
     with col2:
-        font_size = st.slider("Font size:", 20, 100, 60)
+        if watermark_type == "Text":
+            font_size = st.slider("Font size:", 20, 100, 60)
+        else:
+            image_scale = st.slider("Width (% of page):", 10, 100, 50) / 100
     
     angle = st.slider("Angle:", 0, 90, 45)
     
     return {
         'file': uploaded_file,
+        'watermark_type': watermark_type,
         'watermark_text': watermark_text,
+        'image_file': image_file,
+        'image_scale': image_scale,
         'opacity': opacity,
         'font_size': font_size,
         'angle': angle
     }
 
+def render_crop_pdf_ui():
+    """UI for Crop PDF tool"""
+    st.markdown("### ✂️ Crop Settings")
+    
+    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    
+    mode = st.radio(
+        "Crop mode:",
+        ["auto", "manual"],
+        format_func=lambda x: "Auto (trim to content)" if x == "auto" else "Manual margins",
+        horizontal=True
+    )
+    
+    padding = 10
+    uniform = False
+    margins = {'left': 50, 'bottom': 50, 'right': 50, 'top': 50}
+    
+    if mode == "auto":
+        col1, col2 = st.columns(2)
+        with col1:
+            padding = st.slider("Padding around content (pt):", 0, 72, 10)
+        with col2:
+            uniform = st.checkbox(
+                "Same crop on every page",
+                value=False,
+                help="Use one crop box that fits the content of all pages"
+            )
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            margins['left'] = st.number_input("Left (pt):", min_value=0, value=50)
+            margins['bottom'] = st.number_input("Bottom (pt):", min_value=0, value=50)
+        with col2:
+            margins['right'] = st.number_input("Right (pt):", min_value=0, value=50)
+            margins['top'] = st.number_input("Top (pt):", min_value=0, value=50)
+    
+    return {
+        'file': uploaded_file,
+        'mode': mode,
+        'padding': padding,
+        'uniform': uniform,
+        **margins
+    }
+
+def render_impose_pdf_ui():
+    """UI for N-up / Booklet tool"""
+    st.markdown("### 📖 Imposition Settings")
+    
+    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    
+    layout = st.radio(
+        "Layout:",
+        ["booklet", "nup"],
+        format_func=lambda x: "Booklet (fold in half)" if x == "booklet" else "Pages per sheet",
+        horizontal=True
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    pages_per_sheet = 2
+    with col1:
+        if layout == "nup":
+            pages_per_sheet = st.selectbox("Pages per sheet:", [2, 4, 6, 9, 16], index=1)
+    
+    with col2:
+        margin = st.slider("Margin (pt):", 0, 36, 0)
+    
+    return {
+        'file': uploaded_file,
+        'layout': layout,
+        'pages_per_sheet': pages_per_sheet,
+        'margin': margin
+    }
+
+def render_mail_merge_ui():
+    """UI for Mail merge tool"""
+    st.markdown("### 📬 Mail Merge Settings")
+    
+    uploaded_file = st.file_uploader("Choose template PDF", type=['pdf'])
+    csv_file = st.file_uploader(
+        "Choose CSV data file",
+        type=['csv'],
+        help="First row holds the column names; columns named like a form field fill that field"
+    )
+    
+    output = st.radio(
+        "Output:",
+        ["files", "combined"],
+        format_func=lambda x: "One PDF per record" if x == "files" else "One combined PDF",
+        horizontal=True
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    flatten = True
+    name_column = ""
+    with col1:
+        if output == "files":
+            flatten = st.checkbox(
+                "Flatten form fields",
+                value=True,
+                help="Draw the values into the page; unchecked keeps the form editable"
+            )
+    
+    with col2:
+        if output == "files":
+            name_column = st.text_input("Name files by column:", value="", help="e.g. customer_id")
+    
+    placements = st.text_area(
+        "Text placements (optional):",
+        value="",
+        help="One per line: page, x, y, font size, text. Positions are in points from the "
+             "bottom-left; text may use {column} placeholders, e.g. 1, 72, 700, 12, Dear {name},"
+    )
+    
+    return {
+        'file': uploaded_file,
+        'csv_file': csv_file,
+        'combined': output == "combined",
+        'placements': placements,
+        'flatten': flatten,
+        'name_column': name_column
+    }
+
 def render_protect_pdf_ui():
     """UI for Protect PDF tool"""
     st.markdown("### 🔐 Protection Settings")
     
-    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    uploaded_files = st.file_uploader(
+        "Choose PDF file(s)",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Several files are protected in one batch and returned as a ZIP"
+    )
     
     user_password = st.text_input("User password (to open PDF):", type="password")
     owner_password = st.text_input("Owner password (to change permissions):", type="password")
     
+    password_map = st.file_uploader(
+        "Per-file passwords (optional CSV):",
+        type=['csv'],
+        help="Columns: file, password, owner_password. Files not listed use the passwords above"
+    )
+    
     st.markdown("**Permissions:**")
     
     col1, col2 = st.columns(2)
@@ -150,9 +301,10 @@ def render_protect_pdf_ui():
         allow_forms = st.checkbox("Allow filling forms", value=True)
     
     return {
-        'file': uploaded_file,
+        'files': uploaded_files,
         'user_password': user_password,
         'owner_password': owner_password,
+        'password_map': password_map,
         'allow_printing': allow_printing,
         'allow_copying': allow_copying,
         'allow_commenting': allow_commenting,
@@ -170,18 +322,74 @@ def render_page_numbers_ui():
     with col1:
         position = st.selectbox(
             "Position:",
-            ["bottom-center", "bottom-right", "bottom-left"]
+            ["bottom-center", "bottom-right", "bottom-left",
+             "top-center", "top-right", "top-left"]
         )
     
     with col2:
         start_number = st.number_input("Start from:", min_value=1, value=1)
     
+    template = st.text_input(
+        "Label format:",
+        value="{n}",
+        help="{n} = page number, {N} = last page number, e.g. Page {n} of {N}"
+    )
+    
     font_size = st.slider("Font size:", 8, 16, 10)
     
     return {
         'file': uploaded_file,
         'position': position,
         'start_number': start_number,
+        'font_size': font_size,
+        'template': template or "{n}"
+    }
+
+def render_bates_numbering_ui():
+    """UI for Bates numbering tool"""
+    st.markdown("### ⚖️ Bates Numbering Settings")
+    
+    uploaded_files = st.file_uploader(
+        "Choose PDF files",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Numbers continue from one file to the next in this order"
+    )
+    
+    if uploaded_files:
+        st.markdown("**Numbering Order:**")
+        for idx, file in enumerate(uploaded_files, 1):
+            st.text(f"{idx}. {file.name}")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        prefix = st.text_input("Prefix:", value="", help="e.g. ACME")
+    
+    with col2:
+        start_number = st.number_input("Start from:", min_value=0, value=1)
+    
+    with col3:
+        digits = st.number_input("Digits:", min_value=1, max_value=12, value=6)
+    
+    col4, col5 = st.columns(2)
+    
+    with col4:
+        position = st.selectbox(
+            "Position:",
+            ["bottom-right", "bottom-center", "bottom-left",
+             "top-right", "top-center", "top-left"]
+        )
+    
+    with col5:
+        font_size = st.slider("Font size:", 8, 16, 10)
+    
+    return {
+        'files': uploaded_files,
+        'prefix': prefix,
+        'start_number': start_number,
+        'digits': digits,
+        'position': position,
         'font_size': font_size
     }
 
@@ -244,6 +452,89 @@ def render_document_upload_ui(doc_type='pdf', formats=['pdf']):
     
     return {'file': uploaded_file}
 
+def render_pdf_to_images_ui():
+    """UI for PDF to JPG tool"""
+    st.markdown("### 🖼 Image Export Settings")
+    
+    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        image_format = st.selectbox(
+            "Image format:",
+            ["JPG", "PNG", "TIFF"],
+            help="TIFF produces a single multi-page file"
+        )
+    
+    with col2:
+        dpi = st.select_slider(
+            "Resolution (DPI):",
+            options=[72, 100, 150, 200, 300],
+            value=200,
+            help="Higher DPI = sharper images but larger files"
+        )
+    
+    quality = 95
+    tiff_compression = "lzw"
+    if image_format == "JPG":
+        quality = st.slider("JPEG quality:", 50, 100, 95)
+    elif image_format == "TIFF":
+        tiff_compression = st.radio(
+            "Compression for color/gray pages:",
+            ["lzw", "deflate"],
+            format_func=lambda x: x.upper(),
+            horizontal=True,
+            help="Black & white pages always use CCITT Group 4"
+        )
+    
+    return {
+        'file': uploaded_file,
+        'image_format': image_format.lower(),
+        'dpi': dpi,
+        'quality': quality,
+        'tiff_compression': tiff_compression
+    }
+
+def render_pdf_to_powerpoint_ui():
+    """UI for PDF to POWERPOINT tool"""
+    st.markdown("### 📊 Presentation Settings")
+    
+    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    
+    mode = st.radio(
+        "Slide style:",
+        ["image", "text"],
+        format_func=lambda x: "Page pictures" if x == "image" else "Extracted text",
+        horizontal=True,
+        help="Page pictures keep the exact look of each page"
+    )
+    
+    dpi = 150
+    selectable_text = False
+    if mode == "image":
+        col1, col2 = st.columns(2)
+        with col1:
+            dpi = st.select_slider(
+                "Resolution (DPI):",
+                options=[96, 120, 150, 200],
+                value=150,
+                help="Higher DPI = sharper slides but larger files"
+            )
+        with col2:
+            selectable_text = st.checkbox(
+                "Selectable text",
+                value=False,
+                help="Add invisible text boxes over each picture"
+            )
+    
+    return {
+        'file': uploaded_file,
+        'mode': mode,
+        'dpi': dpi,
+        'selectable_text': selectable_text
+    }
+
 def render_compare_pdf_ui():
     """UI for Compare PDF tool"""
     st.markdown("### ⚖ Compare Two PDFs")
@@ -256,35 +547,113 @@ def render_compare_pdf_ui():
     with col2:
         file2 = st.file_uploader("Second PDF", type=['pdf'], key="pdf2")
     
+    visual = st.checkbox(
+        "Visual diff",
+        value=False,
+        help="Also render changed pages and highlight layout, image and colour changes"
+    )
+    
+    dpi = 50
+    if visual:
+        dpi = st.select_slider(
+            "Render resolution (DPI):",
+            options=[36, 50, 72, 100, 150],
+            value=50,
+            help="Lower DPI is faster; higher DPI catches smaller changes"
+        )
+    
     return {
         'file1': file1,
-        'file2': file2
+        'file2': file2,
+        'visual': visual,
+        'dpi': dpi
     }
 
 def render_unlock_pdf_ui():
     """UI for Unlock PDF tool"""
     st.markdown("### 🔓 Unlock PDF")
     
-    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    uploaded_files = st.file_uploader(
+        "Choose PDF file(s)",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Several files are unlocked in one batch and returned as a ZIP"
+    )
     
     password = st.text_input("Enter password:", type="password", help="Enter the password to unlock the PDF")
     
+    password_map = st.file_uploader(
+        "Per-file passwords (optional CSV):",
+        type=['csv'],
+        help="Columns: file, password. Files not listed use the password above"
+    )
+    
     return {
-        'file': uploaded_file,
-        'password': password
+        'files': uploaded_files,
+        'password': password,
+        'password_map': password_map
+    }
+
+def render_find_duplicates_ui():
+    """UI for Find Duplicates tool"""
+    st.markdown("### 🧬 Find Near-Duplicate PDFs")
+    
+    uploaded_files = st.file_uploader(
+        "Choose PDF files",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Files are added to a persistent index, so later uploads are also checked against them"
+    )
+    
+    threshold = st.slider(
+        "Similarity threshold:",
+        min_value=0.5,
+        max_value=1.0,
+        value=0.8,
+        step=0.05,
+        help="Share of text (or page images) two documents must have in common"
+    )
+    
+    return {
+        'files': uploaded_files,
+        'threshold': threshold
     }
 
 def render_sign_pdf_ui():
     """UI for Sign PDF tool"""
     st.markdown("### ✍️ Sign PDF")
     
-    uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
+    uploaded_files = st.file_uploader(
+        "Choose PDF file(s)",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Several files are signed as one batch with the same certificate"
+    )
+    
+    certificate_file = st.file_uploader(
+        "Signing certificate (PKCS#12):",
+        type=['p12', 'pfx'],
+        help="File holding your private key and certificate"
+    )
+    certificate_password = st.text_input("Certificate password:", type="password")
     
     signature_text = st.text_input("Signature text:", value="Digitally Signed", help="Text to appear in the signature")
     
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        reason = st.text_input("Reason:", value="", help="e.g. Approved")
+    
+    with col2:
+        location = st.text_input("Location:", value="")
+    
     return {
-        'file': uploaded_file,
-        'signature_text': signature_text
+        'files': uploaded_files,
+        'certificate_file': certificate_file,
+        'certificate_password': certificate_password,
+        'signature_text': signature_text,
+        'reason': reason,
+        'location': location
     }
 
 def render_redact_pdf_ui():
@@ -293,10 +662,44 @@ def render_redact_pdf_ui():
     
     uploaded_file = st.file_uploader("Choose PDF file", type=['pdf'])
     
-    st.info("ℹ️ This tool will help you redact sensitive information from your PDF")
+    terms = st.text_area(
+        "Words or phrases to redact:",
+        value="",
+        help="One per line, e.g. names, account numbers or project code names"
+    )
+    
+    patterns = st.multiselect(
+        "Also redact:",
+        ["ssn", "iban", "email", "phone"],
+        format_func=lambda x: {
+            "ssn": "Social Security numbers",
+            "iban": "IBANs",
+            "email": "Email addresses",
+            "phone": "Phone numbers"
+        }[x]
+    )
+    
+    regexes = st.text_area(
+        "Regular expressions (optional):",
+        value="",
+        help="One per line, e.g. ACCT-\\d{6}"
+    )
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        whole_words = st.checkbox("Whole words only", value=True)
+    
+    with col2:
+        case_sensitive = st.checkbox("Match case", value=False)
     
     return {
-        'file': uploaded_file
+        'file': uploaded_file,
+        'terms': [line.strip() for line in terms.splitlines() if line.strip()],
+        'patterns': patterns,
+        'regexes': [line.strip() for line in regexes.splitlines() if line.strip()],
+        'whole_words': whole_words,
+        'case_sensitive': case_sensitive
     }
 
 # Map tool names to their UI renderers
@@ -322,17 +725,20 @@ TOOL_UI_HANDLERS = {
     "HTML to PDF": lambda: render_document_upload_ui('HTML', ['html', 'htm']),
     
     # Convert FROM PDF
-    "PDF to JPG": lambda: render_document_upload_ui('PDF', ['pdf']),
+    "PDF to JPG": render_pdf_to_images_ui,
     "PDF to WORD": lambda: render_document_upload_ui('PDF', ['pdf']),
-    "PDF to POWERPOINT": lambda: render_document_upload_ui('PDF', ['pdf']),
+    "PDF to POWERPOINT": render_pdf_to_powerpoint_ui,
     "PDF to EXCEL": lambda: render_document_upload_ui('PDF', ['pdf']),
     "PDF to PDF/A": lambda: render_document_upload_ui('PDF', ['pdf']),
     
     # Edit PDF
     "Rotate PDF": render_rotate_pdf_ui,
     "Add page numbers": render_page_numbers_ui,
+    "Bates numbering": render_bates_numbering_ui,
     "Add watermark": render_watermark_ui,
-    "Crop PDF": lambda: render_document_upload_ui('PDF', ['pdf']),
+    "Crop PDF": render_crop_pdf_ui,
+    "N-up / Booklet": render_impose_pdf_ui,
+    "Mail merge": render_mail_merge_ui,
     "Edit PDF": lambda: render_document_upload_ui('PDF', ['pdf']),
     
     # Security
@@ -341,6 +747,7 @@ TOOL_UI_HANDLERS = {
     "Sign PDF": render_sign_pdf_ui,
     "Redact PDF": render_redact_pdf_ui,
     "Compare PDF": render_compare_pdf_ui,
+    "Find Duplicates": render_find_duplicates_ui,
 }
 
 def get_tool_ui_handler(tool_name: str):
@@ -5,6 +5,7 @@ Professional PDF processing web application built with Streamlit
 import streamlit as st
 from pathlib import Path
 import sys
+import tempfile
 import time
 
 # Add project root to path
@@ -27,7 +28,7 @@ from frontend.tool_handlers import get_tool_ui_handler
 
 # Import utilities
 from utils.file_utils import (
-    save_uploaded_file, cleanup_file, get_output_filename,
+    save_uploaded_file, open_upload, cleanup_file, get_output_filename,
     validate_file_size, format_file_size
 )
 import config
@@ -74,11 +75,11 @@ TOOLS_DATA = {
     "CONVERT FROM PDF": {
         "icon": "📤",
         "tools": [
-            {"name": "PDF to JPG", "icon": "🖼", "description": "Convert PDF pages to JPG images", "formats": ["pdf"], "processor": "convert_from"},
+            {"name": "PDF to JPG", "icon": "🖼", "description": "Convert PDF pages to JPG, PNG or multi-page TIFF images", "formats": ["pdf"], "processor": "convert_from"},
             {"name": "PDF to WORD", "icon": "📝", "description": "Convert PDF to editable Word document", "formats": ["pdf"], "processor": "convert_from"},
-            {"name": "PDF to POWERPOINT", "icon": "📊", "description": "Convert PDF to PowerPoint presentation", "formats": ["pdf"], "processor": "convert_from"},
+            {"name": "PDF to POWERPOINT", "icon": "📊", "description": "Convert PDF pages to PowerPoint slides", "formats": ["pdf"], "processor": "convert_from"},
             {"name": "PDF to EXCEL", "icon": "📈", "description": "Convert PDF tables to Excel spreadsheet", "formats": ["pdf"], "processor": "convert_from"},
-            {"name": "PDF to PDF/A", "icon": "🗄", "description": "Convert PDF to archival PDF/A format", "formats": ["pdf"], "processor": "convert_from"},
+            {"name": "PDF to PDF/A", "icon": "🗄", "description": "Convert PDF to archival PDF/A-2b format", "formats": ["pdf"], "processor": "convert_from"},
         ]
     },
     "EDIT PDF": {
@@ -86,8 +87,11 @@ TOOLS_DATA = {
         "tools": [
             {"name": "Rotate PDF", "icon": "🔄", "description": "Rotate pages in your PDF document", "formats": ["pdf"], "processor": "edit"},
             {"name": "Add page numbers", "icon": "🔢", "description": "Add page numbers to your PDF", "formats": ["pdf"], "processor": "edit"},
+            {"name": "Bates numbering", "icon": "⚖️", "description": "Number pages continuously across a set of PDFs", "formats": ["pdf"], "processor": "edit"},
             {"name": "Add watermark", "icon": "💧", "description": "Add text or image watermark to PDF pages", "formats": ["pdf"], "processor": "edit"},
             {"name": "Crop PDF", "icon": "✂️", "description": "Crop and trim PDF pages", "formats": ["pdf"], "processor": "edit"},
+            {"name": "N-up / Booklet", "icon": "📖", "description": "Print several pages per sheet or impose a booklet", "formats": ["pdf"], "processor": "edit"},
+            {"name": "Mail merge", "icon": "📬", "description": "Generate personalised PDFs from a template and a CSV file", "formats": ["pdf"], "processor": "edit"},
             {"name": "Edit PDF", "icon": "🖊", "description": "Edit PDF metadata and properties", "formats": ["pdf"], "processor": "edit"},
         ]
     },
@@ -99,6 +103,7 @@ TOOLS_DATA = {
             {"name": "Sign PDF", "icon": "✍️", "description": "Add digital signature to PDF document", "formats": ["pdf"], "processor": "security"},
             {"name": "Redact PDF", "icon": "🕵️", "description": "Permanently remove sensitive information", "formats": ["pdf"], "processor": "security"},
             {"name": "Compare PDF", "icon": "⚖", "description": "Compare two PDF documents for differences", "formats": ["pdf"], "processor": "security"},
+            {"name": "Find Duplicates", "icon": "🧬", "description": "Find near-duplicate documents across many PDFs", "formats": ["pdf"], "processor": "security"},
         ]
     }
 }
@@ -118,6 +123,37 @@ def set_active_tool(category, tool_name):
     """Set the active tool in session state"""
     st.session_state.active_tool = {'category': category, 'tool': tool_name}
 
+def preflight_uploads(tool_name, ui_data):
+    """
+    Check uploaded PDFs before running a tool
+    
+    Reads only each file's header, trailer and cross-reference data, and
+    rejects jobs that would fail or that belong to another tool. Files
+    with a damaged xref or trailer are let through; the tools open them
+    with recovery.
+    """
+    uploads = []
+    for key in ('file', 'files', 'file1', 'file2'):
+        value = ui_data.get(key)
+        if value:
+            uploads.extend(value if isinstance(value, list) else [value])
+    
+    for uploaded in uploads:
+        name = getattr(uploaded, 'name', '')
+        if not name.lower().endswith('.pdf'):
+            continue
+        
+        report = PDFSecurity.preflight_pdf(uploaded)
+        is_valid, message = validate_file_size(report['file_size'])
+        if not is_valid:
+            raise Exception(f"{name}: {message}")
+        if not report['valid'] and tool_name != "Repair PDF":
+            raise Exception(f"{name} is not a PDF file ({report['error']})")
+        if report['needs_password'] and tool_name != "Unlock PDF":
+            raise Exception(f"{name} is password protected. Run Unlock PDF on it first")
+        if config.MAX_PAGES and (report['page_count'] or 0) > config.MAX_PAGES:
+            raise Exception(f"{name} has {report['page_count']} pages; the limit is {config.MAX_PAGES}")
+
 def process_tool(tool_name, tool_data, ui_data):
     """Process the tool with actual backend logic"""
     try:
@@ -162,12 +198,10 @@ def process_tool(tool_name, tool_data, ui_data):
                 pages_per_split = 1
                 custom_ranges = None
             
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOrganizer.split_pdf(f, config.OUTPUT_DIR, split_type=split_type, 
                                                pages_per_split=pages_per_split, 
                                                custom_ranges=custom_ranges)
-            cleanup_file(temp_file)
             return result, f"Successfully split into {len(result)} files"
             
         elif tool_name == "Remove pages":
@@ -177,10 +211,8 @@ def process_tool(tool_name, tool_data, ui_data):
             if not pages_str:
                 raise Exception("Please specify pages to remove")
             pages = [int(p.strip()) for p in pages_str.split(',')]
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOrganizer.remove_pages(f, output_path, pages)
-            cleanup_file(temp_file)
             return result, f"Successfully removed {len(pages)} pages"
             
         elif tool_name == "Extract pages":
@@ -190,10 +222,8 @@ def process_tool(tool_name, tool_data, ui_data):
             if not pages_str:
                 raise Exception("Please specify pages to extract")
             pages = [int(p.strip()) for p in pages_str.split(',')]
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOrganizer.extract_pages(f, output_path, pages)
-            cleanup_file(temp_file)
             return result, f"Successfully extracted {len(pages)} pages"
             
         elif tool_name == "Scan to PDF":
@@ -206,31 +236,24 @@ def process_tool(tool_name, tool_data, ui_data):
         elif tool_name == "Compress PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOptimizer.compress_pdf(f, output_path, ui_data.get('compression_level', 'medium'))
-            # Get compression stats
-            with open(temp_file, 'rb') as f:
+                # Get compression stats
                 stats = PDFOptimizer.get_compression_stats(f, result)
-            cleanup_file(temp_file)
             return result, f"Compressed by {stats['savings_percent']:.1f}% ({format_file_size(stats['original_size'])} → {format_file_size(stats['compressed_size'])})"
             
         elif tool_name == "Repair PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOptimizer.repair_pdf(f, output_path)
-            cleanup_file(temp_file)
             return result, "Successfully repaired PDF"
             
         elif tool_name == "OCR PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFOptimizer.ocr_pdf(f, output_path)
-            cleanup_file(temp_file)
             return result, "Successfully processed PDF with OCR"
             
         # CONVERT TO PDF processors
@@ -268,144 +291,270 @@ def process_tool(tool_name, tool_data, ui_data):
         elif tool_name == "PDF to JPG":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = ConvertFromPDF.pdf_to_images(f, config.OUTPUT_DIR, 'jpg')
-            cleanup_file(temp_file)
-            return result, f"Successfully converted to {len(result)} JPG images"
+            image_format = ui_data.get('image_format', 'jpg')
+            if image_format == 'tiff':
+                output_path = output_path.with_suffix('.tif')
+                with open_upload(ui_data['file']) as f:
+                    result = ConvertFromPDF.pdf_to_tiff(f, output_path,
+                        ui_data.get('dpi', 200),
+                        ui_data.get('tiff_compression', 'lzw'))
+                return result, "Successfully converted to multi-page TIFF"
+            with open_upload(ui_data['file']) as f:
+                result = ConvertFromPDF.pdf_to_images(f, config.OUTPUT_DIR, image_format,
+                    ui_data.get('dpi', 200),
+                    ui_data.get('quality', 95))
+            return result, f"Successfully converted to {len(result)} {image_format.upper()} images"
             
         elif tool_name == "PDF to WORD":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
             output_path = output_path.with_suffix('.docx')
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = ConvertFromPDF.pdf_to_word(f, output_path)
-            cleanup_file(temp_file)
             return result, "Successfully converted PDF to Word"
             
         elif tool_name == "PDF to POWERPOINT":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
             output_path = output_path.with_suffix('.pptx')
-            with open(temp_file, 'rb') as f:
-                result = ConvertFromPDF.pdf_to_powerpoint(f, output_path)
-            cleanup_file(temp_file)
+            with open_upload(ui_data['file']) as f:
+                result = ConvertFromPDF.pdf_to_powerpoint(f, output_path,
+                    ui_data.get('mode', 'image'),
+                    ui_data.get('dpi', 150),
+                    ui_data.get('selectable_text', False))
             return result, "Successfully converted PDF to PowerPoint"
             
         elif tool_name == "PDF to EXCEL":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
             output_path = output_path.with_suffix('.xlsx')
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = ConvertFromPDF.pdf_to_excel(f, output_path)
-            cleanup_file(temp_file)
             return result, "Successfully converted PDF to Excel"
             
         elif tool_name == "PDF to PDF/A":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = ConvertFromPDF.pdf_to_pdfa(f, output_path)
-            cleanup_file(temp_file)
-            return result, "Successfully converted to PDF/A format"
+            with open_upload(ui_data['file']) as f:
+                result, report = ConvertFromPDF.pdf_to_pdfa_with_report(f, output_path)
+            if not report['conformant']:
+                issues = "; ".join(f"{issue} (×{count})" for issue, count in report['issues'].items())
+                return result, f"Converted to PDF/A-2b with conformance issues: {issues}"
+            return result, "Successfully converted to PDF/A-2b format"
             
         # EDIT PDF processors
         elif tool_name == "Rotate PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFEditor.rotate_pdf(f, output_path, 
                     ui_data.get('rotation', 90), 
                     ui_data.get('pages', 'all'))
-            cleanup_file(temp_file)
             return result, f"Successfully rotated PDF by {ui_data.get('rotation', 90)}°"
             
         elif tool_name == "Add page numbers":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            with open_upload(ui_data['file']) as f:
                 result = PDFEditor.add_page_numbers(f, output_path,
                     ui_data.get('position', 'bottom-center'),
                     ui_data.get('start_number', 1),
-                    ui_data.get('font_size', 10))
-            cleanup_file(temp_file)
+                    ui_data.get('font_size', 10),
+                    ui_data.get('template', '{n}'))
             return result, "Successfully added page numbers"
             
+        elif tool_name == "Bates numbering":
+            if not ui_data.get('files'):
+                raise Exception("Please upload at least one PDF file")
+            temp_files = [save_uploaded_file(f) for f in ui_data['files']]
+            try:
+                result = PDFEditor.bates_number_pdfs(temp_files, config.OUTPUT_DIR,
+                    ui_data.get('prefix', ''),
+                    ui_data.get('start_number', 1),
+                    ui_data.get('digits', 6),
+                    ui_data.get('position', 'bottom-right'),
+                    ui_data.get('font_size', 10),
+                    names=[f.name for f in ui_data['files']])
+            finally:
+                for temp_file in temp_files:
+                    cleanup_file(temp_file)
+            return result, f"Successfully Bates numbered {len(result)} files"
+            
         elif tool_name == "Add watermark":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
+            if ui_data.get('watermark_type') == "Image" and not ui_data.get('image_file'):
+                raise Exception("Please upload a watermark image")
+            with open_upload(ui_data['file']) as f:
                 result = PDFEditor.add_watermark(f, output_path,
                     ui_data.get('watermark_text', 'CONFIDENTIAL'),
                     ui_data.get('opacity', 0.3),
                     ui_data.get('font_size', 60),
-                    ui_data.get('angle', 45))
-            cleanup_file(temp_file)
+                    ui_data.get('angle', 45),
+                    ui_data.get('image_file'),
+                    ui_data.get('image_scale', 0.5))
             return result, "Successfully added watermark"
             
         elif tool_name == "Crop PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = PDFEditor.crop_pdf(f, output_path, 50, 50, 50, 50)
-            cleanup_file(temp_file)
+            with open_upload(ui_data['file']) as f:
+                if ui_data.get('mode', 'auto') == 'auto':
+                    result = PDFEditor.auto_crop_pdf(f, output_path,
+                        ui_data.get('padding', 10),
+                        ui_data.get('uniform', False))
+                else:
+                    result = PDFEditor.crop_pdf(f, output_path,
+                        ui_data.get('left', 50), ui_data.get('bottom', 50),
+                        ui_data.get('right', 50), ui_data.get('top', 50))
             return result, "Successfully cropped PDF"
             
+        elif tool_name == "N-up / Booklet":
+            if not ui_data.get('file'):
+                raise Exception("Please upload a PDF file")
+            with open_upload(ui_data['file']) as f:
+                result = PDFEditor.impose_pdf(f, output_path,
+                    ui_data.get('layout', 'booklet'),
+                    ui_data.get('pages_per_sheet', 2),
+                    ui_data.get('margin', 0))
+            return result, "Successfully imposed PDF"
+            
+        elif tool_name == "Mail merge":
+            if not ui_data.get('file') or not ui_data.get('csv_file'):
+                raise Exception("Please upload a template PDF and a CSV file")
+            from backend.mailmerge import parse_placements
+            placements = parse_placements(ui_data.get('placements', ''))
+            with open_upload(ui_data['file']) as f, open_upload(ui_data['csv_file']) as data:
+                result = PDFEditor.mail_merge(f, data, output_path,
+                    ui_data.get('combined', False),
+                    placements,
+                    ui_data.get('flatten', True),
+                    ui_data.get('name_column') or None)
+            if isinstance(result, list):
+                return result, f"Successfully generated {len(result)} PDFs"
+            return result, "Successfully generated merged PDF"
+            
         # SECURITY processors
         elif tool_name == "Unlock PDF":
-            if not ui_data.get('file'):
+            if not ui_data.get('files'):
                 raise Exception("Please upload a PDF file")
             password = ui_data.get('password', '')
-            if not password:
+            if not password and not ui_data.get('password_map'):
                 raise Exception("Please enter the password")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = PDFSecurity.unlock_pdf(f, output_path, password)
-            cleanup_file(temp_file)
-            return result, "Successfully unlocked PDF"
+            if len(ui_data['files']) == 1 and not ui_data.get('password_map'):
+                with open_upload(ui_data['files'][0]) as f:
+                    result = PDFSecurity.unlock_pdf(f, output_path, password)
+                return result, "Successfully unlocked PDF"
+            temp_files = [save_uploaded_file(f) for f in ui_data['files']]
+            try:
+                result, report = PDFSecurity.unlock_pdfs(temp_files, output_path.with_suffix('.zip'),
+                    password, ui_data.get('password_map'),
+                    names=[f.name for f in ui_data['files']])
+            finally:
+                for temp_file in temp_files:
+                    cleanup_file(temp_file)
+            failed = sum(1 for row in report if row['status'] == 'failed')
+            return result, f"Unlocked {len(report) - failed} of {len(report)} PDFs (see report.csv in the archive)"
             
         elif tool_name == "Protect PDF":
-            if not ui_data.get('file'):
+            if not ui_data.get('files'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = PDFSecurity.protect_pdf(f, output_path,
+            if len(ui_data['files']) == 1 and not ui_data.get('password_map'):
+                with open_upload(ui_data['files'][0]) as f:
+                    result = PDFSecurity.protect_pdf(f, output_path,
+                        ui_data.get('user_password'),
+                        ui_data.get('owner_password'),
+                        ui_data.get('allow_printing', True),
+                        ui_data.get('allow_commenting', False),
+                        ui_data.get('allow_copying', False),
+                        ui_data.get('allow_forms', True),
+                        config.ENCRYPTION_STRENGTH)
+                return result, "Successfully protected PDF"
+            temp_files = [save_uploaded_file(f) for f in ui_data['files']]
+            try:
+                result, report = PDFSecurity.protect_pdfs(temp_files, output_path.with_suffix('.zip'),
                     ui_data.get('user_password'),
                     ui_data.get('owner_password'),
+                    ui_data.get('password_map'),
                     ui_data.get('allow_printing', True),
                     ui_data.get('allow_commenting', False),
                     ui_data.get('allow_copying', False),
-                    ui_data.get('allow_forms', True))
-            cleanup_file(temp_file)
-            return result, "Successfully protected PDF"
+                    ui_data.get('allow_forms', True),
+                    config.ENCRYPTION_STRENGTH,
+                    names=[f.name for f in ui_data['files']])
+            finally:
+                for temp_file in temp_files:
+                    cleanup_file(temp_file)
+            failed = sum(1 for row in report if row['status'] == 'failed')
+            return result, f"Protected {len(report) - failed} of {len(report)} PDFs (see report.csv in the archive)"
             
         elif tool_name == "Sign PDF":
+            if not ui_data.get('files'):
+                raise Exception("Please upload a PDF file")
+            if not ui_data.get('certificate_file'):
+                raise Exception("Please upload a signing certificate")
+            if len(ui_data['files']) == 1:
+                with open_upload(ui_data['files'][0]) as f:
+                    result = PDFSecurity.add_digital_signature(f, output_path,
+                        ui_data.get('signature_text', 'Digitally Signed'),
+                        ui_data['certificate_file'],
+                        ui_data.get('certificate_password') or None,
+                        ui_data.get('reason', ''),
+                        ui_data.get('location', ''))
+                return result, "Successfully added signature"
+            temp_files = [save_uploaded_file(f) for f in ui_data['files']]
+            try:
+                result = PDFSecurity.sign_pdfs(temp_files, config.OUTPUT_DIR,
+                    ui_data['certificate_file'],
+                    ui_data.get('certificate_password') or None,
+                    ui_data.get('signature_text', 'Digitally Signed'),
+                    ui_data.get('reason', ''),
+                    ui_data.get('location', ''),
+                    names=[f.name for f in ui_data['files']])
+            finally:
+                for temp_file in temp_files:
+                    cleanup_file(temp_file)
+            return result, f"Successfully signed {len(result)} PDFs"
+            
+        elif tool_name == "Redact PDF":
             if not ui_data.get('file'):
                 raise Exception("Please upload a PDF file")
-            temp_file = save_uploaded_file(ui_data['file'])
-            with open(temp_file, 'rb') as f:
-                result = PDFSecurity.add_digital_signature(f, output_path)
-            cleanup_file(temp_file)
-            return result, "Successfully added signature"
+            if not (ui_data.get('terms') or ui_data.get('patterns') or ui_data.get('regexes')):
+                raise Exception("Please enter something to redact")
+            with open_upload(ui_data['file']) as f:
+                result, report = PDFSecurity.redact_pdf_with_report(f, output_path,
+                    ui_data.get('terms'),
+                    ui_data.get('patterns'),
+                    ui_data.get('regexes'),
+                    ui_data.get('case_sensitive', False),
+                    ui_data.get('whole_words', True))
+            return result, f"Redacted {report['matches']} matches on {report['pages']} pages"
             
         elif tool_name == "Compare PDF":
             if not ui_data.get('file1') or not ui_data.get('file2'):
                 raise Exception("Please upload both PDF files")
-            temp_file1 = save_uploaded_file(ui_data['file1'])
-            temp_file2 = save_uploaded_file(ui_data['file2'])
-            with open(temp_file1, 'rb') as f1, open(temp_file2, 'rb') as f2:
-                result = PDFSecurity.compare_pdfs(f1, f2)
-            cleanup_file(temp_file1)
-            cleanup_file(temp_file2)
-            return result, "Comparison completed"
+            name_prefix = f"{Path(ui_data['file1'].name).stem}_vs_{Path(ui_data['file2'].name).stem}"
+            heatmap_dir = None
+            if ui_data.get('visual', False):
+                # A folder per run, so later comparisons cannot overwrite these heatmaps
+                heatmap_dir = Path(tempfile.mkdtemp(prefix=f"{name_prefix}_", dir=config.OUTPUT_DIR))
+            with open_upload(ui_data['file1']) as f1, open_upload(ui_data['file2']) as f2:
+                result = PDFSecurity.compare_pdfs(f1, f2, None, ui_data.get('visual', False),
+                                                  heatmap_dir, ui_data.get('dpi', 50), name_prefix)
+            return result, f"Comparison completed: {len(result['page_changes'])} page(s) differ"
+            
+        elif tool_name == "Find Duplicates":
+            if not ui_data.get('files'):
+                raise Exception("Please upload PDF files")
+            temp_files = [save_uploaded_file(f) for f in ui_data['files']]
+            try:
+                result = PDFSecurity.find_duplicates(temp_files, config.OUTPUT_DIR / "duplicates_index.sqlite",
+                    ui_data.get('threshold', 0.8),
+                    names=[f.name for f in ui_data['files']])
+            finally:
+                for temp_file in temp_files:
+                    cleanup_file(temp_file)
+            return result, f"Found {len(result['clusters'])} group(s) of near-duplicates"
         
         else:
             raise Exception(f"Tool '{tool_name}' is not yet implemented")
@@ -437,6 +586,7 @@ def render_tool_ui(category, tool_data):
     if run_button:
         with st.spinner("Processing..."):
             try:
+                preflight_uploads(tool_data['name'], ui_data)
                 result, message = process_tool(tool_data['name'], tool_data, ui_data)
                 
                 # Show success message
@@ -450,7 +600,7 @@ def render_tool_ui(category, tool_data):
                             label="📥 Download Result",
                             data=f.read(),
                             file_name=result.name,
-                            mime="application/pdf",
+                            mime="application/zip" if result.suffix == '.zip' else "application/pdf",
                             use_container_width=True
                         )
                 elif isinstance(result, list) and len(result) > 0:
@@ -492,6 +642,8 @@ def render_tool_ui(category, tool_data):
                 elif isinstance(result, dict):
                     # Dictionary result (e.g., comparison results)
                     st.json(result)
+                    for heatmap in result.get('heatmaps', []):
+                        st.image(heatmap, caption=Path(heatmap).name)
                     
             except Exception as e:
                 show_error_message(str(e))
@@ -3,6 +3,7 @@ Utility functions for file handling and processing
 """
 from .file_utils import (
     save_uploaded_file,
+    open_upload,
     cleanup_file,
     get_output_filename,
     validate_file_size,
@@ -11,6 +12,7 @@ from .file_utils import (
 
 __all__ = [
     'save_uploaded_file',
+    'open_upload',
     'cleanup_file',
     'get_output_filename',
     'validate_file_size',
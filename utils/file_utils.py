@@ -3,14 +3,19 @@ Utility functions for PDF processing
 """
 import os
 import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Iterator, Optional
 import config
+from backend.inputs import write_chunks
 
 def save_uploaded_file(uploaded_file: BinaryIO, suffix: str = "") -> Path:
     """
     Save uploaded file to temporary directory
     
+    The upload is written in chunks from its buffer, so no second copy
+    of the file is made in memory.
+    
     Args:
         uploaded_file: Streamlit uploaded file object
         suffix: File suffix/extension
@@ -23,10 +28,40 @@ def save_uploaded_file(uploaded_file: BinaryIO, suffix: str = "") -> Path:
         suffix=suffix or Path(uploaded_file.name).suffix,
         dir=config.TEMP_DIR
     )
-    temp_file.write(uploaded_file.read())
-    temp_file.close()
+    try:
+        write_chunks(uploaded_file, temp_file)
+    finally:
+        temp_file.close()
     return Path(temp_file.name)
 
+@contextmanager
+def open_upload(uploaded_file: BinaryIO) -> Iterator[BinaryIO]:
+    """
+    Open an uploaded file for a backend
+    
+    Streamlit uploads are already seekable in-memory buffers, so they are
+    handed over as they are instead of being copied to disk and read back.
+    Other streams are spooled to a temporary file in chunks, which is
+    removed afterwards.
+    
+    Args:
+        uploaded_file: Streamlit uploaded file object
+        
+    Yields:
+        Binary file object positioned at the start
+    """
+    if hasattr(uploaded_file, 'getbuffer'):
+        uploaded_file.seek(0)
+        yield uploaded_file
+        return
+    
+    temp_file = save_uploaded_file(uploaded_file)
+    try:
+        with open(temp_file, 'rb') as f:
+            yield f
+    finally:
+        cleanup_file(temp_file)
+
 def cleanup_file(file_path: Path) -> None:
     """Remove temporary file"""
     try: